@@ -0,0 +1,87 @@
+"""
+Micro benchmark of caption output formats: encode time, file size and (inside blender) load time.
+
+  python benchmarks/caption_formats.py --font /usr/share/fonts/TTF/mplus-1p-regular.ttf
+  blender -b --python benchmarks/caption_formats.py -- --font /usr/share/fonts/TTF/mplus-1p-regular.ttf
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from kiritanify.caption_renderer import CAPTION_FORMATS, caption_file_ext, render_text, render_text_cropped, \
+  save_caption
+
+try:
+  import bpy
+except ImportError:
+  bpy = None
+
+PNG_COMPRESS_LEVELS = [0, 1, 6, 9]
+
+
+def _variants() -> List[Tuple[str, str, int]]:
+  result = []
+  for caption_format in CAPTION_FORMATS:
+    if caption_format == 'PNG':
+      result += [(f'PNG level={level}', caption_format, level) for level in PNG_COMPRESS_LEVELS]
+    else:
+      result.append((caption_format, caption_format, 0))
+  return result
+
+
+def _blender_load_sec(path: Path, repeat: int) -> Optional[float]:
+  if bpy is None:
+    return None
+  elapsed = 0.
+  for _ in range(repeat):
+    start = time.perf_counter()
+    image = bpy.data.images.load(str(path), check_existing=False)
+    _ = image.size[0]  # acquires the image buffer, i.e. decodes the file
+    elapsed += time.perf_counter() - start
+    bpy.data.images.remove(image)
+  return elapsed / repeat
+
+
+def main(argv: List[str]):
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--font', required=True)
+  parser.add_argument('--font-size', type=int, default=42)
+  parser.add_argument('--text', default='こんにちは、東北きりたんです\nおふとんもぐもぐ')
+  parser.add_argument('--canvas', type=int, nargs=2, default=[1920, 256])
+  parser.add_argument('--repeat', type=int, default=20)
+  parser.add_argument('--no-crop', action='store_true')
+  args = parser.parse_args(argv)
+
+  render = render_text_cropped if not args.no_crop else (lambda **kw: (render_text(**kw), (0, 0)))
+  image, _ = render(
+    canvas_size=tuple(args.canvas),
+    text=args.text,
+    background_color=(0, 0, 0, 0),
+    fill_color=(1, 1, 1, 1),
+    stroke_color=(0.23, 0.23, 0.23, 1),
+    stroke_width=8,
+    font_path=args.font,
+    font_size=args.font_size,
+  )
+  print(f'image size: {image.size}')
+  print(f'{"format":<16} {"encode ms":>10} {"size KiB":>10} {"load ms":>10}')
+
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    for label, caption_format, level in _variants():
+      path = Path(tmp_dir) / f'{label.replace(" ", "_").replace("=", "")}.{caption_file_ext(caption_format)}'
+      start = time.perf_counter()
+      for _ in range(args.repeat):
+        save_caption(image, path, caption_format, level)
+      encode_sec = (time.perf_counter() - start) / args.repeat
+      load_sec = _blender_load_sec(path, args.repeat)
+      load = '-' if load_sec is None else f'{load_sec * 1000:.2f}'
+      print(f'{label:<16} {encode_sec * 1000:>10.2f} {path.stat().st_size / 1024:>10.1f} {load:>10}')
+
+
+if __name__ == '__main__':
+  main(sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:])
@@ -0,0 +1,505 @@
+"""
+Minimal stand-in of `bpy` for timing kiritanify outside blender: properties, property groups, operators and a
+sequence editor model (strips with blender's frame arithmetic, unique names, sequences_all). Only what kiritanify
+touches is modeled; property update callbacks are called on every assignment, as in blender, and nothing is
+drawn.
+
+Absolute timings differ from blender (RNA access is slower there); compare runs against each other only.
+
+  import fake_bpy
+  context = fake_bpy.install(blend_dir)  # before importing kiritanify
+"""
+import json
+import os
+import re
+import sys
+import types
+import wave
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+class _Property:
+  """
+  Result of `bpy.props.*Property`; a data descriptor on the owning class, created lazily with its default.
+  """
+
+  def __init__(self, kind: str, default: Callable[[], Any], *args, **kwargs):
+    self.kind = kind
+    self.default = default
+    self.keywords = kwargs
+    self.name: Optional[str] = None
+
+  def __set_name__(self, owner, name):
+    self.name = name
+
+  def __get__(self, instance, owner=None):
+    if instance is None:
+      return self
+    name = self.name or self._find_name(type(instance))
+    try:
+      return instance.__dict__[name]
+    except KeyError:
+      value = instance.__dict__[name] = self.default()
+      if isinstance(value, _Struct):
+        value._set_owner(instance, lambda: name)
+      elif isinstance(value, _Collection):
+        value._owner = instance
+        value._name = name
+      return value
+
+  def __set__(self, instance, value):
+    instance.__dict__[self.name or self._find_name(type(instance))] = value
+    update = self.keywords.get('update')
+    if update is not None:
+      update(instance, sys.modules['bpy'].context)
+
+  def _find_name(self, owner) -> str:
+    # assigned to a class after its creation (e.g. `Scene.kiritanify = PointerProperty(...)`)
+    for cls in owner.__mro__:
+      for name, value in vars(cls).items():
+        if value is self:
+          self.name = name
+          return name
+    raise AttributeError('unbound property')
+
+
+def _value_property(kind: str, fallback: Any):
+  def factory(*args, default=fallback, **kwargs):
+    if isinstance(default, list):
+      default = tuple(default)
+    return _Property(kind, lambda: default, *args, **kwargs)
+  return factory
+
+
+def _enum_property(*args, items=(), default=None, **kwargs):
+  if default is None:
+    default = items[0][0] if isinstance(items, (list, tuple)) and len(items) > 0 else ''
+  return _Property('ENUM', lambda: default, *args, **kwargs)
+
+
+def _pointer_property(*args, type=None, **kwargs):
+  return _Property('POINTER', type, *args, **kwargs)
+
+
+class _Collection(list):
+  def __init__(self, item_type):
+    super().__init__()
+    self._item_type = item_type
+    self._owner: Optional['_Struct'] = None
+    self._name = ''
+
+  def add(self):
+    item = self._item_type()
+    item._set_owner(self._owner, lambda: f'{self._name}[{self.index(item)}]')
+    self.append(item)
+    return item
+
+  def remove(self, index: int):
+    del self[index]
+
+
+def _collection_property(*args, type=None, **kwargs):
+  return _Property('COLLECTION', lambda: _Collection(type), *args, **kwargs)
+
+
+class _Struct:
+  """
+  Base of every fake RNA type; turns `name: bpy.props.XProperty()` annotations into descriptors. Structs created
+  by a pointer or collection property know their owner, for `id_data` and `path_from_id` as used by callbacks.
+  """
+  _owner: Optional['_Struct'] = None
+  _path_in_owner: Callable[[], str] = staticmethod(lambda: '')
+
+  def __init_subclass__(cls, **kwargs):
+    super().__init_subclass__(**kwargs)
+    for name, annotation in list(vars(cls).get('__annotations__', {}).items()):
+      if isinstance(annotation, _Property):
+        annotation.name = name
+        setattr(cls, name, annotation)
+
+  def _set_owner(self, owner: Optional['_Struct'], path_in_owner: Callable[[], str]):
+    self._owner = owner
+    self._path_in_owner = path_in_owner
+
+  @property
+  def id_data(self) -> '_Struct':
+    struct = self
+    while struct._owner is not None:
+      struct = struct._owner
+    return struct
+
+  def path_from_id(self) -> str:
+    parts = []
+    struct = self
+    while struct._owner is not None:
+      parts.append(struct._path_in_owner())
+      struct = struct._owner
+    return '.'.join(reversed(parts)).replace('.[', '[')
+
+  def path_resolve(self, path: str):
+    value = self
+    for attr, index, key in _PATH_TOKEN.findall(path):
+      if attr != '':
+        value = getattr(value, attr)
+      elif index != '':
+        value = value[int(index)]
+      else:
+        value = value[json.loads(key)]
+    return value
+
+
+# `name`, `[0]` or `["key"]` of an rna path
+_PATH_TOKEN = re.compile(r'\.?(\w+)|\[(\d+)\]|\[("(?:[^"\\]|\\.)*")\]')
+
+
+# types
+
+class Context(_Struct):
+  def __init__(self, scene: 'Scene'):
+    self.scene = scene
+    self.preferences = _Preferences()
+
+  @property
+  def selected_sequences(self) -> List['Sequence']:
+    if self.scene.sequence_editor is None:
+      return []
+    return [seq for seq in self.scene.sequence_editor.sequences_all if seq.select]
+
+
+class _Preferences:
+  def __init__(self):
+    self.addons: Dict[str, Any] = {}
+
+
+class _Render:
+  resolution_x = 1920
+  resolution_y = 1080
+  fps = 60
+  fps_base = 1.
+
+
+class Scene(_Struct):
+  def __init__(self, name: str = 'Scene'):
+    self.name = name
+    self.render = _Render()
+    self.frame_current = 1
+    self.frame_start = 1
+    self.frame_end = 250
+    self.sequence_editor: Optional[SequenceEditor] = None
+    self.timeline_markers = []
+
+  def sequence_editor_create(self) -> 'SequenceEditor':
+    if self.sequence_editor is None:
+      self.sequence_editor = SequenceEditor(self)
+    return self.sequence_editor
+
+
+class SequenceEditor(_Struct):
+  def __init__(self, scene: Scene):
+    self.sequences = Sequences(scene)
+    # no meta strips, so all sequences are top level
+    self.sequences_all = self.sequences
+
+
+class Sequence(_Struct):
+  """
+  Frames as in blender: the content spans [frame_start, frame_start + frame_duration), the visible part is
+  trimmed by frame_offset_start/end.
+  """
+  type = 'NONE'
+  # effect and single image strips are stretched instead of trimmed
+  stretches = False
+
+  def __init__(self, name: str, channel: int, frame_start: int, frame_duration: int):
+    self.name = name
+    self.channel = channel
+    self.frame_start = frame_start
+    self.frame_duration = max(1, frame_duration)
+    self.frame_offset_start = 0
+    self.frame_offset_end = 0
+    self.select = False
+    self.mute = False
+    self.blend_type = 'REPLACE'
+    self.blend_alpha = 1.
+
+  @property
+  def frame_final_start(self) -> int:
+    return self.frame_start + self.frame_offset_start
+
+  @frame_final_start.setter
+  def frame_final_start(self, value: int):
+    self.frame_offset_start = value - self.frame_start
+
+  @property
+  def frame_final_end(self) -> int:
+    return self.frame_start + self.frame_duration - self.frame_offset_end
+
+  @frame_final_end.setter
+  def frame_final_end(self, value: int):
+    if self.stretches:
+      self.frame_duration = max(1, value - self.frame_start)
+      self.frame_offset_end = 0
+    else:
+      self.frame_offset_end = self.frame_start + self.frame_duration - value
+
+  @property
+  def frame_final_duration(self) -> int:
+    return self.frame_final_end - self.frame_final_start
+
+  def __repr__(self):
+    return f'<{type(self).__name__} {self.name!r} ch={self.channel} {self.frame_final_start}-{self.frame_final_end}>'
+
+
+class EffectSequence(Sequence):
+  stretches = True
+
+
+class AdjustmentSequence(EffectSequence):
+  type = 'ADJUSTMENT'
+
+
+class SpeedControlSequence(EffectSequence):
+  type = 'SPEED'
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.input_1: Optional[Sequence] = None
+    self.speed_factor = 1.
+    self.use_default_fade = True
+
+
+class TextSequence(EffectSequence):
+  type = 'TEXT'
+
+
+class _Transform:
+  offset_x = 0
+  offset_y = 0
+
+
+class _Element:
+  def __init__(self, filename: str):
+    self.filename = filename
+
+
+class ImageSequence(Sequence):
+  type = 'IMAGE'
+  stretches = True
+
+  def __init__(self, *args, filepath: str = '', **kwargs):
+    super().__init__(*args, **kwargs)
+    self.directory, filename = os.path.split(filepath)
+    self.elements = [_Element(filename)]
+    self.use_translation = False
+    self.transform = _Transform()
+    self.use_flip_x = False
+
+
+class _Sound:
+  def __init__(self, filepath: str):
+    self.filepath = filepath
+    self.use_memory_cache = False
+
+
+class SoundSequence(Sequence):
+  type = 'SOUND'
+
+  def __init__(self, *args, filepath: str = '', **kwargs):
+    super().__init__(*args, **kwargs)
+    self.sound = _Sound(filepath)
+    self.show_waveform = False
+    self.volume = 1.
+
+
+class MovieSequence(Sequence):
+  type = 'MOVIE'
+
+  def __init__(self, *args, filepath: str = '', **kwargs):
+    super().__init__(*args, **kwargs)
+    self.filepath = filepath
+    self.transform = _Transform()
+
+
+_EFFECT_TYPES = {
+  'ADJUSTMENT': AdjustmentSequence,
+  'SPEED': SpeedControlSequence,
+  'TEXT': TextSequence,
+}
+
+
+class Sequences(_Struct):
+  """
+  Top level sequences, with blender's API to create and remove them.
+  """
+
+  def __init__(self, scene: Scene):
+    self._scene = scene
+    self._by_name: Dict[str, Sequence] = {}
+
+  def __iter__(self) -> Iterator[Sequence]:
+    return iter(list(self._by_name.values()))
+
+  def __len__(self) -> int:
+    return len(self._by_name)
+
+  def get(self, name: str, default=None) -> Optional[Sequence]:
+    return self._by_name.get(name, default)
+
+  def __getitem__(self, name: str) -> Sequence:
+    return self._by_name[name]
+
+  def new_effect(self, name, type, channel, frame_start, frame_end=None, seq1=None, seq2=None, seq3=None):
+    if frame_end is None:
+      frame_end = seq1.frame_final_end if seq1 is not None else frame_start + 1
+    seq = _EFFECT_TYPES.get(type, EffectSequence)(name, channel, frame_start, frame_end - frame_start)
+    if isinstance(seq, SpeedControlSequence):
+      seq.input_1 = seq1
+    return self._add(seq)
+
+  def new_image(self, name, filepath, channel, frame_start):
+    return self._add(ImageSequence(name, channel, frame_start, 1, filepath=filepath))
+
+  def new_sound(self, name, filepath, channel, frame_start):
+    fps = self._scene.render.fps / self._scene.render.fps_base
+    return self._add(SoundSequence(name, channel, frame_start, _sound_frames(filepath, fps), filepath=filepath))
+
+  def new_movie(self, name, filepath, channel, frame_start):
+    return self._add(MovieSequence(name, channel, frame_start, 600, filepath=filepath))
+
+  def remove(self, seq: Sequence):
+    del self._by_name[seq.name]
+
+  def _add(self, seq: Sequence) -> Sequence:
+    # blender makes names unique with a numeric suffix
+    if seq.name in self._by_name:
+      base = seq.name
+      suffix = 1
+      while f'{base}.{suffix:03d}' in self._by_name:
+        suffix += 1
+      seq.name = f'{base}.{suffix:03d}'
+    self._by_name[seq.name] = seq
+    seq._set_owner(self._scene, lambda: f'sequence_editor.sequences_all[{json.dumps(seq.name, ensure_ascii=False)}]')
+    return seq
+
+
+def _sound_frames(filepath: str, fps: float) -> int:
+  try:
+    with wave.open(filepath, 'rb') as reader:
+      return max(1, round(reader.getnframes() / reader.getframerate() * fps))
+  except (OSError, wave.Error, EOFError):
+    return round(fps)
+
+
+class PropertyGroup(_Struct):
+  pass
+
+
+class AddonPreferences(_Struct):
+  pass
+
+
+class Operator(_Struct):
+  bl_idname = ''
+  bl_label = ''
+
+  def __init__(self):
+    self.reports: List[Any] = []
+
+  def report(self, level, message: str):
+    self.reports.append((level, message))
+
+
+class Panel(_Struct):
+  pass
+
+
+class _Placeholder(_Struct):
+  pass
+
+
+def _types_getattr(name: str):
+  # types only used in annotations (UILayout, AnyType, ...)
+  if name.startswith('__'):
+    raise AttributeError(name)
+  placeholder = type(name, (_Placeholder,), {})
+  setattr(sys.modules['bpy.types'], name, placeholder)
+  return placeholder
+
+
+# modules
+
+class _Timers:
+  def __init__(self):
+    self.registered: Dict[Callable, float] = {}
+
+  def register(self, function, first_interval=0., persistent=False):
+    self.registered[function] = first_interval
+
+  def unregister(self, function):
+    del self.registered[function]
+
+  def is_registered(self, function) -> bool:
+    return function in self.registered
+
+
+def _module(name: str, **attrs) -> types.ModuleType:
+  module = types.ModuleType(name)
+  module.__dict__.update(attrs)
+  sys.modules[name] = module
+  return module
+
+
+def install(blend_dir: str) -> Context:
+  """
+  Puts fake `bpy` and `bpy_extras` modules in `sys.modules` and returns a context of an empty scene, as of a blend
+  file saved in `blend_dir` (for `//` paths).
+  """
+  bpy_types = _module(
+    'bpy.types',
+    Context=Context, Scene=Scene, SequenceEditor=SequenceEditor, Sequences=Sequences,
+    Sequence=Sequence, EffectSequence=EffectSequence, AdjustmentSequence=AdjustmentSequence,
+    SpeedControlSequence=SpeedControlSequence, TextSequence=TextSequence, ImageSequence=ImageSequence,
+    SoundSequence=SoundSequence, MovieSequence=MovieSequence,
+    PropertyGroup=PropertyGroup, AddonPreferences=AddonPreferences, Operator=Operator, Panel=Panel,
+  )
+  bpy_types.__getattr__ = _types_getattr
+  props = _module(
+    'bpy.props',
+    BoolProperty=_value_property('BOOLEAN', False),
+    IntProperty=_value_property('INT', 0),
+    FloatProperty=_value_property('FLOAT', 0.),
+    StringProperty=_value_property('STRING', ''),
+    FloatVectorProperty=_value_property('FLOAT_VECTOR', (0., 0., 0.)),
+    EnumProperty=_enum_property,
+    PointerProperty=_pointer_property,
+    CollectionProperty=_collection_property,
+  )
+  data = _module('bpy.data', filepath=os.path.join(blend_dir, 'benchmark.blend'), scenes=[])
+
+  def abspath(path: str, start=None, library=None) -> str:
+    if path.startswith('//'):
+      return os.path.join(os.path.dirname(data.filepath), path[2:])
+    return path
+
+  path = _module('bpy.path', abspath=abspath)
+  handlers = _module('bpy.app.handlers', persistent=lambda f: f, load_post=[], depsgraph_update_post=[])
+  app = _module('bpy.app', handlers=handlers, timers=_Timers(), version=(2, 80, 0))
+  utils = _module('bpy.utils', register_class=lambda cls: None, unregister_class=lambda cls: None)
+  msgbus = _module('bpy.msgbus', subscribe_rna=lambda **kwargs: None, clear_by_owner=lambda owner: None)
+  context = Context(Scene())
+  _module(
+    'bpy',
+    types=bpy_types, props=props, data=data, path=path, app=app, utils=utils, msgbus=msgbus, context=context,
+  )
+
+  class ImportHelper(_Struct):
+    filepath: props.StringProperty(name='File Path', subtype='FILE_PATH')
+
+  class ExportHelper(_Struct):
+    filepath: props.StringProperty(name='File Path', subtype='FILE_PATH')
+
+  _module(
+    'bpy_extras',
+    io_utils=_module('bpy_extras.io_utils', ExportHelper=ExportHelper, ImportHelper=ImportHelper),
+  )
+  return context
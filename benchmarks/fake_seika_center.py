@@ -0,0 +1,245 @@
+"""
+Local stand-in of SeikaCenter's HTTP API (`POST /SAVE2/{cid}`, json body, basic auth), for benchmarks and
+testing the synthesis path without a Windows box. Returns deterministic wav data (a tone whose pitch and length
+follow cid, text and effects, with silence around it), with configurable latency, jitter and failures.
+
+  python benchmarks/fake_seika_center.py --port 7180 --latency-ms 300 --jitter-ms 100 --error-rate 0.05
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
+import random
+import re
+import sys
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+FRAME_RATE = 44100
+SEC_PER_CHAR = 0.12
+SILENCE_SEC = 0.2
+
+# defaults of SeikaCenterSetting
+DEFAULT_USER = 'SeikaServerUser'
+DEFAULT_PASSWORD = 'SeikaServerPassword'
+
+_SAVE2_PATH = re.compile(r'^/SAVE2/(\d+)$')
+
+
+class FakeBehavior(NamedTuple):
+  user: str = DEFAULT_USER
+  password: str = DEFAULT_PASSWORD
+  latency_ms: float = 0.
+  # latency is uniform in latency_ms +- jitter_ms
+  jitter_ms: float = 0.
+  # ratio of responses failing with 500
+  error_rate: float = 0.
+  # ratio of responses with status 200 and no body
+  empty_rate: float = 0.
+  # send bodies with chunked transfer encoding instead of Content-Length
+  chunked: bool = False
+  seed: int = 0
+
+
+def synthesize(cid: int, text: str, effects: Dict[str, float]) -> bytes:
+  """
+  Deterministic 16 bit mono wav for the request: a tone, padded with silence as voiceroid does.
+  """
+  speed = float(effects.get('speed', 1.)) or 1.
+  volume = float(effects.get('volume', 1.))
+  pitch = float(effects.get('pitch', 1.))
+  seed = int.from_bytes(hashlib.sha256(f'{cid}:{text}'.encode()).digest()[:4], 'little')
+  frequency = (150 + seed % 250) * pitch
+
+  voiced = np.arange(int(FRAME_RATE * max(1, len(text)) * SEC_PER_CHAR / speed))
+  tone = np.sin(2 * np.pi * frequency * voiced / FRAME_RATE) * min(1., 0.3 * volume) * 32767
+  silence = np.zeros(int(FRAME_RATE * SILENCE_SEC))
+  samples = np.concatenate([silence, tone, silence]).astype('<i2')
+
+  buffer = io.BytesIO()
+  with wave.open(buffer, 'wb') as writer:
+    writer.setnchannels(1)
+    writer.setsampwidth(2)
+    writer.setframerate(FRAME_RATE)
+    writer.writeframes(samples.tobytes())
+  return buffer.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+  # keep-alive, as the real server; the client reuses connections
+  protocol_version = 'HTTP/1.1'
+  server: '_Server'
+
+  def do_POST(self):
+    length = int(self.headers.get('Content-Length', 0))
+    payload = self.rfile.read(length)
+
+    match = _SAVE2_PATH.match(self.path)
+    if match is None:
+      return self._reply(404, b'')
+    if self.headers.get('Authorization') != self.server.expected_auth:
+      return self._reply(401, b'', {'WWW-Authenticate': 'Basic realm="SeikaCenter"'})
+    try:
+      request = json.loads(payload.decode('utf-8'))
+      text = request['talktext']
+      effects = request.get('effects', {})
+    except (ValueError, KeyError):
+      return self._reply(400, b'')
+
+    latency_ms, outcome = self.server.next_outcome()
+    time.sleep(latency_ms / 1000)
+    if outcome == 'error':
+      return self._reply(500, b'')
+    if outcome == 'empty':
+      return self._reply(200, b'')
+    return self._reply(200, self.server.voice(int(match.group(1)), text, effects), {'Content-Type': 'audio/wav'})
+
+  def _reply(self, status: int, body: bytes, headers: Optional[Dict[str, str]] = None):
+    self.send_response(status)
+    for key, value in (headers or {}).items():
+      self.send_header(key, value)
+    if self.server.behavior.chunked and len(body) > 0:
+      self.send_header('Transfer-Encoding', 'chunked')
+      self.end_headers()
+      for i in range(0, len(body), 16 * 1024):
+        chunk = body[i:i + 16 * 1024]
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+      self.wfile.write(b'0\r\n\r\n')
+    else:
+      self.send_header('Content-Length', str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+  def log_message(self, format, *args):
+    if self.server.verbose:
+      super().log_message(format, *args)
+
+
+class _Server(ThreadingHTTPServer):
+  daemon_threads = True
+
+  def __init__(self, address: Tuple[str, int], behavior: FakeBehavior, verbose: bool):
+    super().__init__(address, _Handler)
+    self.behavior = behavior
+    self.verbose = verbose
+    credentials = f'{behavior.user}:{behavior.password}'.encode()
+    self.expected_auth = 'Basic ' + base64.b64encode(credentials).decode()
+    self._random = random.Random(behavior.seed)
+    self._lock = threading.Lock()
+    self._voices: Dict[str, bytes] = {}
+
+  def next_outcome(self) -> Tuple[float, str]:
+    # one seeded generator for all requests, so a run with the same settings fails the same number of times
+    with self._lock:
+      behavior = self.behavior
+      latency_ms = max(0., behavior.latency_ms + self._random.uniform(-behavior.jitter_ms, behavior.jitter_ms))
+      roll = self._random.random()
+    if roll < behavior.error_rate:
+      return latency_ms, 'error'
+    if roll < behavior.error_rate + behavior.empty_rate:
+      return latency_ms, 'empty'
+    return latency_ms, 'ok'
+
+  def voice(self, cid: int, text: str, effects: Dict[str, float]) -> bytes:
+    key = json.dumps([cid, text, effects], sort_keys=True)
+    with self._lock:
+      cached = self._voices.get(key)
+    if cached is None:
+      cached = synthesize(cid, text, effects)
+      with self._lock:
+        self._voices[key] = cached
+    return cached
+
+
+class FakeSeikaCenter:
+  """
+  Runs the fake server on a background thread; `port=0` picks a free port.
+  """
+
+  def __init__(self, behavior: FakeBehavior = FakeBehavior(), host: str = '127.0.0.1', port: int = 0,
+               verbose: bool = False):
+    self._server = _Server((host, port), behavior, verbose)
+    self._thread: Optional[threading.Thread] = None
+
+  @property
+  def addr(self) -> str:
+    host, port = self._server.server_address[:2]
+    return f'http://{host}:{port}'
+
+  @property
+  def behavior(self) -> FakeBehavior:
+    return self._server.behavior
+
+  def start(self) -> 'FakeSeikaCenter':
+    self._thread = threading.Thread(target=self._server.serve_forever, name='fake-seika-center', daemon=True)
+    self._thread.start()
+    return self
+
+  def serve_forever(self):
+    """Serves on the calling thread until interrupted."""
+    try:
+      self._server.serve_forever()
+    except KeyboardInterrupt:
+      pass
+    finally:
+      self._server.server_close()
+
+  def stop(self):
+    self._server.shutdown()
+    self._server.server_close()
+    if self._thread is not None:
+      self._thread.join()
+      self._thread = None
+
+  def __enter__(self) -> 'FakeSeikaCenter':
+    return self.start()
+
+  def __exit__(self, *_):
+    self.stop()
+
+
+def add_behavior_arguments(parser: argparse.ArgumentParser):
+  parser.add_argument('--user', default=DEFAULT_USER)
+  parser.add_argument('--password', default=DEFAULT_PASSWORD)
+  parser.add_argument('--latency-ms', type=float, default=0.)
+  parser.add_argument('--jitter-ms', type=float, default=0.)
+  parser.add_argument('--error-rate', type=float, default=0.)
+  parser.add_argument('--empty-rate', type=float, default=0.)
+  parser.add_argument('--chunked', action='store_true')
+  parser.add_argument('--seed', type=int, default=0)
+
+
+def behavior_from_args(args: argparse.Namespace) -> FakeBehavior:
+  return FakeBehavior(
+    user=args.user,
+    password=args.password,
+    latency_ms=args.latency_ms,
+    jitter_ms=args.jitter_ms,
+    error_rate=args.error_rate,
+    empty_rate=args.empty_rate,
+    chunked=args.chunked,
+    seed=args.seed,
+  )
+
+
+def main(argv: List[str]):
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=7180)
+  parser.add_argument('--verbose', action='store_true')
+  add_behavior_arguments(parser)
+  args = parser.parse_args(argv)
+
+  server = FakeSeikaCenter(behavior_from_args(args), host=args.host, port=args.port, verbose=args.verbose)
+  print(f'fake SeikaCenter on {server.addr} ({server.behavior})')
+  server.serve_forever()
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
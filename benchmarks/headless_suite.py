@@ -0,0 +1,325 @@
+"""
+Benchmarks of kiritanify's hot paths without blender, on synthetic timelines: operators and models run on the fake
+`bpy` of `fake_bpy.py`, voices come from the fake SeikaCenter. Results are written as json and compared with a
+stored baseline (`baselines/headless_suite.json`, of the default options); slower results are flagged and make the
+exit status 1, as does a missing baseline file unless `--save-baseline` is given.
+
+  python benchmarks/headless_suite.py --strips 1000 5000 20000 --font /usr/share/fonts/TTF/mplus-1p-regular.ttf
+  python benchmarks/headless_suite.py --save-baseline  # after a change known to be good
+
+Strip counts are of the timeline after a run: each script gets a voice and a caption strip, so 1/3 are scripts.
+Captions are rendered with `--font` (or the default font of CaptionStyle); when it does not exist, with the font
+embedded in Pillow, which has no japanese glyphs. Benchmarks of the baseline missing in the results fail the run.
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from pydub import AudioSegment
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARK_DIR.parent))
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+import fake_bpy
+
+_context = fake_bpy.install(tempfile.gettempdir())
+
+import bpy
+import kiritanify
+from fake_seika_center import FakeSeikaCenter, synthesize
+from kiritanify import wav
+from kiritanify.caption_renderer import render_text_cropped
+from kiritanify.ops import KIRITANIFY_OT_RemoveCacheFiles, KIRITANIFY_OT_RunKiritanifyForAllScripts, \
+  KIRITANIFY_OT_SetDefaultCharacters
+from kiritanify.propgroups import CaptionStyle, _global_setting, _script_setting
+from kiritanify.seika_center import trim_silence
+from kiritanify.utils import SequenceIndex, find_neighbor_sequence
+
+DEFAULT_BASELINE = BENCHMARK_DIR / 'baselines' / 'headless_suite.json'
+FORMAT_VERSION = 1
+
+# frames per script on the timeline
+SCRIPT_FRAMES = 90
+SCRIPT_GAP_FRAMES = 6
+
+# peak memory allocated by trimming a voice, relative to its size; trimming scans the silence a block at a time
+# and returns a view, so a copy of the samples (e.g. as float) exceeds this
+TRIM_SILENCE_MAX_PEAK_RATIO = 0.5
+
+
+def _timed(function: Callable[[], object]) -> float:
+  start = time.perf_counter()
+  function()
+  return time.perf_counter() - start
+
+
+def _median_of(function: Callable[[], object], repeat: int) -> float:
+  return statistics.median(_timed(function) for _ in range(repeat))
+
+
+def _peak_bytes(function: Callable[[], object]) -> int:
+  tracemalloc.start()
+  try:
+    function()
+    return tracemalloc.get_traced_memory()[1]
+  finally:
+    tracemalloc.stop()
+
+
+def _new_scene(blend_dir: Path, font: Optional[str], seika_addr: str):
+  """
+  Empty scene with the default characters, as of a blend file in `blend_dir`.
+  """
+  bpy.data.filepath = str(blend_dir / 'benchmark.blend')
+  scene = fake_bpy.Scene()
+  scene.sequence_editor_create()
+  _context.scene = scene
+  bpy.data.scenes = [scene]
+  KIRITANIFY_OT_SetDefaultCharacters().execute(_context)
+  gs = _global_setting(_context)
+  gs.seika_center.addr = seika_addr
+  gs.seika_center.max_workers = 8
+  for chara in gs.characters:
+    chara.caption_style.font_path = font or ''
+  return scene
+
+
+def _add_scripts(num_scripts: int, font: Optional[str]):
+  gs = _global_setting(_context)
+  sequences = _context.scene.sequence_editor.sequences
+  frame = 1
+  for i in range(num_scripts):
+    chara = gs.characters[i % len(gs.characters)]
+    seq = sequences.new_effect(
+      name=f'Script:{chara.chara_name}:{i:06d}',
+      type='ADJUSTMENT',
+      channel=chara.script_channel(gs),
+      frame_start=frame,
+      frame_end=frame + SCRIPT_FRAMES,
+    )
+    setting = _script_setting(seq)
+    setting.text = f'{i}番目のセリフです、おふとんもぐもぐ'
+    setting.gen_caption = font is not None
+    frame += SCRIPT_FRAMES + SCRIPT_GAP_FRAMES
+
+
+def _run_all(force_all: bool = False):
+  op = KIRITANIFY_OT_RunKiritanifyForAllScripts()
+  op.force_all = force_all
+  op.execute(_context)
+  if any(level == {'WARNING'} for level, _ in op.reports):
+    raise RuntimeError(f'run failed: {op.reports}')
+
+
+def _edit_scripts(ratio: float, round_: int):
+  """
+  Changes text of some scripts, which marks them dirty by their update callback.
+  """
+  scripts = [seq for seq in _context.scene.sequence_editor.sequences if seq.name.startswith('Script:')]
+  for seq in scripts[::max(1, int(1 / ratio))]:
+    setting = _script_setting(seq)
+    setting.text = f'{setting.text}、{round_}回目の修正'
+
+
+def _timeline_benchmarks(
+    strips: int, work_dir: Path, font: Optional[str], seika_addr: str, repeat: int,
+) -> Dict[str, float]:
+  results: Dict[str, float] = {}
+  num_scripts = strips // 3
+  _new_scene(work_dir / f'timeline_{strips}', font, seika_addr)
+  _add_scripts(num_scripts, font)
+
+  # synthesizes (fake) voices and renders captions of all scripts; later runs start from here
+  results['run_all/cold'] = _timed(_run_all)
+  # nothing changed: only aligns sequences
+  results['run_all/clean'] = _median_of(_run_all, repeat)
+  # every script checked against its cache state, nothing generated
+  results['run_all/force_cached'] = _median_of(lambda: _run_all(force_all=True), repeat)
+  edit_times = []
+  for round_ in range(repeat):
+    _edit_scripts(0.01, round_)
+    edit_times.append(_timed(_run_all))
+  results['run_all/edit_1pct'] = statistics.median(edit_times)
+
+  gs = _global_setting(_context)
+  channel = gs.characters[0].voice_channel(gs)
+  last_frame = num_scripts * (SCRIPT_FRAMES + SCRIPT_GAP_FRAMES)
+  frames = [random.Random(i).randrange(1, last_frame) for i in range(100)]
+
+  def neighbors_per_call():
+    for frame in frames:
+      find_neighbor_sequence(_context, channel, frame)
+
+  def neighbors_with_index():
+    index = SequenceIndex.build(_context)
+    for frame in frames * 100:
+      index.neighbors(channel, frame)
+
+  # builds the index on every call, as operators acting on one strip do
+  results['find_neighbor_sequence/100_calls'] = _median_of(neighbors_per_call, repeat)
+  results['sequence_index/build_and_10k_queries'] = _median_of(neighbors_with_index, repeat)
+
+  # strips of a tenth of the scripts deleted, their files become garbage
+  sequences = _context.scene.sequence_editor.sequences
+  for seq in [seq for seq in sequences if seq.name.startswith('Voice:')][::10]:
+    sequences.remove(seq)
+  results['remove_cache_files'] = _timed(lambda: KIRITANIFY_OT_RemoveCacheFiles().execute(_context))
+  return results
+
+
+def _render_benchmarks(font: Optional[str], repeat: int) -> Dict[str, float]:
+  results: Dict[str, float] = {}
+  if font is not None:
+    texts = [f'{i}番目のセリフです\nおふとんもぐもぐ' for i in range(50)]
+
+    def render():
+      # distinct texts, so that the render cache does not answer
+      for text in texts:
+        render_text_cropped(
+          canvas_size=(1920, 256),
+          text=f'{text}{time.perf_counter_ns()}',
+          background_color=(0, 0, 0, 0),
+          fill_color=(1, 1, 1, 1),
+          stroke_color=(0.23, 0.23, 0.23, 1),
+          stroke_width=8,
+          font_path=font,
+          font_size=42,
+        )
+
+    results['render_text/50_captions'] = _median_of(render, repeat)
+
+  content = synthesize(1700, 'あ' * 80, {})  # 10 seconds of voice with silence around
+  results['trim_silence/pcm'] = _median_of(lambda: wav.trim_silence(wav.parse_wav(content)), repeat)
+  peak = _peak_bytes(lambda: wav.trim_silence(wav.parse_wav(content)))
+  if peak > len(content) * TRIM_SILENCE_MAX_PEAK_RATIO:
+    raise RuntimeError(f'trim_silence allocated {peak} bytes for a voice of {len(content)} bytes')
+  # the pydub path, used when a voice is not 16/32 bit pcm
+  segment = AudioSegment.from_wav(io.BytesIO(content))
+  results['trim_silence/pydub'] = _median_of(lambda: trim_silence(segment), repeat)
+  return results
+
+
+def _pillow_font(directory: Path) -> Optional[str]:
+  """
+  The truetype font embedded in Pillow (10.1+ with freetype), written to `directory`.
+  """
+  from PIL import ImageFont
+  font = ImageFont.load_default(size=42)
+  if not isinstance(getattr(font, 'path', None), io.BytesIO):
+    return None
+  path = directory / 'pillow_default.ttf'
+  path.write_bytes(font.path.getvalue())
+  return str(path)
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float, min_delta_sec: float) \
+    -> List[str]:
+  """
+  Names of results slower than the baseline by more than `tolerance` (ratio) and `min_delta_sec`.
+  """
+  regressions = []
+  for name, sec in results.items():
+    base = baseline.get(name)
+    if base is not None and sec > base * (1 + tolerance) and sec - base > min_delta_sec:
+      regressions.append(name)
+  return regressions
+
+
+def missing(results: Dict[str, float], baseline: Dict[str, float]) -> List[str]:
+  """
+  Names of baseline benchmarks that did not run, e.g. captions without a font.
+  """
+  return [name for name in baseline if name not in results]
+
+
+def _print_table(results: Dict[str, float], baseline: Dict[str, float], regressions: List[str]):
+  print(f'{"benchmark":<48} {"sec":>10} {"baseline":>10} {"ratio":>7}')
+  for name, sec in results.items():
+    base = baseline.get(name)
+    ratio = '-' if base is None or base <= 0 else f'{sec / base:.2f}'
+    flag = '  REGRESSION' if name in regressions else ''
+    base_text = '-' if base is None else f'{base:.4f}'
+    print(f'{name:<48} {sec:>10.4f} {base_text:>10} {ratio:>7}{flag}')
+  for name in missing(results, baseline):
+    print(f'{name:<48} {"-":>10} {baseline[name]:>10.4f} {"-":>7}  MISSING')
+
+
+def main(argv: List[str]) -> int:
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--strips', type=int, nargs='+', default=[1000, 5000, 20000])
+  parser.add_argument('--repeat', type=int, default=3)
+  parser.add_argument('--font', default=CaptionStyle.font_path.default())
+  parser.add_argument('--output', type=Path, help='write results to this json file')
+  parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+  parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+  parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown ratio')
+  parser.add_argument('--min-delta-sec', type=float, default=0.005, help='ignore slowdowns below this')
+  parser.add_argument('--verbose', action='store_true')
+  args = parser.parse_args(argv)
+
+  if not args.save_baseline and not args.baseline.exists():
+    # without a baseline nothing would be flagged
+    print(f'baseline not found: {args.baseline}, store one with --save-baseline', file=sys.stderr)
+    return 1
+  if not args.verbose:
+    logging.disable(logging.WARNING)
+  font = args.font if args.font and os.path.exists(args.font) else None
+
+  kiritanify.register()
+  results: Dict[str, float] = {}
+  try:
+    with tempfile.TemporaryDirectory() as work_dir, FakeSeikaCenter() as seika:
+      if font is None:
+        font = _pillow_font(Path(work_dir))
+        print(f'font not found ({args.font}), using the font of Pillow: {font}', file=sys.stderr)
+      for strips in args.strips:
+        for name, sec in _timeline_benchmarks(strips, Path(work_dir), font, seika.addr, args.repeat).items():
+          results[f'{name}@{strips}'] = sec
+      results.update(_render_benchmarks(font, args.repeat))
+  finally:
+    kiritanify.unregister()
+
+  document = {
+    'version': FORMAT_VERSION,
+    'python': sys.version.split()[0],
+    'platform': platform.platform(),
+    'font': font if font == args.font else 'pillow default',
+    'results': results,
+  }
+  baseline: Dict[str, float] = {}
+  if not args.save_baseline:
+    baseline = json.loads(args.baseline.read_text())['results']
+  regressions = compare(results, baseline, args.tolerance, args.min_delta_sec)
+  missing_names = missing(results, baseline)
+  _print_table(results, baseline, regressions)
+
+  if args.output is not None:
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(document, indent=2, ensure_ascii=False))
+  if args.save_baseline:
+    args.baseline.parent.mkdir(parents=True, exist_ok=True)
+    args.baseline.write_text(json.dumps(document, indent=2, ensure_ascii=False))
+    print(f'baseline saved: {args.baseline}')
+  if len(regressions) > 0:
+    print(f'{len(regressions)} regression(s) above {args.tolerance:.0%}', file=sys.stderr)
+  if len(missing_names) > 0:
+    print(f'{len(missing_names)} benchmark(s) of the baseline missing', file=sys.stderr)
+  if len(regressions) > 0 or len(missing_names) > 0:
+    return 1
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
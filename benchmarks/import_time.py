@@ -0,0 +1,104 @@
+"""
+Import cost of registering the add-on, as paid at every blender start: wall time of `kiritanify.register()` in
+fresh interpreters (on the fake `bpy` of `fake_bpy.py`), the heaviest modules it imports (`python -X importtime`)
+and the cost deferred to the first voice or caption. Exits with 1 when registration imports a heavy library.
+
+  python benchmarks/import_time.py --repeat 10
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+
+# imported on first synthesis or render; registering the add-on must not need them
+HEAVY_MODULES = ['numpy', 'PIL', 'pydub', 'requests', 'soundfile']
+
+# written to stderr around registration, to tell its imports in the -X importtime output
+_MARKER = '-- register --'
+_END_MARKER = '-- registered --'
+
+# runs in a fresh interpreter per sample; prints a json line of its measurements
+_CHILD = f"""
+import json, sys, tempfile, time
+sys.path.insert(0, {str(BENCHMARK_DIR.parent)!r})
+sys.path.insert(0, {str(BENCHMARK_DIR)!r})
+import fake_bpy
+fake_bpy.install(tempfile.gettempdir())
+heavy = {HEAVY_MODULES!r}
+preloaded = [m for m in heavy if m in sys.modules]
+sys.stderr.write({_MARKER!r} + '\\n')
+sys.stderr.flush()
+start = time.perf_counter()
+import kiritanify
+kiritanify.register()
+register_sec = time.perf_counter() - start
+loaded = [m for m in heavy if m in sys.modules and m not in preloaded]
+sys.stderr.write({_END_MARKER!r} + '\\n')
+sys.stderr.flush()
+start = time.perf_counter()
+import numpy, PIL.Image, PIL.ImageDraw, PIL.ImageFont, pydub, requests
+deferred_sec = time.perf_counter() - start
+kiritanify.unregister()
+print(json.dumps({{'register_sec': register_sec, 'deferred_sec': deferred_sec, 'heavy_loaded': loaded}}))
+"""
+
+
+class ImportTime(NamedTuple):
+  name: str
+  self_sec: float
+  cumulative_sec: float
+
+
+def _run_child() -> Tuple[Dict, List[ImportTime]]:
+  process = subprocess.run(
+    [sys.executable, '-X', 'importtime', '-c', _CHILD],
+    stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True,
+  )
+  result = json.loads(process.stdout.strip().splitlines()[-1])
+  lines = process.stderr.partition(_MARKER)[2].partition(_END_MARKER)[0].splitlines()
+  imports = []
+  for line in lines:
+    if not line.startswith('import time:') or '|' not in line:
+      continue
+    self_us, cumulative_us, name = line[len('import time:'):].split('|')
+    if not self_us.strip().isdigit():
+      continue  # header
+    imports.append(ImportTime(name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+  return result, imports
+
+
+def main(argv: List[str]) -> int:
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--repeat', type=int, default=5)
+  parser.add_argument('--top', type=int, default=15, help='number of modules listed by self time')
+  args = parser.parse_args(argv)
+
+  samples = []
+  imports: List[ImportTime] = []
+  for _ in range(args.repeat):
+    result, imports = _run_child()
+    samples.append(result)
+
+  register_ms = statistics.median(s['register_sec'] for s in samples) * 1000
+  deferred_ms = statistics.median(s['deferred_sec'] for s in samples) * 1000
+  heavy_loaded = sorted({m for s in samples for m in s['heavy_loaded']})
+  print(f'register (median of {args.repeat}): {register_ms:.1f} ms, modules imported: {len(imports)}')
+  print(f'deferred to first voice/caption: {deferred_ms:.1f} ms')
+  print()
+  print(f'{"module":<48} {"self ms":>9} {"cumul ms":>9}')
+  for imported in sorted(imports, key=lambda i: i.self_sec, reverse=True)[:args.top]:
+    print(f'{imported.name:<48} {imported.self_sec * 1000:>9.2f} {imported.cumulative_sec * 1000:>9.2f}')
+
+  if len(heavy_loaded) > 0:
+    print(f'\nregistration imports heavy modules: {", ".join(heavy_loaded)}', file=sys.stderr)
+    return 1
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,97 @@
+"""
+Throughput of `maybe_run_seika_center` at different concurrency levels: lines/s, p50/p95 latency per line
+(retries included) and request counters. Runs against a fake SeikaCenter started in process, or a real one.
+
+  python benchmarks/seika_center_throughput.py --lines 200 --concurrency 1 4 8 --latency-ms 300 --error-rate 0.05
+  python benchmarks/seika_center_throughput.py --addr http://192.168.88.7:7180 --lines 20 --concurrency 1 4
+"""
+import argparse
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_seika_center import FakeSeikaCenter, add_behavior_arguments, behavior_from_args
+from kiritanify import seika_center, wav
+from kiritanify.seika_center import REQUEST_STATS, SeikaCenterConfig, SeikaCenterError, VoiceParams, \
+  maybe_run_seika_center
+
+STYLE = VoiceParams(volume=1., speed=1.3, pitch=1., intonation=1.1)
+
+
+def _texts(num_lines: int, run: int) -> List[str]:
+  # unique per run, so that no layer in between can serve cached responses
+  return [f'ベンチマーク{run}の{i}行目です、おふとんもぐもぐ' for i in range(num_lines)]
+
+
+def _run_line(config: SeikaCenterConfig, cid: int, text: str, decode: bool) -> Optional[float]:
+  start = time.perf_counter()
+  try:
+    content = maybe_run_seika_center(seika_setting=config, cid=cid, body=text, style=STYLE)
+  except SeikaCenterError:
+    return None
+  if decode:
+    wav.trim_silence(wav.parse_wav(content))
+  return time.perf_counter() - start
+
+
+def _percentile(values: List[float], q: float) -> float:
+  ordered = sorted(values)
+  return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main(argv: List[str]):
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--addr', help='SeikaCenter to benchmark; a fake one is started when omitted')
+  parser.add_argument('--cid', type=int, default=1700)
+  parser.add_argument('--lines', type=int, default=100)
+  parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8])
+  parser.add_argument('--max-attempts', type=int, default=4)
+  parser.add_argument('--backoff-base-sec', type=float, default=seika_center.BACKOFF_BASE_SEC)
+  parser.add_argument('--decode', action='store_true', help='include wav parsing and silence trimming')
+  parser.add_argument('--verbose', action='store_true', help='show logs of each request and retry')
+  add_behavior_arguments(parser)
+  args = parser.parse_args(argv)
+
+  if not args.verbose:
+    logging.disable(logging.WARNING)
+
+  seika_center.BACKOFF_BASE_SEC = args.backoff_base_sec
+  fake = None
+  addr = args.addr
+  if addr is None:
+    fake = FakeSeikaCenter(behavior_from_args(args)).start()
+    addr = fake.addr
+    print(f'fake SeikaCenter: {fake.behavior}')
+  config = SeikaCenterConfig(addr=addr, user=args.user, password=args.password, max_attempts=args.max_attempts)
+
+  print(f'{"workers":>7} {"lines/s":>9} {"p50 ms":>9} {"p95 ms":>9} {"failed":>7} {"retries":>8} '
+        f'{"5xx":>5} {"empty":>6} {"conn":>5}')
+  try:
+    for run, workers in enumerate(args.concurrency):
+      texts = _texts(args.lines, run)
+      REQUEST_STATS.reset()
+      start = time.perf_counter()
+      with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda text: _run_line(config, args.cid, text, args.decode), texts))
+      elapsed = time.perf_counter() - start
+
+      latencies = [r for r in results if r is not None]
+      stats = REQUEST_STATS.snapshot()
+      p50 = '-' if len(latencies) == 0 else f'{_percentile(latencies, 0.5) * 1000:.1f}'
+      p95 = '-' if len(latencies) == 0 else f'{_percentile(latencies, 0.95) * 1000:.1f}'
+      print(f'{workers:>7} {len(latencies) / elapsed:>9.2f} {p50:>9} {p95:>9} {len(results) - len(latencies):>7} '
+            f'{stats["retries"]:>8} {stats["error_responses"]:>5} {stats["empty_responses"]:>6} '
+            f'{stats["connection_errors"]:>5}')
+  finally:
+    if fake is not None:
+      fake.stop()
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -1,16 +1,7 @@
-import logging
-
-logging.basicConfig(level=logging.DEBUG)
-
-import bpy
-
-from kiritanify.ops import OP_CLASSES
-from kiritanify.panels import PANEL_CLASSES
-from kiritanify.propgroups import (
-  KiritanifyGlobalSetting,
-  KiritanifyScriptSequenceSetting,
-  PROPGROUP_CLASSES,
-)
+# bpy and the blender facing modules are imported in register(), so that worker processes (plain python, no bpy)
+# can import kiritanify.jobs. Libraries only needed to synthesize or render (numpy, pydub, requests, pillow) are
+# imported on first use, not at blender start.
+# Logging is left to blender (or the user); an add-on configuring the root logger changes it for every add-on.
 
 bl_info = {
   "name": "kiritanify",
@@ -21,15 +12,26 @@ bl_info = {
   "description": "Generate voiceroid sound data from caption data.",
 }
 
-CLASSES = (
-    PROPGROUP_CLASSES
-    + OP_CLASSES
-    + PANEL_CLASSES
-)
+
+def _classes():
+  from kiritanify.ops import OP_CLASSES
+  from kiritanify.panels import PANEL_CLASSES
+  from kiritanify.preferences import PREFERENCE_CLASSES
+  from kiritanify.propgroups import PROPGROUP_CLASSES
+  return (
+      PREFERENCE_CLASSES
+      + PROPGROUP_CLASSES
+      + OP_CLASSES
+      + PANEL_CLASSES
+  )
 
 
 def register():
-  for cls in CLASSES:
+  import bpy
+  from kiritanify import handlers
+  from kiritanify.propgroups import KiritanifyGlobalSetting, KiritanifyScriptSequenceSetting
+
+  for cls in _classes():
     bpy.utils.register_class(cls)
 
   bpy.types.AdjustmentSequence.kiritanify_script = bpy.props.PointerProperty(
@@ -40,10 +42,18 @@ def register():
     name="Kiritanify Global Settings",
     type=KiritanifyGlobalSetting,
   )
+  handlers.register()
 
 
 def unregister():
-  for cls in reversed(CLASSES):
+  import bpy
+  from kiritanify import handlers, prefetch
+  from kiritanify.manifest import close_manifests
+
+  handlers.unregister()
+  prefetch.unregister()
+  close_manifests()
+  for cls in reversed(_classes()):
     bpy.utils.unregister_class(cls)
   del bpy.types.Scene.kiritanify
   del bpy.types.AdjustmentSequence.kiritanify_script
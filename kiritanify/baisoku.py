@@ -0,0 +1,226 @@
+# Baisoku (speed up) editing through the data API.
+# A movie sequence sped up by a speed control sequence (without default fade) shows content frame
+# `frame_offset_start + (frame - frame_final_start) * speed_factor` at timeline `frame`. Cuts are computed in
+# content frames of the original sequence, then the parts are laid out on the timeline one after another.
+import re
+from typing import TYPE_CHECKING, Callable, Iterable, List, NamedTuple, Optional, Tuple
+
+# bpy only for annotations; the segment math is plain python
+if TYPE_CHECKING:
+  from bpy.types import Sequences
+
+  from kiritanify.types import MovieSequence, SpeedControlSequence
+  from kiritanify.utils import SequenceIndex
+
+# copied from the original sequence to the parts cut from it, when available in this blender version
+_MOVIE_ATTRS = (
+  'stream_index', 'blend_type', 'blend_alpha', 'mute', 'color_saturation', 'color_multiply',
+  'use_float', 'use_flip_x', 'use_flip_y', 'use_reverse_frames', 'use_translation', 'use_crop',
+  'use_proxy', 'alpha_mode',
+)
+
+# marker names giving a speed factor: `2`, `x2`, `2x`, `1.5倍`, ...
+_SPEED_MARKER = re.compile(r'^\s*[xX×]?\s*(\d+(?:\.\d+)?)\s*(?:[xX×]|倍(?:速)?)?\s*$')
+# `.001` suffix blender adds to duplicate names
+_NUMBER_SUFFIX = re.compile(r'\.\d{3,}$')
+
+
+class SpeedSegment(NamedTuple):
+  """
+  Part of a movie, [content_start, content_end) in content frames, played at `speed_factor`.
+  """
+  content_start: float
+  content_end: float
+  speed_factor: float
+
+
+def parse_speed_marker(name: str) -> Optional[float]:
+  match = _SPEED_MARKER.match(name)
+  if match is None:
+    return None
+  speed_factor = float(match.group(1))
+  return speed_factor if speed_factor > 0 else None
+
+
+def speed_factor_of(speed_seq: Optional['SpeedControlSequence']) -> float:
+  return 1. if speed_seq is None else speed_seq.speed_factor
+
+
+def to_content_frame(movie_seq: 'MovieSequence', speed_factor: float, frame: float) -> float:
+  return movie_seq.frame_offset_start + (frame - movie_seq.frame_final_start) * speed_factor
+
+
+def segments_for_cuts(
+    movie_seq: 'MovieSequence',
+    speed_factor: float,
+    cuts: Iterable[Tuple[int, Optional[float]]],
+) -> List[SpeedSegment]:
+  """
+  Splits the movie at timeline frames of `cuts`; each part gets the speed of the cut starting it (None: the
+  speed of the previous part). A cut on the first frame sets the speed of the first part; cuts outside the
+  sequence are ignored.
+  """
+  start = to_content_frame(movie_seq, speed_factor, movie_seq.frame_final_start)
+  end = to_content_frame(movie_seq, speed_factor, movie_seq.frame_final_end)
+  segments = []
+  current = SpeedSegment(content_start=start, content_end=end, speed_factor=speed_factor)
+  for frame, cut_speed_factor in sorted(cuts, key=lambda c: c[0]):
+    if frame == movie_seq.frame_final_start and cut_speed_factor is not None:
+      current = current._replace(speed_factor=cut_speed_factor)
+      continue
+    if not (movie_seq.frame_final_start < frame < movie_seq.frame_final_end):
+      continue
+    cut = to_content_frame(movie_seq, speed_factor, frame)
+    segments.append(current._replace(content_end=cut))
+    current = SpeedSegment(
+      content_start=cut,
+      content_end=end,
+      speed_factor=current.speed_factor if cut_speed_factor is None else cut_speed_factor,
+    )
+  segments.append(current)
+  return segments
+
+
+def layout_segments(frame_start: int, segments: List[SpeedSegment]) -> List[Tuple[int, int]]:
+  """
+  Timeline (frame_final_start, frame_final_end) of segments placed one after another from `frame_start`.
+  Ends are rounded from the exact total, so rounding errors do not add up over many segments.
+  """
+  ranges = []
+  exact_end = float(frame_start)
+  start = frame_start
+  for segment in segments:
+    exact_end += (segment.content_end - segment.content_start) / segment.speed_factor
+    end = max(start + 1, round(exact_end))
+    ranges.append((start, end))
+    start = end
+  return ranges
+
+
+def unique_name(base: str, is_taken: Callable[[str], bool]) -> str:
+  """
+  `base`, or `base.001`, `base.002`, ... as blender names duplicates. Names are checked with `is_taken` (an index
+  lookup), so that blender does not scan all sequences to make the name unique.
+  """
+  if not is_taken(base):
+    return base
+  base = _NUMBER_SUFFIX.sub('', base)
+  number = 1
+  while is_taken(f'{base}.{number:03d}'):
+    number += 1
+  return f'{base}.{number:03d}'
+
+
+def apply_segments(
+    sequences: 'Sequences',
+    movie_seq: 'MovieSequence',
+    speed_seq: Optional['SpeedControlSequence'],
+    segments: List[SpeedSegment],
+    index: 'SequenceIndex',
+) -> List[Tuple['MovieSequence', 'SpeedControlSequence']]:
+  """
+  Makes `movie_seq` the first segment and creates a movie and speed sequence for each of the others,
+  in one pass without operators. Returns (movie, speed) sequences of all segments. New sequences are added to
+  `index`, which also gives their unique names.
+  Raises ValueError, before changing anything, when the parts would run into the next sequence of their channels
+  (slowed down parts are longer than the movie).
+  """
+  ranges = layout_segments(movie_seq.frame_final_start, segments)
+  channel = movie_seq.channel
+  speed_channel = _speed_channel(movie_seq) if speed_seq is None else speed_seq.channel
+  for _channel in (channel, speed_channel):
+    _, _, seq_next = index.neighbors(_channel, movie_seq.frame_final_start)
+    if seq_next is not None and seq_next.frame_final_start < ranges[-1][1]:
+      raise ValueError(
+        f'{movie_seq.name}: parts end at frame {ranges[-1][1]}, '
+        f'overlapping {seq_next.name} from frame {seq_next.frame_final_start}'
+      )
+
+  # shrink the original first, so that the new sequences do not overlap it
+  _place(movie_seq, segments[0], *ranges[0])
+  if speed_seq is None:
+    speed_seq = new_speed_sequence(sequences, movie_seq, segments[0].speed_factor, index=index)
+  else:
+    speed_seq.speed_factor = segments[0].speed_factor
+
+  parts = [(movie_seq, speed_seq)]
+  for segment, (frame_start, frame_end) in zip(segments[1:], ranges[1:]):
+    part = sequences.new_movie(
+      name=unique_name(movie_seq.name, _is_taken_in(index)),
+      filepath=movie_seq.filepath,
+      channel=channel,
+      frame_start=frame_start - round(segment.content_start),
+    )
+    _copy_movie_settings(movie_seq, part)
+    _place(part, segment, frame_start, frame_end)
+    # blender moves a new movie overlapping others (the part at full length) to another channel; the placed
+    # part fits in the checked range, so it can go back
+    if part.channel != channel:
+      part.channel = channel
+    index.add(part)
+    part_speed = new_speed_sequence(sequences, part, segment.speed_factor, speed_channel, index)
+    parts.append((part, part_speed))
+  return parts
+
+
+def new_speed_sequence(
+    sequences: 'Sequences',
+    movie_seq: 'MovieSequence',
+    speed_factor: float = 1.,
+    channel: Optional[int] = None,
+    index: Optional['SequenceIndex'] = None,
+) -> 'SpeedControlSequence':
+  if channel is None:
+    channel = _speed_channel(movie_seq)
+  name = f'Speed:{movie_seq.name}'
+  if index is not None:
+    name = unique_name(name, _is_taken_in(index))
+  speed_seq = sequences.new_effect(
+    name=name,
+    type='SPEED',
+    channel=channel,
+    frame_start=movie_seq.frame_final_start,
+    seq1=movie_seq,
+  )
+  speed_seq.use_default_fade = False
+  speed_seq.speed_factor = speed_factor
+  if index is not None:
+    index.add(speed_seq)
+  return speed_seq
+
+
+def _speed_channel(movie_seq: 'MovieSequence') -> int:
+  # below the movie, as BaisokuInit always did
+  return movie_seq.channel - 1 if movie_seq.channel > 1 else movie_seq.channel + 1
+
+
+def _is_taken_in(index: 'SequenceIndex') -> Callable[[str], bool]:
+  return lambda name: index.get(name) is not None
+
+
+def align_to_speed(movie_seq: 'MovieSequence', speed_factor: float):
+  """
+  Sets the length of a sped up movie so that it plays its content to the end.
+  """
+  duration_before_speedup = movie_seq.frame_duration - movie_seq.frame_offset_start
+  duration_after_speedup = int(duration_before_speedup / speed_factor)
+  movie_seq.frame_final_end = movie_seq.frame_final_start + duration_after_speedup
+
+
+def _place(movie_seq: 'MovieSequence', segment: SpeedSegment, frame_start: int, frame_end: int):
+  offset_start = round(segment.content_start)
+  movie_seq.frame_offset_start = offset_start
+  movie_seq.frame_start = frame_start - offset_start
+  movie_seq.frame_final_end = frame_end
+
+
+def _copy_movie_settings(src: 'MovieSequence', dst: 'MovieSequence'):
+  for attr in _MOVIE_ATTRS:
+    if hasattr(src, attr):
+      setattr(dst, attr, getattr(src, attr))
+  if getattr(src, 'use_translation', False):
+    dst.transform.offset_x = src.transform.offset_x
+    dst.transform.offset_y = src.transform.offset_y
+  if getattr(src, 'use_crop', False):
+    for side in ('min_x', 'max_x', 'min_y', 'max_y'):
+      setattr(dst.crop, side, getattr(src.crop, side))
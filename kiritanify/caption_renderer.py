@@ -1,7 +1,13 @@
+import functools
+import math
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Tuple
+from typing import TYPE_CHECKING, Any, Dict, Tuple, Union
 
-from PIL import Image, ImageDraw, ImageFont
+# pillow is imported on the first render; blender imports this module when registering the add-on
+if TYPE_CHECKING:
+  from PIL import Image, ImageFont
 
 
 def lefttop_offset(outer: Tuple[int, int], inner: Tuple[int, int]):
@@ -12,6 +18,58 @@ def lefttop_offset(outer: Tuple[int, int], inner: Tuple[int, int]):
   ])
 
 
+# bump when rendering changes the output for the same inputs; part of caption cache digests
+RENDERER_VERSION = 1
+FONT_CACHE_SIZE = 16
+RENDER_CACHE_SIZE = 256
+# rendered images stay in blender's memory; a full 1920x1080 RGBA canvas alone is 8MB
+RENDER_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# anti-aliased edges may reach slightly outside of the measured text box
+CROP_MARGIN_PX = 2
+
+_render_cache: 'OrderedDict[tuple, Tuple[Image.Image, Tuple[int, int]]]' = OrderedDict()
+_render_cache_lock = threading.Lock()
+_render_cache_bytes = 0
+_render_cache_hits = 0
+_render_cache_misses = 0
+
+
+@functools.lru_cache(maxsize=1)
+def _measure_draw():
+  """
+  Draw on a 1x1 image, only used for measuring text; drawing on it is never needed.
+  """
+  from PIL import Image, ImageDraw
+  return ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+
+
+@functools.lru_cache(maxsize=FONT_CACHE_SIZE)
+def load_font(font_path: str, font_size: int) -> 'ImageFont.FreeTypeFont':
+  """
+  Loads font once per (path, size); parsing large CJK fonts on every caption is slow.
+  """
+  from PIL import ImageFont
+  return ImageFont.truetype(
+    font=font_path,
+    size=font_size,
+  )
+
+
+def text_bbox(text: str, font: 'ImageFont.FreeTypeFont', stroke_width: int) -> Tuple[int, int, int, int]:
+  """
+  Bounding box (left, top, right, bottom) of multiline text drawn at (0, 0).
+  """
+  measure_draw = _measure_draw()
+  if hasattr(measure_draw, 'multiline_textbbox'):
+    left, top, right, bottom = measure_draw.multiline_textbbox(
+      (0, 0), text, font=font, stroke_width=stroke_width, align='center',
+    )
+    return math.floor(left), math.floor(top), math.ceil(right), math.ceil(bottom)
+  # pillow < 8.0
+  width, height = measure_draw.multiline_textsize(text, font=font, stroke_width=stroke_width)
+  return 0, 0, width, height
+
+
 def render_text(
     canvas_size: Tuple[int, int],
     text: str,
@@ -21,8 +79,107 @@ def render_text(
     stroke_width: int,
     font_path: str,
     font_size: int,
-) -> Image:
-  _draw = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+) -> 'Image.Image':
+  """
+  Renders text at the center of canvas. Results are cached, so do not modify the returned image.
+  """
+  image, _ = _cached_render(
+    canvas_size, text,
+    background_color, fill_color, stroke_color, stroke_width,
+    font_path, font_size,
+    False,
+  )
+  return image
+
+
+def render_text_cropped(
+    canvas_size: Tuple[int, int],
+    text: str,
+    background_color: Tuple[float, float, float, float],
+    fill_color: Tuple[float, float, float, float],
+    stroke_color: Tuple[float, float, float, float],
+    stroke_width: int,
+    font_path: str,
+    font_size: int,
+) -> Tuple['Image.Image', Tuple[int, int]]:
+  """
+  Same as `render_text`, but returns only the part of canvas covered by the text (plus stroke), and the
+  left-top position of that part in canvas.
+  """
+  return _cached_render(
+    canvas_size, text,
+    background_color, fill_color, stroke_color, stroke_width,
+    font_path, font_size,
+    True,
+  )
+
+
+def text_box_in_canvas(
+    canvas_size: Tuple[int, int],
+    text: str,
+    stroke_width: int,
+    font_path: str,
+    font_size: int,
+) -> Tuple[int, int, int, int]:
+  """
+  Box (left, top, right, bottom) covered by centered text in canvas, clipped to canvas.
+  Needs only font metrics, no rasterization.
+  """
+  width, height = (int(c) for c in canvas_size)
+  left, top, right, bottom = text_bbox(text, load_font(font_path, font_size), int(stroke_width))
+  offset_x, offset_y = lefttop_offset((width, height), (right - left, bottom - top))
+  return (
+    max(0, offset_x - CROP_MARGIN_PX),
+    max(0, offset_y - CROP_MARGIN_PX),
+    min(width, offset_x + right - left + CROP_MARGIN_PX),
+    min(height, offset_y + bottom - top + CROP_MARGIN_PX),
+  )
+
+
+def _image_bytes(image: 'Image.Image') -> int:
+  return image.width * image.height * 4
+
+
+def _cached_render(*key) -> Tuple['Image.Image', Tuple[int, int]]:
+  global _render_cache_hits, _render_cache_misses, _render_cache_bytes
+  key = tuple(
+    tuple(k) if isinstance(k, (list, tuple)) else k
+    for k in key
+  )
+  with _render_cache_lock:
+    result = _render_cache.get(key)
+    if result is not None:
+      _render_cache.move_to_end(key)
+      _render_cache_hits += 1
+      return result
+    _render_cache_misses += 1
+
+  result = _render_text(*key)
+  size = _image_bytes(result[0])
+  if size > RENDER_CACHE_MAX_BYTES:
+    return result
+  with _render_cache_lock:
+    if key not in _render_cache:
+      _render_cache[key] = result
+      _render_cache_bytes += size
+    while len(_render_cache) > RENDER_CACHE_SIZE or _render_cache_bytes > RENDER_CACHE_MAX_BYTES:
+      _, (image, _) = _render_cache.popitem(last=False)
+      _render_cache_bytes -= _image_bytes(image)
+  return result
+
+
+def _render_text(
+    canvas_size: Tuple[int, int],
+    text: str,
+    background_color: Tuple[float, float, float, float],
+    fill_color: Tuple[float, float, float, float],
+    stroke_color: Tuple[float, float, float, float],
+    stroke_width: int,
+    font_path: str,
+    font_size: int,
+    crop: bool,
+) -> Tuple['Image.Image', Tuple[int, int]]:
+  from PIL import Image, ImageDraw
   _stroke_width = int(stroke_width)
   _fill_color = tuple(
     int(c * 255)
@@ -41,25 +198,82 @@ def render_text(
       for c in canvas_size
   )
 
-  ttf = ImageFont.truetype(
-    font=font_path,
-    size=font_size,
-  )
+  ttf = load_font(font_path, font_size)
 
-  text_size = _draw.multiline_textsize(text,
-    font=ttf, stroke_width=_stroke_width,
-  )
+  left, top, right, bottom = text_bbox(text, ttf, _stroke_width)
+  offset_x, offset_y = lefttop_offset(_canvas_size, (right - left, bottom - top))
+  if crop:
+    box_left, box_top, box_right, box_bottom = text_box_in_canvas(
+      _canvas_size, text, _stroke_width, font_path, font_size,
+    )
+  else:
+    box_left, box_top, box_right, box_bottom = (0, 0) + _canvas_size
   image = Image.new('RGBA',
-    size=_canvas_size,
+    size=(max(1, box_right - box_left), max(1, box_bottom - box_top)),
     color=_bg_color
   )
 
   ImageDraw.Draw(image).multiline_text(
-    lefttop_offset(_canvas_size, text_size), text,
+    (offset_x - left - box_left, offset_y - top - box_top), text,
     fill=_fill_color, stroke_fill=_stroke_color, stroke_width=_stroke_width,
-    font=ttf, align='center', anchor='middle',
+    font=ttf, align='center',
   )
-  return image
+  return image, (box_left, box_top)
+
+
+# caption format name: (file extension, pillow format, pillow save options)
+CAPTION_FORMATS: Dict[str, Tuple[str, str, Dict[str, Any]]] = {
+  'PNG': ('png', 'PNG', {}),
+  'TGA': ('tga', 'TGA', {'compression': None}),
+  'TGA_RLE': ('tga', 'TGA', {'compression': 'tga_rle'}),
+}
+
+
+def caption_file_ext(caption_format: str) -> str:
+  return CAPTION_FORMATS[caption_format][0]
+
+
+def save_caption(
+    image: 'Image.Image',
+    path: Union[str, Path],
+    caption_format: str = 'PNG',
+    png_compress_level: int = 6,
+):
+  _, pillow_format, options = CAPTION_FORMATS[caption_format]
+  if pillow_format == 'PNG':
+    options = dict(options, compress_level=png_compress_level)
+  image.save(str(path), format=pillow_format, **options)
+
+
+def cache_info() -> Dict[str, Dict[str, int]]:
+  """
+  Hit/miss counters of font and rendered image caches.
+  """
+  font_info = load_font.cache_info()
+  with _render_cache_lock:
+    return {
+      'font': {
+        'hits': font_info.hits,
+        'misses': font_info.misses,
+        'size': font_info.currsize,
+      },
+      'render': {
+        'hits': _render_cache_hits,
+        'misses': _render_cache_misses,
+        'size': len(_render_cache),
+        'bytes': _render_cache_bytes,
+      },
+    }
+
+
+def clear_caches():
+  global _render_cache_hits, _render_cache_misses, _render_cache_bytes
+  load_font.cache_clear()
+  with _render_cache_lock:
+    _render_cache.clear()
+    _render_cache_bytes = 0
+    _render_cache_hits = 0
+    _render_cache_misses = 0
 
 
 def main():
@@ -0,0 +1,50 @@
+import logging
+
+import bpy
+from bpy.app.handlers import persistent
+
+from kiritanify.propgroups import mark_scripts_dirty
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# owner of msgbus subscriptions, so that they can be cleared on unregister
+_MSGBUS_OWNER = object()
+
+
+def _on_resolution_change():
+  # caption canvas width follows scene resolution
+  scene = bpy.context.scene
+  if scene is not None:
+    logger.debug('resolution changed, marking all scripts dirty')
+    mark_scripts_dirty(scene)
+
+
+def _subscribe():
+  """
+  Properties of kiritanify mark scripts dirty by their update callbacks; this covers inputs owned by blender.
+  """
+  bpy.msgbus.clear_by_owner(_MSGBUS_OWNER)
+  bpy.msgbus.subscribe_rna(
+    key=(bpy.types.RenderSettings, 'resolution_x'),
+    owner=_MSGBUS_OWNER,
+    args=(),
+    notify=_on_resolution_change,
+  )
+
+
+@persistent
+def _on_load_post(*_):
+  # msgbus subscriptions are cleared when a file is loaded
+  _subscribe()
+
+
+def register():
+  _subscribe()
+  bpy.app.handlers.load_post.append(_on_load_post)
+
+
+def unregister():
+  if _on_load_post in bpy.app.handlers.load_post:
+    bpy.app.handlers.load_post.remove(_on_load_post)
+  bpy.msgbus.clear_by_owner(_MSGBUS_OWNER)
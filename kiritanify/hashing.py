@@ -0,0 +1,16 @@
+import base64
+import hashlib
+import json
+
+
+def hash_text(text: str) -> str:
+  digest = hashlib.blake2s(text.encode('UTF-8')).digest()
+  base64encoded = base64.b64encode(digest, altchars=b'-_')
+  return base64encoded[:16].decode('UTF-8')
+
+
+def hash_values(*values) -> str:
+  """
+  Digest of json-serializable values. Same values always give the same digest, so it can be used as a cache key.
+  """
+  return hash_text(json.dumps(values, ensure_ascii=False, sort_keys=True, separators=(',', ':')))
@@ -0,0 +1,417 @@
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+import wave
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
+
+from kiritanify.caption_renderer import RENDERER_VERSION, render_text, render_text_cropped, save_caption, \
+  text_box_in_canvas
+from kiritanify.hashing import hash_values
+from kiritanify.loudness import LOUDNESS_VERSION, PEAK_CEILING_DB, Loudness, apply_gain, measure_loudness, \
+  normalize_gain_db
+from kiritanify import wav
+from kiritanify.seika_center import TRIM_CHUNK_SIZE_MS, TRIM_SILENCE_THRESHOLD_DB, SeikaCenterConfig, \
+  VoiceParams, decode_voice, maybe_run_seika_center, segment_samples, trim_silence
+from kiritanify.store import SharedStore
+from kiritanify.tracing import span
+
+# numpy, pillow and pydub are imported by the functions using them, on the first voice or caption
+if TYPE_CHECKING:
+  import numpy as np
+  from PIL.Image import Image
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+
+@dataclass
+class VoiceJob:
+  """
+  Everything needed to produce one voice file. Holds plain values only (no bpy data),
+  so `run` can be called from worker threads.
+  """
+  seika: SeikaCenterConfig
+  cid: int
+  text: str
+  style: VoiceParams
+  format: str
+  # content addressed by `digest`; set by the caller once the digest is known
+  path: Optional[Path] = None
+  # root of `SharedStore` to reuse files from and publish files to, if any
+  store_dir: Optional[str] = None
+  # leave ogg encoding to the caller, who encodes many files per ffmpeg process
+  batch_encode: bool = False
+  # normalize loudness to this level (dBFS), if any
+  loudness_target_db: Optional[float] = None
+  # measured before normalization; set by `run` when it normalized
+  measured_loudness: Optional[Loudness] = None
+
+  def digest(self) -> str:
+    """
+    Fingerprint of everything affecting the output file (not the server to ask).
+    """
+    values = [
+      'voice',
+      self.cid,
+      self.text,
+      self.style._asdict(),
+      {
+        'chunk_size_ms': TRIM_CHUNK_SIZE_MS,
+        'silence_threshold_db': TRIM_SILENCE_THRESHOLD_DB,
+      },
+      self.format,
+    ]
+    if self.loudness_target_db is not None:
+      # appended only when enabled, so that digests of files made without normalization stay the same
+      values.append({
+        'loudness_target_db': self.loudness_target_db,
+        'peak_ceiling_db': PEAK_CEILING_DB,
+        'version': LOUDNESS_VERSION,
+      })
+    return hash_values(*values)
+
+  def run(self) -> Path:
+    """
+    Synthesizes and saves the voice (unless already saved). With `batch_encode`, ogg is left as
+    an intermediate wav for `run_voice_jobs` to encode.
+    """
+    with span('voice.job'):
+      return self._run()
+
+  def _run(self) -> Path:
+    if self.path.exists():
+      logger.debug(f'voice cache hit: {self.path}')
+      return self.path
+    if self._store() is not None:
+      with span('voice.store_fetch'):
+        if self._store().fetch(self.digest(), self.path):
+          return self.path
+    if self.needs_encode():
+      # synthesized by an earlier run whose encoding failed
+      if not self.batch_encode:
+        self.finish_encode()
+      return self.path
+
+    with span('voice.http'):
+      content = maybe_run_seika_center(
+        seika_setting=self.seika,
+        cid=self.cid,
+        body=self.text,
+        style=self.style,
+      )
+    # write to a temporary name first so that an interrupted export never looks like a cache hit
+    part_path = self.path.with_name(f'{self.path.name}.{uuid.uuid4().hex[:8]}.part')
+    try:
+      with span('voice.parse_wav'):
+        audio: Optional[wav.PcmAudio] = wav.parse_wav(content)
+    except wave.Error as e:
+      logger.debug(f'falling back to pydub: {e!r}')
+      audio = None
+
+    if audio is not None:
+      with span('voice.trim_silence'):
+        audio = wav.trim_silence(audio)
+      audio = audio._replace(samples=self._normalize(audio.samples, audio.frame_rate, audio.max_amplitude))
+
+    if audio is not None and wav.can_write(self.format):
+      with span('voice.write'):
+        wav.write(part_path, audio, self.format)
+    elif audio is not None and self.format == 'ogg':
+      with span('voice.write'):
+        wav.write(part_path, audio, 'wav')
+        os.replace(part_path, self.intermediate_path())
+      if not self.batch_encode:
+        self.finish_encode()
+      return self.path
+    else:
+      from pydub import AudioSegment
+      with span('voice.pydub_decode'):
+        segment = decode_voice(content)
+      with span('voice.trim_silence'):
+        segment = trim_silence(segment)
+      samples = self._normalize(segment_samples(segment), segment.frame_rate, segment.max_possible_amplitude)
+      with span('voice.pydub_export'):
+        AudioSegment(
+          data=samples.tobytes(),
+          sample_width=segment.sample_width,
+          frame_rate=segment.frame_rate,
+          channels=segment.channels,
+        ).export(str(part_path), format=self.format)
+    os.replace(part_path, self.path)
+    self.publish()
+    return self.path
+
+  def _normalize(self, samples: 'np.ndarray', frame_rate: int, max_amplitude: float) -> 'np.ndarray':
+    if self.loudness_target_db is None:
+      return samples
+    with span('voice.normalize'):
+      measured = measure_loudness(samples, frame_rate, max_amplitude)
+      gain_db = normalize_gain_db(measured, self.loudness_target_db)
+      self.measured_loudness = measured._replace(gain_db=gain_db)
+      logger.debug(f'loudness: {self.measured_loudness}')
+      return apply_gain(samples, gain_db)
+
+  def intermediate_path(self) -> Path:
+    return self.path.with_name(f'{self.path.stem}.pcm.wav')
+
+  def needs_encode(self) -> bool:
+    return not self.path.exists() and self.intermediate_path().exists()
+
+  def finish_encode(self):
+    with span('voice.ogg_encode'):
+      wav.encode_ogg([(self.intermediate_path(), self.path)])
+    self.publish()
+
+  def publish(self):
+    if self._store() is not None:
+      with span('voice.store_put'):
+        self._store().put(self.digest(), self.path)
+
+  def _store(self) -> Optional[SharedStore]:
+    return None if self.store_dir is None else SharedStore(self.store_dir)
+
+
+@dataclass
+class CaptionJob:
+  """
+  Everything needed to render one caption image. Holds plain values only (no bpy data),
+  so `run` can be called from worker threads.
+  """
+  text: str
+  canvas_size: Tuple[int, int]
+  fill_color: Tuple[float, float, float, float]
+  stroke_color: Tuple[float, float, float, float]
+  stroke_width: float
+  font_path: str
+  font_size: int
+  crop: bool
+  format: str = 'PNG'
+  png_compress_level: int = 6
+  # content addressed by `digest`; set by the caller once the digest is known
+  path: Optional[Path] = None
+  # root of `SharedStore` to reuse files from and publish files to, if any
+  store_dir: Optional[str] = None
+  # position of the image in the canvas, blender's coordinate (from left-bottom); set by `run`
+  offset: Tuple[int, int] = (0, 0)
+
+  def digest(self) -> str:
+    """
+    Fingerprint of everything affecting the output image, including the renderer itself.
+    """
+    return hash_values(
+      'caption',
+      RENDERER_VERSION,
+      self.text,
+      list(self.canvas_size),
+      list(self.fill_color),
+      list(self.stroke_color),
+      self.stroke_width,
+      self.font_path,
+      self.font_size,
+      self.crop,
+      self.format,
+      self.png_compress_level if self.format == 'PNG' else None,
+    )
+
+  def run(self) -> Tuple[int, int]:
+    """
+    Renders and saves the image (unless already saved), and returns its offset for sequence transform.
+    """
+    with span('caption.job'):
+      return self._run()
+
+  def _run(self) -> Tuple[int, int]:
+    store = None if self.store_dir is None else SharedStore(self.store_dir)
+    if self.path.exists() or (store is not None and store.fetch(self.digest(), self.path)):
+      logger.debug(f'caption cache hit: {self.path}')
+      with span('caption.cached_offset'):
+        self.offset = self._cached_offset()
+      return self.offset
+
+    render = render_text_cropped if self.crop else _render_text_uncropped
+    with span('caption.render_text'):
+      image, (left, top) = render(
+        canvas_size=self.canvas_size,
+        text=self.text,
+        background_color=(0, 0, 0, 0),
+        fill_color=self.fill_color,
+        stroke_color=self.stroke_color,
+        stroke_width=self.stroke_width,
+        font_path=self.font_path,
+        font_size=self.font_size,
+      )
+    part_path = self.path.with_name(f'{self.path.name}.{uuid.uuid4().hex[:8]}.part')
+    with span(f'caption.save_{self.format.lower()}'):
+      save_caption(image, part_path, self.format, self.png_compress_level)
+      os.replace(part_path, self.path)
+    if store is not None:
+      with span('caption.store_put'):
+        store.put(self.digest(), self.path)
+
+    self.offset = (left, int(self.canvas_size[1]) - (top + image.height))
+    return self.offset
+
+  def _cached_offset(self) -> Tuple[int, int]:
+    # same box as the cropped render, from font metrics only
+    if not self.crop:
+      return 0, 0
+    left, top, right, bottom = text_box_in_canvas(
+      canvas_size=self.canvas_size,
+      text=self.text,
+      stroke_width=self.stroke_width,
+      font_path=self.font_path,
+      font_size=self.font_size,
+    )
+    return left, int(self.canvas_size[1]) - (top + max(1, bottom - top))
+
+
+Job = Union[VoiceJob, CaptionJob]
+
+
+def _render_text_uncropped(**kwargs) -> Tuple['Image', Tuple[int, int]]:
+  return render_text(**kwargs), (0, 0)
+
+
+def run_voice_jobs(jobs: List[VoiceJob], max_workers: int) -> Dict[Path, BaseException]:
+  """
+  Runs jobs on a thread pool; jobs sharing an output path run only once.
+  Returns errors keyed by output path, jobs not in the result succeeded.
+  """
+  unique_jobs: Dict[Path, VoiceJob] = {}
+  for job in jobs:
+    unique_jobs.setdefault(job.path, job)
+
+  errors: Dict[Path, BaseException] = {}
+  if len(unique_jobs) == 0:
+    return errors
+
+  with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+    futures = {}
+    for path, job in unique_jobs.items():
+      job.batch_encode = True
+      futures[path] = executor.submit(job.run)
+    for path, future in futures.items():
+      try:
+        future.result()
+      except Exception as e:
+        logger.exception(f'voice job failed: {path}')
+        errors[path] = e
+
+  pending = [
+    job for path, job in unique_jobs.items()
+    if path not in errors and job.needs_encode()
+  ]
+  if len(pending) > 0:
+    try:
+      with span('voice.ogg_encode'):
+        wav.encode_ogg([(job.intermediate_path(), job.path) for job in pending])
+      for job in pending:
+        job.publish()
+    except Exception as e:
+      logger.exception('ogg encoding failed')
+      for job in pending:
+        errors[job.path] = e
+  return errors
+
+
+# below this, starting worker processes costs more than rendering in place
+MIN_CAPTION_JOBS_FOR_PROCESSES = 64
+
+
+def run_caption_jobs(
+    jobs: List[CaptionJob],
+    max_workers: Optional[int] = None,
+    python_executable: Optional[str] = None,
+) -> Dict[Path, BaseException]:
+  """
+  Renders captions on worker processes (pillow rendering and png encoding hold the GIL), and sets `offset` of
+  each job. `python_executable` is the python used for workers when `sys.executable` is not python.
+  Returns errors keyed by output path, jobs not in the result succeeded.
+  """
+  errors: Dict[Path, BaseException] = {}
+  if len(jobs) < MIN_CAPTION_JOBS_FOR_PROCESSES:
+    for job in jobs:
+      try:
+        job.run()
+      except Exception as e:
+        logger.exception(f'caption job failed: {job.path}')
+        errors[job.path] = e
+    return errors
+
+  mp_context = multiprocessing.get_context('spawn')
+  if python_executable:
+    mp_context.set_executable(python_executable)
+  if max_workers is None:
+    max_workers = max(1, (os.cpu_count() or 2) - 1)
+
+  # stages inside worker processes are not traced; this span covers them
+  with span('caption.process_pool'), \
+      ProcessPoolExecutor(max_workers=min(max_workers, len(jobs)), mp_context=mp_context) as executor:
+    futures = [
+      (job, executor.submit(_run_caption_job, job))
+      for job in jobs
+    ]
+    for job, future in futures:
+      try:
+        job.offset = future.result()
+      except Exception as e:
+        logger.exception(f'caption job failed: {job.path}')
+        errors[job.path] = e
+  return errors
+
+
+def _run_caption_job(job: CaptionJob) -> Tuple[int, int]:
+  # runs in a worker process; the job is a copy, so the result has to be returned
+  return job.run()
+
+
+class RunProgress:
+  """
+  Progress of a background run, shared between the modal operator and the panel drawing it.
+  """
+  total: int
+  done: int
+  failed: int
+  started_at: float
+  finished_at: Optional[float]
+  cancelled: bool
+
+  def __init__(self):
+    self.reset(0)
+    self.finished_at = 0.
+
+  def reset(self, total: int):
+    self.total = total
+    self.done = 0
+    self.failed = 0
+    self.started_at = time.monotonic()
+    self.finished_at = None
+    self.cancelled = False
+
+  @property
+  def is_running(self) -> bool:
+    return self.finished_at is None
+
+  def elapsed_sec(self) -> float:
+    end = time.monotonic() if self.finished_at is None else self.finished_at
+    return end - self.started_at
+
+  def throughput(self) -> float:
+    """scripts per second"""
+    elapsed = self.elapsed_sec()
+    return 0. if elapsed <= 0 else self.done / elapsed
+
+  def eta_sec(self) -> Optional[float]:
+    throughput = self.throughput()
+    if throughput <= 0:
+      return None
+    return (self.total - self.done) / throughput
+
+  def finish(self, cancelled: bool = False):
+    self.finished_at = time.monotonic()
+    self.cancelled = cancelled
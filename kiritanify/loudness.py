@@ -0,0 +1,91 @@
+import math
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+  import numpy as np
+
+# gating as in ITU-R BS.1770 (without K-weighting, hence approximate LUFS)
+BLOCK_MS = 400
+BLOCK_STEP_MS = 100
+ABSOLUTE_GATE_DB = -70.
+RELATIVE_GATE_DB = -10.
+# gain never pushes sample peaks above this
+PEAK_CEILING_DB = -1.
+# below this, applying gain is not worth a pass over the samples
+MIN_GAIN_DB = 0.05
+
+# part of voice cache digests; bump when measurement or gain changes
+LOUDNESS_VERSION = 1
+
+_SILENT_DB = -120.
+
+
+class Loudness(NamedTuple):
+  """
+  Measurement of a voice before normalization, and the gain applied to it.
+  """
+  loudness_db: float
+  peak_db: float
+  gain_db: float = 0.
+
+
+def measure_loudness(samples: 'np.ndarray', frame_rate: int, max_amplitude: float) -> Loudness:
+  """
+  Gated loudness (dBFS, mean power of 400ms blocks above the gates) and sample peak of `samples`
+  (frames x channels).
+  """
+  import numpy as np
+  num_frames = samples.shape[0]
+  if num_frames == 0:
+    return Loudness(loudness_db=_SILENT_DB, peak_db=_SILENT_DB)
+
+  # not np.abs, which overflows at the most negative integer
+  peak = max(int(samples.max()), -int(samples.min())) / max_amplitude
+  power = np.square(samples, dtype=np.float64).mean(axis=1) / (max_amplitude * max_amplitude)
+  # power of any block is a difference of two entries
+  cum_power = np.concatenate([[0.], np.cumsum(power)])
+
+  block = min(num_frames, max(1, int(BLOCK_MS * frame_rate / 1000)))
+  step = max(1, int(BLOCK_STEP_MS * frame_rate / 1000))
+  starts = np.arange(0, num_frames - block + 1, step)
+  block_power = (cum_power[starts + block] - cum_power[starts]) / block
+
+  gated = block_power[block_power > _db_to_power(ABSOLUTE_GATE_DB)]
+  if len(gated) > 0:
+    gated = gated[gated > gated.mean() * _db_to_power(RELATIVE_GATE_DB)]
+  if len(gated) == 0:
+    return Loudness(loudness_db=_SILENT_DB, peak_db=_to_db(peak, 20))
+  return Loudness(loudness_db=_to_db(gated.mean(), 10), peak_db=_to_db(peak, 20))
+
+
+def normalize_gain_db(loudness: Loudness, target_db: float) -> float:
+  """
+  Gain reaching `target_db`, limited so that peaks stay below `PEAK_CEILING_DB`.
+  """
+  if loudness.loudness_db <= _SILENT_DB:
+    return 0.
+  return min(target_db - loudness.loudness_db, PEAK_CEILING_DB - loudness.peak_db)
+
+
+def apply_gain(samples: 'np.ndarray', gain_db: float) -> 'np.ndarray':
+  """
+  Scales integer samples in one pass, clipping to the sample range. Returns `samples` as is for tiny gains.
+  """
+  if abs(gain_db) < MIN_GAIN_DB:
+    return samples
+  import numpy as np
+  info = np.iinfo(samples.dtype)
+  scaled = samples * (10 ** (gain_db / 20))
+  np.rint(scaled, out=scaled)
+  np.clip(scaled, info.min, info.max, out=scaled)
+  return scaled.astype(samples.dtype)
+
+
+def _db_to_power(db: float) -> float:
+  return 10 ** (db / 10)
+
+
+def _to_db(value: float, factor: int) -> float:
+  if value <= 0:
+    return _SILENT_DB
+  return max(_SILENT_DB, factor * math.log10(value))
@@ -0,0 +1,249 @@
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from kiritanify.loudness import Loudness
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+MANIFEST_FILE_NAME = 'manifest.sqlite3'
+# generated files under the cache dir, by kind
+CACHE_FILE_PATTERNS = {'caption': 'caption/*/*.*', 'voice': 'voice/*/*.*'}
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS artifacts (
+  path TEXT PRIMARY KEY,
+  kind TEXT NOT NULL,
+  digest TEXT NOT NULL,
+  size INTEGER NOT NULL,
+  last_used REAL NOT NULL,
+  strips TEXT NOT NULL DEFAULT '[]',
+  loudness_db REAL,
+  peak_db REAL,
+  gain_db REAL
+);
+CREATE INDEX IF NOT EXISTS artifacts_last_used ON artifacts (last_used);
+'''
+
+# columns added after the first version, with their types
+_ADDED_COLUMNS = {
+  'loudness_db': 'REAL',
+  'peak_db': 'REAL',
+  'gain_db': 'REAL',
+}
+
+
+class Artifact(NamedTuple):
+  path: Path
+  kind: str
+  digest: str
+  size: int
+  last_used: float
+  strips: List[str]
+  loudness: Optional[Loudness] = None
+
+
+class Manifest:
+  """
+  Index of files generated in the cache dir (`root_dir`): digest, size, last used time and referencing strips.
+  Lets garbage collection query the index instead of walking the file system.
+
+  Paths are stored relative to `root_dir`, so that the manifest survives moving the project directory.
+  Not thread safe; use it from the main thread only.
+  """
+  root_dir: Path
+
+  def __init__(self, root_dir: Path):
+    self.root_dir = root_dir
+    root_dir.mkdir(parents=True, exist_ok=True)
+    self._resolved_root = root_dir.resolve()
+    self._conn = sqlite3.connect(str(root_dir / MANIFEST_FILE_NAME))
+    self._conn.execute('PRAGMA journal_mode=WAL')
+    self._conn.execute('PRAGMA synchronous=NORMAL')
+    self._conn.executescript(_SCHEMA)
+    self._migrate()
+
+  def close(self):
+    self._conn.close()
+
+  def _migrate(self):
+    columns = {row[1] for row in self._conn.execute('PRAGMA table_info(artifacts)')}
+    with self._conn:
+      for column, column_type in _ADDED_COLUMNS.items():
+        if column not in columns:
+          self._conn.execute(f'ALTER TABLE artifacts ADD COLUMN {column} {column_type}')
+
+  def record(self, path: Path, kind: str, digest: str, loudness: Optional[Loudness] = None):
+    """
+    Adds (or refreshes) a generated file. A recorded loudness measurement is kept when `loudness` is None.
+    """
+    try:
+      size = path.stat().st_size
+    except FileNotFoundError:
+      logger.warning(f'manifest: not recording missing file {path}')
+      return
+    key = self._key(path)
+    now = time.time()
+    with self._conn:
+      self._conn.execute(
+        'INSERT OR IGNORE INTO artifacts (path, kind, digest, size, last_used) VALUES (?, ?, ?, ?, ?)',
+        (key, kind, digest, size, now),
+      )
+      self._conn.execute(
+        'UPDATE artifacts SET kind = ?, digest = ?, size = ?, last_used = ? WHERE path = ?',
+        (kind, digest, size, now, key),
+      )
+      if loudness is not None:
+        self._conn.execute(
+          'UPDATE artifacts SET loudness_db = ?, peak_db = ?, gain_db = ? WHERE path = ?',
+          (loudness.loudness_db, loudness.peak_db, loudness.gain_db, key),
+        )
+
+  def is_empty(self) -> bool:
+    return self._conn.execute('SELECT 1 FROM artifacts LIMIT 1').fetchone() is None
+
+  def import_files(self, patterns: Dict[str, str] = CACHE_FILE_PATTERNS) -> int:
+    """
+    Records existing files matching glob `patterns` (kind -> pattern relative to `root_dir`) that are not recorded
+    yet, i.e. files of cache dirs made before the manifest existed; outputs are recorded as they are produced.
+    Walks the cache dir, so it only runs once, when a manifest is opened empty. File names up to the first dot are
+    taken as digests.
+    Returns the number of imported files.
+    """
+    known = {row[0] for row in self._conn.execute('SELECT path FROM artifacts')}
+    rows = []
+    for kind, pattern in patterns.items():
+      for path in self.root_dir.glob(pattern):
+        # .part files are being written
+        if path.suffix == '.part':
+          continue
+        key = self._key(path)
+        if key in known:
+          continue
+        try:
+          stat = path.stat()
+        except FileNotFoundError:
+          continue
+        rows.append((key, kind, path.name.partition('.')[0], stat.st_size, stat.st_mtime))
+    with self._conn:
+      self._conn.executemany(
+        'INSERT OR IGNORE INTO artifacts (path, kind, digest, size, last_used) VALUES (?, ?, ?, ?, ?)',
+        rows,
+      )
+    return len(rows)
+
+  def set_references(self, strips_for_path: Dict[Path, List[str]]):
+    """
+    Replaces referencing strips of all artifacts; artifacts not in `strips_for_path` become unreferenced.
+    Referenced artifacts are also marked as used now.
+    """
+    now = time.time()
+    with self._conn:
+      self._conn.execute("UPDATE artifacts SET strips = '[]'")
+      self._conn.executemany(
+        'UPDATE artifacts SET strips = ?, last_used = ? WHERE path = ?',
+        (
+          (json.dumps(strips, ensure_ascii=False), now, self._key(path))
+          for path, strips in strips_for_path.items()
+        ),
+      )
+
+  def unreferenced(self) -> List[Artifact]:
+    return self._query("WHERE strips = '[]' ORDER BY last_used")
+
+  def total_size(self) -> int:
+    return self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM artifacts').fetchone()[0]
+
+  def remove_unreferenced(self) -> List[Artifact]:
+    """
+    Deletes all files not referenced by any strip. Returns deleted artifacts.
+    """
+    return self._delete(self.unreferenced())
+
+  def evict(self, max_size: int) -> List[Artifact]:
+    """
+    Deletes least recently used unreferenced files until the total size is at most `max_size` bytes.
+    Referenced files are never deleted, so the total may stay above `max_size`. Returns deleted artifacts.
+    """
+    excess = self.total_size() - max_size
+    victims = []
+    for artifact in self.unreferenced():
+      if excess <= 0:
+        break
+      victims.append(artifact)
+      excess -= artifact.size
+    return self._delete(victims)
+
+  def _delete(self, artifacts: Iterable[Artifact]) -> List[Artifact]:
+    deleted = []
+    for artifact in artifacts:
+      try:
+        artifact.path.unlink()
+      except FileNotFoundError:
+        pass
+      except OSError as e:
+        logger.warning(f'manifest: failed to delete {artifact.path}: {e!r}')
+        continue
+      deleted.append(artifact)
+    with self._conn:
+      self._conn.executemany(
+        'DELETE FROM artifacts WHERE path = ?',
+        ((self._key(artifact.path),) for artifact in deleted),
+      )
+    return deleted
+
+  def _query(self, condition: str, params=()) -> List[Artifact]:
+    rows = self._conn.execute(
+      'SELECT path, kind, digest, size, last_used, strips, loudness_db, peak_db, gain_db FROM artifacts '
+      + condition,
+      params,
+    )
+    return [
+      Artifact(
+        path=self._path(path),
+        kind=kind,
+        digest=digest,
+        size=size,
+        last_used=last_used,
+        strips=json.loads(strips),
+        loudness=None if loudness_db is None else Loudness(loudness_db, peak_db, gain_db),
+      )
+      for path, kind, digest, size, last_used, strips, loudness_db, peak_db, gain_db in rows
+    ]
+
+  def _key(self, path: Path) -> str:
+    path = Path(path).resolve()
+    try:
+      return path.relative_to(self._resolved_root).as_posix()
+    except ValueError:
+      return path.as_posix()
+
+  def _path(self, key: str) -> Path:
+    return self.root_dir / key
+
+
+# root dir -> manifest; kept open for the session
+_manifests: Dict[str, Manifest] = {}
+
+
+def open_manifest(root_dir: Path) -> Manifest:
+  key = str(root_dir)
+  manifest: Optional[Manifest] = _manifests.get(key)
+  if manifest is None:
+    manifest = Manifest(root_dir)
+    if manifest.is_empty():
+      # cache dir made before the manifest existed
+      manifest.import_files()
+    _manifests[key] = manifest
+  return manifest
+
+
+def close_manifests():
+  for manifest in _manifests.values():
+    manifest.close()
+  _manifests.clear()
+
@@ -2,14 +2,15 @@ import logging
 from pathlib import Path
 from typing import Optional, Tuple
 
-from PIL.Image import Image
 from bpy.types import Context, Sequence
 
-from kiritanify.caption_renderer import render_text
+from kiritanify.hashing import hash_text
+from kiritanify.jobs import CaptionJob, VoiceJob
+from kiritanify.preferences import shared_cache_dir
 from kiritanify.propgroups import CaptionStyle, KiritanifyCharacterSetting, _global_setting, _script_setting
-from kiritanify.seika_center import synthesize_voice, trim_silence
+from kiritanify.tracing import span
 from kiritanify.types import ImageSequence, KiritanifyScriptSequence, SoundSequence
-from kiritanify.utils import _sequences, hash_text
+from kiritanify.utils import SequenceIndex, _sequences
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -28,6 +29,7 @@ class CharacterScript:
   caption_seq: Optional[ImageSequence]
 
   context: Context
+  index: Optional[SequenceIndex]
 
   def __init__(
       self,
@@ -36,6 +38,7 @@ class CharacterScript:
       voice_seq: Optional[SoundSequence],
       caption_seq: Optional[ImageSequence],
       context: Context,
+      index: Optional[SequenceIndex] = None,
   ):
     self.chara = chara
 
@@ -44,6 +47,7 @@ class CharacterScript:
     self.caption_seq = caption_seq
 
     self.context = context
+    self.index = index
 
   @classmethod
   def create_from(
@@ -51,63 +55,127 @@ class CharacterScript:
       chara: KiritanifyCharacterSetting,
       seq: KiritanifyScriptSequence,
       context: Context,
+      index: Optional[SequenceIndex] = None,
   ) -> 'CharacterScript':
-    voice_seq = _script_setting(seq).find_voice_seq(context)
-    caption_seq = _script_setting(seq).find_caption_seq(context)
+    voice_seq = _script_setting(seq).find_voice_seq(context, index)
+    caption_seq = _script_setting(seq).find_caption_seq(context, index)
     return cls(
       chara=chara,
       seq=seq,
       voice_seq=voice_seq,
       caption_seq=caption_seq,
       context=context,
+      index=index,
     )
 
+  @property
+  def is_dirty(self) -> bool:
+    return self._seq_setting.is_dirty or self.has_changed_character()
+
+  def mark_clean(self):
+    self._seq_setting.is_dirty = False
+    self._seq_setting.clean_cid = self.chara.cid
+    self._seq_setting.clean_channel = self.seq.channel
+
+  def has_changed_character(self) -> bool:
+    """
+    Whether the script was moved to the channel of another character since its last successful run.
+    """
+    return self._seq_setting.clean_cid != self.chara.cid or self._seq_setting.clean_channel != self.seq.channel
+
+  def has_missing_sequences(self) -> bool:
+    """
+    Whether a wanted voice or caption sequence does not exist (never created, or deleted by the user).
+    """
+    return (self.wants_voice() and self.voice_seq is None) or (self.wants_caption() and self.caption_seq is None)
+
+  def is_up_to_date(self) -> bool:
+    """
+    Whether the sequences are of the current inputs; False when the script was edited after its jobs were made.
+    """
+    if self.wants_voice() and self.voice_job() is not None:
+      return False
+    if self.wants_caption() and self.caption_job() is not None:
+      return False
+    return True
+
+  def align_sequences(self):
+    """
+    Only aligns existing voice and caption sequences to the script, for scripts whose inputs are unchanged.
+    """
+    if self.voice_seq is not None:
+      self.apply_voice_job(None)
+    if self.caption_seq is not None:
+      self.apply_caption_job(None)
+
   def maybe_update_voice(self):
-    ss = _script_setting(self.seq)
-    if not ss.gen_voice:
+    if not self.wants_voice():
       return
 
-    if self._seq_setting.voice_text() == '':
-      return
+    with span('script.update_voice'):
+      job = self.voice_job()
+      if job is not None:
+        job.run()
+      self.apply_voice_job(job)
 
-    seq_missing = self.voice_seq is None
-    is_changed = _script_setting(self.seq).voice_cache_state \
-      .is_changed(_global_setting(self.context), self.chara, self.seq)
-    should_regenerate: bool = seq_missing or is_changed
-    if should_regenerate:
-      if self.voice_seq is not None:
-        self._remove_sequence(self.voice_seq)
-        self.voice_seq = None
-      self.voice_seq = self._generate_voice_sequence()
-      self._seq_setting.voice_seq_name = self.voice_seq.name
-      self._seq_setting.voice_cache_state.update(
-        global_setting=_global_setting(self.context),
-        chara=self.chara,
-        seq=self.seq,
-      )
-    assert self.voice_seq is not None
-
-    self._align_sequence(
-      seq=self.voice_seq,
-      channel=self.chara.voice_channel(self._global_setting),
-      frame_start=self.seq.frame_start,
-    )
-    frame_final_end = max(self.voice_seq.frame_final_end, self.seq.frame_final_end)
-    if self.seq.frame_final_end != frame_final_end:
-      self.seq.frame_final_end = frame_final_end
+  def wants_voice(self) -> bool:
+    ss = _script_setting(self.seq)
+    return ss.gen_voice and self._seq_setting.voice_text() != ''
 
-  def _generate_voice_sequence(self) -> SoundSequence:
-    sound_path = self._global_setting.cache_setting.voice_path(self.chara, self.seq)
+  def voice_job(self) -> Optional[VoiceJob]:
+    """
+    Returns a job regenerating the voice file, or None when the voice sequence is up to date.
+    Reads blender data, so call this from the main thread; the returned job itself may run anywhere.
+    """
     voice_text = self._seq_setting.voice_text()
-
-    segment = synthesize_voice(
-      seika_setting=self._global_setting.seika_center,
-      chara=self.chara,
-      style=self._seq_setting.voice_style(self._global_setting, self.chara),
-      script=voice_text,
+    style = self._seq_setting.voice_style(self._global_setting, self.chara)
+    cache_setting = self._global_setting.cache_setting
+    voice_format = cache_setting.voice_format.lower()
+    job = VoiceJob(
+      seika=self._global_setting.seika_center.config(),
+      cid=self.chara.cid,
+      text=voice_text,
+      style=style.params(),
+      format=voice_format,
+      loudness_target_db=self.chara.loudness_target_db if cache_setting.normalize_voice_loudness else None,
     )
-    trim_silence(segment).export(str(sound_path), format='ogg')
+    digest = job.digest()
+    if self.voice_seq is not None and not self._seq_setting.voice_cache_state.is_changed(digest):
+      return None
+
+    job.path = cache_setting.voice_path(self.chara, digest, voice_format)
+    job.store_dir = shared_cache_dir(self.context)
+    return job
+
+  def apply_voice_job(self, job: Optional[VoiceJob]):
+    """
+    Replaces the voice sequence with the output of a finished job (if any) and aligns it to the script.
+    """
+    if job is not None:
+      with span('strip.new_voice'):
+        if self.voice_seq is not None:
+          self._remove_sequence(self.voice_seq)
+          self.voice_seq = None
+        self.voice_seq = self._new_voice_sequence(job.path)
+        self._seq_setting.voice_seq_name = self.voice_seq.name
+      digest = job.digest()
+      self._seq_setting.voice_cache_state.update(digest)
+      with span('manifest.record'):
+        self._global_setting.cache_setting.manifest().record(job.path, 'voice', digest, job.measured_loudness)
+    assert self.voice_seq is not None
 
+    with span('strip.align'):
+      self._align_sequence(
+        seq=self.voice_seq,
+        channel=self.chara.voice_channel(self._global_setting),
+        frame_start=self.seq.frame_start,
+      )
+      frame_final_end = max(self.voice_seq.frame_final_end, self.seq.frame_final_end)
+      if self.seq.frame_final_end != frame_final_end:
+        self.seq.frame_final_end = frame_final_end
+
+  def _new_voice_sequence(self, sound_path: Path) -> SoundSequence:
+    voice_text = self._seq_setting.voice_text()
     voice_seq = _sequences(self.context).new_sound(
       name=f'Voice:{self.chara.chara_name}:{hash_text(voice_text)}',
       filepath=str(sound_path),
@@ -115,63 +183,83 @@ class CharacterScript:
       frame_start=self.seq.frame_final_start,
     )
     voice_seq.show_waveform = True
+    if self.index is not None:
+      self.index.add(voice_seq)
 
     return voice_seq
 
   def maybe_update_caption(self):
-    ss = _script_setting(self.seq)
-    if not ss.gen_caption:
+    if not self.wants_caption():
       return
 
-    if self._seq_setting.caption_text() == '':
-      return
-
-    seq_missing = self.caption_seq is None
-    is_changed = _script_setting(self.seq).caption_cache_state \
-      .is_changed(_global_setting(self.context), self.chara, self.seq)
-    should_regenerate: bool = seq_missing or is_changed
-    if should_regenerate:
-      if self.caption_seq is not None:
-        self._remove_sequence(self.caption_seq)
-        self.caption_seq = None
-      self.caption_seq = self._generate_caption()
-      self._seq_setting.caption_seq_name = self.caption_seq.name
-      self._seq_setting.caption_cache_state.update(
-        global_setting=_global_setting(self.context),
-        chara=self.chara,
-        seq=self.seq,
-      )
-    assert self.caption_seq is not None
-
-    self._align_sequence(
-      seq=self.caption_seq,
-      channel=self.chara.caption_channel(self._global_setting),
-      frame_start=self.seq.frame_start,
-      frame_final_end=self.seq.frame_final_end,
-    )
+    with span('script.update_caption'):
+      job = self.caption_job()
+      if job is not None:
+        job.run()
+      self.apply_caption_job(job)
 
-  def _generate_caption(self):
+  def wants_caption(self) -> bool:
+    ss = _script_setting(self.seq)
+    return ss.gen_caption and self._seq_setting.caption_text() != ''
+
+  def caption_job(self) -> Optional[CaptionJob]:
+    """
+    Returns a job rendering the caption image, or None when the caption sequence is up to date.
+    Reads blender data, so call this from the main thread; the returned job itself may run anywhere.
+    """
+    cache_setting = self._global_setting.cache_setting
     caption_style: CaptionStyle = self._seq_setting.caption_style(self._global_setting, self.chara)
-    caption_text: str = self._seq_setting.caption_text()
-    caption_path: Path = self._global_setting.cache_setting.caption_path(self.chara, self.seq)
-
     canvas_size: Tuple[int, int] = (
       self.context.scene.render.resolution_x,
       caption_style.max_height_px,
     )
-
-    image: Image = render_text(
+    job = CaptionJob(
+      text=self._seq_setting.caption_text(),
       canvas_size=canvas_size,
-      text=caption_text,
-      background_color=(0, 0, 0, 0),
-      fill_color=caption_style.fill_color,
-      stroke_color=caption_style.stroke_color,
+      fill_color=tuple(caption_style.fill_color),
+      stroke_color=tuple(caption_style.stroke_color),
       stroke_width=caption_style.stroke_width,
       font_path=caption_style.font_path,
       font_size=caption_style.font_size,
+      crop=cache_setting.crop_caption,
+      format=cache_setting.caption_format,
+      png_compress_level=cache_setting.caption_png_compress_level,
     )
-    image.save(caption_path.open('bw'))
+    digest = job.digest()
+    if self.caption_seq is not None and not self._seq_setting.caption_cache_state.is_changed(digest):
+      return None
+
+    job.path = cache_setting.caption_path(self.chara, digest)
+    job.store_dir = shared_cache_dir(self.context)
+    return job
+
+  def apply_caption_job(self, job: Optional[CaptionJob]):
+    """
+    Replaces the caption sequence with the output of a finished job (if any) and aligns it to the script.
+    """
+    if job is not None:
+      with span('strip.new_caption'):
+        if self.caption_seq is not None:
+          self._remove_sequence(self.caption_seq)
+          self.caption_seq = None
+        self.caption_seq = self._new_caption_sequence(job.path, job.offset)
+        self._seq_setting.caption_seq_name = self.caption_seq.name
+      digest = job.digest()
+      self._seq_setting.caption_cache_state.update(digest)
+      with span('manifest.record'):
+        self._global_setting.cache_setting.manifest().record(job.path, 'caption', digest)
+    assert self.caption_seq is not None
+
+    with span('strip.align'):
+      self._align_sequence(
+        seq=self.caption_seq,
+        channel=self.chara.caption_channel(self._global_setting),
+        frame_start=self.seq.frame_start,
+        frame_final_end=self.seq.frame_final_end,
+      )
 
+  def _new_caption_sequence(self, caption_path: Path, offset: Tuple[int, int]) -> ImageSequence:
+    caption_text: str = self._seq_setting.caption_text()
     logger.debug(f'caption_path: {caption_path}')
 
     image_seq: ImageSequence = _sequences(self.context).new_image(
@@ -181,7 +269,11 @@ class CharacterScript:
       frame_start=self.seq.frame_start,
     )
     image_seq.use_translation = True
+    # cropped captions are smaller than the canvas, keep them at the position in canvas
+    image_seq.transform.offset_x, image_seq.transform.offset_y = offset
     image_seq.blend_type = 'ALPHA_OVER'
+    if self.index is not None:
+      self.index.add(image_seq)
     return image_seq
 
   @staticmethod
@@ -205,6 +297,8 @@ class CharacterScript:
       seq.frame_final_end = frame_final_end
 
   def _remove_sequence(self, seq):
+    if self.index is not None:
+      self.index.remove(seq)
     self.context.scene.sequence_editor.sequences.remove(seq)
 
   @property
@@ -1,45 +1,176 @@
 import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Iterator, List, Set, Union
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
 
 import bpy
 from bpy.types import AdjustmentSequence, Context, ImageSequence, MovieSequence, Sequence, SoundSequence
+from bpy_extras.io_utils import ExportHelper, ImportHelper
 
 import kiritanify.types
+from kiritanify.baisoku import align_to_speed, apply_segments, new_speed_sequence, parse_speed_marker, \
+  segments_for_cuts, speed_factor_of
+from kiritanify.jobs import CaptionJob, Job, RunProgress, VoiceJob, run_caption_jobs, run_voice_jobs
+from kiritanify.manifest import Artifact
 from kiritanify.models import CharacterScript
+from kiritanify.prefetch import PREFETCHER, record_outputs, record_when_done
 from kiritanify.propgroups import KiritanifyCharacterSetting, _global_setting, _script_setting, \
-  get_selected_script_sequence
-from kiritanify.utils import _current_frame, _datetime_str, _fps, _sequences, _speed_factor, find_neighbor_sequence, \
-  find_selected_movie_sequence, find_speed_seq_from_movie_seq, get_sequences_by_channel
+  clear_tachie_cache, get_selected_script_sequence
+from kiritanify.script_import import parse_script_file
+from kiritanify.tracing import TRACER, span
+from kiritanify.utils import SequenceIndex, _current_frame, _datetime_str, _fps, _sequences, \
+  find_neighbor_sequence, find_selected_movie_sequence, find_speed_seq_from_movie_seq, get_sequences_by_channel
 
 logger = logging.getLogger(__file__)
 logger.setLevel(level=logging.DEBUG)
 
 
-class KIRITANIFY_OT_RunKiritanifyForScripts(bpy.types.Operator):
-  bl_idname = "kiritanify.run_kiritanify_for_scripts"
-  bl_label = "Run KiritanifyForScripts"
+def _run_character_scripts(op: bpy.types.Operator, context: Context, scripts: List[CharacterScript]):
+  """
+  Updates voice and caption of scripts in three phases:
+  collect stale voices and captions (main thread), synthesize voices on a thread pool and render captions on
+  worker processes, then create sequences in one pass (main thread). Jobs prefetched while editing are not run again.
+  """
+  prefetched: Set[int] = set()
+  with span('run.collect'):
+    voice_targets: List[Tuple[CharacterScript, Optional[VoiceJob]]] = [
+      (cs, _claim_prefetched(cs.voice_job(), prefetched))
+      for cs in scripts
+      if cs.wants_voice()
+    ]
+    caption_targets: List[Tuple[CharacterScript, Optional[CaptionJob]]] = [
+      (cs, _claim_prefetched(cs.caption_job(), prefetched))
+      for cs in scripts
+      if cs.wants_caption()
+    ]
+  voice_jobs = [job for _, job in voice_targets if job is not None and id(job) not in prefetched]
+  caption_jobs = [job for _, job in caption_targets if job is not None and id(job) not in prefetched]
+  logger.debug(f'prefetched jobs: {len(prefetched)}')
+  logger.debug(f'voice jobs: {len(voice_jobs)} / {len(voice_targets)}')
+  logger.debug(f'caption jobs: {len(caption_jobs)} / {len(caption_targets)}')
+
+  # voices wait on network, captions on cpu; run both at once
+  with span('run.generate'), ThreadPoolExecutor(max_workers=1) as voice_runner:
+    voice_errors = voice_runner.submit(
+      run_voice_jobs, voice_jobs, _global_setting(context).seika_center.max_workers,
+    )
+    errors = run_caption_jobs(caption_jobs, python_executable=getattr(bpy.app, 'binary_path_python', None))
+    errors.update(voice_errors.result())
+
+  failed: Set[int] = set()
+  with span('run.apply'):
+    for cs, job in voice_targets:
+      if job is not None and job.path in errors:
+        failed.add(id(cs))
+        continue
+      cs.apply_voice_job(job)
+    for cs, job in caption_targets:
+      if job is not None and job.path in errors:
+        failed.add(id(cs))
+        continue
+      cs.apply_caption_job(job)
+    for cs in scripts:
+      if id(cs) not in failed:
+        cs.mark_clean()
+    # applied outputs are recorded by the scripts; failed jobs may have left files for garbage collection
+    record_outputs(
+      _global_setting(context).cache_setting.manifest(),
+      [job for job in voice_jobs + caption_jobs if job.path in errors],
+    )
 
-  def execute(self, context: Context) -> Set[Union[int, str]]:
-    global_setting = _global_setting(context)
-    chara_for_chan: Dict[int, KiritanifyCharacterSetting] = {
-      chara.script_channel(global_setting): chara
-      for chara in global_setting.characters
-    }
-    logger.debug(f"chara_for_chan: {chara_for_chan!r}")
+  if len(errors) > 0:
+    op.report({'WARNING'}, f'Failed to generate {len(errors)} file(s), see console for details')
+  with span('run.trim_cache'):
+    _maybe_trim_cache(context)
+
+
+def _claim_prefetched(job: Optional[Job], prefetched: Set[int]) -> Optional[Job]:
+  """
+  Returns the job prefetched for the same output once it succeeded (waiting while it runs) and adds it to
+  `prefetched`, or `job` itself to run as usual.
+  """
+  if job is None:
+    return None
+  claimed = PREFETCHER.claim(job.path)
+  if claimed is None:
+    return job
+  prefetch_job, future = claimed
+  try:
+    future.result()
+  except Exception:
+    logger.exception(f'prefetch failed, running again: {job.path}')
+    return job
+  prefetched.add(id(prefetch_job))
+  return prefetch_job
+
+
+def _start_trace(context: Context):
+  # each run starts a new trace, so that the panel shows timings of the last run
+  TRACER.reset(enabled=_global_setting(context).collect_timings)
+
+
+def _dirty_scripts(scripts: List[CharacterScript]) -> List[CharacterScript]:
+  """
+  Returns scripts whose inputs or character changed since the last run or whose sequences are missing; the others
+  only get their sequences aligned.
+  """
+  dirty = []
+  with span('run.align_clean'):
+    for cs in scripts:
+      if cs.is_dirty or cs.has_missing_sequences():
+        dirty.append(cs)
+      else:
+        cs.align_sequences()
+  logger.debug(f'dirty scripts: {len(dirty)} / {len(scripts)}')
+  return dirty
+
+
+def _selected_character_scripts(context: Context) -> List[CharacterScript]:
+  global_setting = _global_setting(context)
+  chara_for_chan: Dict[int, KiritanifyCharacterSetting] = {
+    chara.script_channel(global_setting): chara
+    for chara in global_setting.characters
+  }
+  logger.debug(f"chara_for_chan: {chara_for_chan!r}")
+
+  index = SequenceIndex.build(context)
+  scripts: List[CharacterScript] = []
+  for seq in context.selected_sequences:
+    logger.debug(f"seq: {seq!r}")
+    if not isinstance(seq, AdjustmentSequence):
+      continue
+    seq: kiritanify.types.KiritanifyScriptSequence
+    chara = chara_for_chan.get(seq.channel)
+    if chara is None:
+      continue
+    scripts.append(CharacterScript.create_from(chara, seq, context, index))
+  return scripts
 
-    for seq in context.selected_sequences:
+
+def _all_character_scripts(context: Context) -> List[CharacterScript]:
+  gs = _global_setting(context)
+  with span('run.index'):
+    index = SequenceIndex.build(context)
+  scripts: List[CharacterScript] = []
+  for chara in gs.characters:
+    for seq in get_sequences_by_channel(context, chara.script_channel(gs), index):
       logger.debug(f"seq: {seq!r}")
       if not isinstance(seq, AdjustmentSequence):
         continue
       seq: kiritanify.types.KiritanifyScriptSequence
-      chara = chara_for_chan[seq.channel]
-      if chara is None:
-        continue
-      cs = CharacterScript.create_from(chara, seq, context)
-      logger.debug(f"cs: {cs!r}")
-      cs.maybe_update_voice()
-      cs.maybe_update_caption()
+      scripts.append(CharacterScript.create_from(chara, seq, context, index))
+  return scripts
+
+
+class KIRITANIFY_OT_RunKiritanifyForScripts(bpy.types.Operator):
+  bl_idname = "kiritanify.run_kiritanify_for_scripts"
+  bl_label = "Run KiritanifyForScripts"
+
+  def execute(self, context: Context) -> Set[Union[int, str]]:
+    _start_trace(context)
+    with span('op.run_selected'):
+      _run_character_scripts(self, context, _selected_character_scripts(context))
     return {'FINISHED'}
 
 
@@ -47,27 +178,209 @@ class KIRITANIFY_OT_RunKiritanifyForAllScripts(bpy.types.Operator):
   bl_idname = "kiritanify.run_kiritanify_for_all_scripts"
   bl_label = "Run KiritanifyForAllScripts"
 
+  force_all: bpy.props.BoolProperty(name='force all', default=False)
+
   def execute(self, context: Context) -> Set[Union[int, str]]:
+    _start_trace(context)
+    with span('op.run_all'):
+      with span('run.find_scripts'):
+        scripts = _all_character_scripts(context)
+      if not self.force_all:
+        scripts = _dirty_scripts(scripts)
+      _run_character_scripts(self, context, scripts)
+    return {'FINISHED'}
+
+
+RUN_PROGRESS = RunProgress()
+
+
+class _ScriptTask:
+  """
+  Pending work of one script for the background runner. Refers sequences by name, because the user keeps
+  editing while the runner is working and python references to deleted sequences are not safe.
+  """
+  chara_name: str
+  seq_name: str
+  wants_voice: bool
+  voice_job: Optional[VoiceJob]
+  voice_future: Optional[Future]
+  wants_caption: bool
+  caption_job: Optional[CaptionJob]
+  caption_future: Optional[Future]
+
+  def __init__(self, cs: CharacterScript):
+    self.chara_name = cs.chara.chara_name
+    self.seq_name = cs.seq.name
+    self.wants_voice = cs.wants_voice()
+    self.voice_job, self.voice_future = self._claim_prefetched(cs.voice_job() if self.wants_voice else None)
+    self.wants_caption = cs.wants_caption()
+    self.caption_job, self.caption_future = self._claim_prefetched(cs.caption_job() if self.wants_caption else None)
+
+  @staticmethod
+  def _claim_prefetched(job: Optional[Job]) -> Tuple[Optional[Job], Optional[Future]]:
+    # a running prefetch job is taken over as is, its future tells when it is done
+    if job is None:
+      return None, None
+    claimed = PREFETCHER.claim(job.path)
+    return (job, None) if claimed is None else claimed
+
+  def futures(self) -> List[Future]:
+    return [f for f in (self.voice_future, self.caption_future) if f is not None]
+
+  def started_jobs(self) -> List[Tuple[Job, Future]]:
+    return [
+      (job, future)
+      for job, future in ((self.voice_job, self.voice_future), (self.caption_job, self.caption_future))
+      if future is not None
+    ]
+
+  def is_done(self) -> bool:
+    return all(f.done() for f in self.futures())
+
+  def apply(self, context: Context, index: SequenceIndex) -> bool:
+    """
+    Creates sequences from finished jobs. Returns False when any part failed.
+    """
     gs = _global_setting(context)
-    chara_for_chan: Dict[int, KiritanifyCharacterSetting] = {
-      chara.script_channel(gs): chara
-      for chara in gs.characters
-    }
-    logger.debug(f"chara_for_chan: {chara_for_chan!r}")
-
-    for chara in gs.characters:
-      for seq in get_sequences_by_channel(context, chara.script_channel(gs)):
-        logger.debug(f"seq: {seq!r}")
-        if not isinstance(seq, AdjustmentSequence):
-          continue
-        seq: kiritanify.types.KiritanifyScriptSequence
-        cs = CharacterScript.create_from(chara, seq, context)
-        logger.debug(f"cs: {cs!r}")
-        cs.maybe_update_voice()
-        cs.maybe_update_caption()
+    chara = gs.find_character_by_name(self.chara_name)
+    seq = index.get(self.seq_name)
+    if chara is None or seq is None:
+      logger.debug(f'script is gone while running: {self.seq_name}')
+      return False
+
+    cs = CharacterScript.create_from(chara, seq, context, index)
+    ok = True
+    if self.wants_voice:
+      if self.voice_future is not None and self.voice_future.exception() is not None:
+        logger.error(f'voice job failed: {self.seq_name}: {self.voice_future.exception()!r}')
+        ok = False
+      else:
+        cs.apply_voice_job(self.voice_job)
+    if self.wants_caption:
+      if self.caption_future is not None and self.caption_future.exception() is not None:
+        logger.error(f'caption job failed: {self.seq_name}: {self.caption_future.exception()!r}')
+        ok = False
+      else:
+        cs.apply_caption_job(self.caption_job)
+    # the script may have been edited while its jobs were running; it stays dirty for the next run then
+    if ok and cs.is_up_to_date():
+      cs.mark_clean()
+    return ok
+
+
+class KIRITANIFY_OT_RunKiritanifyInBackground(bpy.types.Operator):
+  """Run kiritanify without blocking the UI. Finished scripts are applied one by one, Esc to cancel"""
+  bl_idname = "kiritanify.run_kiritanify_in_background"
+  bl_label = "Run Kiritanify in background"
+
+  all_scripts: bpy.props.BoolProperty(name='all scripts', default=False)
+  force_all: bpy.props.BoolProperty(name='force all', default=False)
+
+  TIMER_INTERVAL_SEC = 0.1
+  APPLY_BUDGET_SEC = 0.05
+
+  _timer = None
+  _executor: Optional[ThreadPoolExecutor] = None
+  _tasks: List[_ScriptTask]
+
+  @classmethod
+  def poll(cls, context: Context) -> bool:
+    return not RUN_PROGRESS.is_running
+
+  def invoke(self, context: Context, event) -> Set[Union[int, str]]:
+    _start_trace(context)
+    with span('run.find_scripts'):
+      if self.all_scripts:
+        scripts = _all_character_scripts(context)
+        if not self.force_all:
+          scripts = _dirty_scripts(scripts)
+      else:
+        scripts = _selected_character_scripts(context)
+    with span('run.collect'):
+      self._tasks = [_ScriptTask(cs) for cs in scripts]
+    RUN_PROGRESS.reset(len(self._tasks))
+
+    self._executor = ThreadPoolExecutor(max_workers=_global_setting(context).seika_center.max_workers)
+    voice_futures: Dict[Path, Future] = {}
+    for task in self._tasks:
+      if task.voice_job is not None:
+        if task.voice_future is not None:
+          voice_futures.setdefault(task.voice_job.path, task.voice_future)
+        elif task.voice_job.path not in voice_futures:
+          voice_futures[task.voice_job.path] = self._executor.submit(task.voice_job.run)
+        task.voice_future = voice_futures[task.voice_job.path]
+      if task.caption_job is not None and task.caption_future is None:
+        task.caption_future = self._executor.submit(task.caption_job.run)
+
+    wm = context.window_manager
+    self._timer = wm.event_timer_add(self.TIMER_INTERVAL_SEC, window=context.window)
+    wm.modal_handler_add(self)
+    return {'RUNNING_MODAL'}
+
+  def modal(self, context: Context, event) -> Set[Union[int, str]]:
+    if event.type == 'ESC':
+      return self._finish(context, cancelled=True)
+    if event.type != 'TIMER':
+      return {'PASS_THROUGH'}
+
+    deadline = time.monotonic() + self.APPLY_BUDGET_SEC
+    remaining: List[_ScriptTask] = []
+    # sequences may be edited between ticks, so the index lives only within a tick
+    index: Optional[SequenceIndex] = None
+    for task in self._tasks:
+      if time.monotonic() > deadline or not task.is_done():
+        remaining.append(task)
+        continue
+      if index is None:
+        with span('run.index'):
+          index = SequenceIndex.build(context)
+      try:
+        with span('run.apply'):
+          ok = task.apply(context, index)
+      except Exception:
+        logger.exception(f'failed to apply script: {task.seq_name}')
+        ok = False
+      RUN_PROGRESS.done += 1
+      if not ok:
+        RUN_PROGRESS.failed += 1
+        # outputs of a failed or deleted script are not on a strip; record them for garbage collection
+        record_outputs(_global_setting(context).cache_setting.manifest(), [job for job, _ in task.started_jobs()])
+    self._tasks = remaining
+
+    _tag_redraw_sequence_editors(context)
+    if len(self._tasks) == 0:
+      return self._finish(context, cancelled=False)
+    return {'RUNNING_MODAL'}
+
+  def _finish(self, context: Context, cancelled: bool) -> Set[Union[int, str]]:
+    for task in self._tasks:
+      for future in task.futures():
+        future.cancel()
+    # running jobs finish in background without creating sequences; their files are recorded once done
+    record_when_done([entry for task in self._tasks for entry in task.started_jobs()])
+    self._tasks = []
+    self._executor.shutdown(wait=False)
+    self._executor = None
+    context.window_manager.event_timer_remove(self._timer)
+    self._timer = None
+
+    RUN_PROGRESS.finish(cancelled=cancelled)
+    with span('run.trim_cache'):
+      _maybe_trim_cache(context)
+    _tag_redraw_sequence_editors(context)
+    if RUN_PROGRESS.failed > 0:
+      self.report({'WARNING'}, f'{RUN_PROGRESS.failed} script(s) failed, see console for details')
+    if cancelled:
+      return {'CANCELLED'}
     return {'FINISHED'}
 
 
+def _tag_redraw_sequence_editors(context: Context):
+  for area in context.screen.areas:
+    if area.type == 'SEQUENCE_EDITOR':
+      area.tag_redraw()
+
+
 class KIRITANIFY_OT_NewScriptSequence(bpy.types.Operator):
   bl_idname = "kiritanify.new_script_sequence"
   bl_label = "NewScriptSequence"
@@ -95,6 +408,61 @@ class KIRITANIFY_OT_NewScriptSequence(bpy.types.Operator):
     return {'FINISHED'}
 
 
+class KIRITANIFY_OT_ImportScripts(bpy.types.Operator, ImportHelper):
+  """Create script sequences from a tsv/csv file (chara, text[, duration_sec]) or `chara: text` lines"""
+  bl_idname = "kiritanify.import_scripts"
+  bl_label = "Import scripts"
+  bl_options = {'REGISTER', 'UNDO'}
+
+  filter_glob: bpy.props.StringProperty(default='*.txt;*.tsv;*.csv', options={'HIDDEN'})
+  gap_sec: bpy.props.FloatProperty(name='Gap (sec)', min=0., default=0.2)
+  default_duration_sec: bpy.props.FloatProperty(
+    name='Default duration (sec)', min=0.1, default=3.,
+    description='Duration of scripts without one in the file; it is extended to the voice on run',
+  )
+
+  def execute(self, context: Context):
+    try:
+      lines = parse_script_file(Path(self.filepath))
+    except (OSError, ValueError) as e:
+      self.report({'ERROR'}, f'Failed to read scripts: {e}')
+      return {'CANCELLED'}
+
+    gs = _global_setting(context)
+    if context.scene.sequence_editor is None:
+      context.scene.sequence_editor_create()
+    sequences = _sequences(context)
+    fps = _fps(context)
+    stamp = _datetime_str()
+
+    frame = _current_frame(context)
+    created = 0
+    unknown: Set[str] = set()
+    for idx, line in enumerate(lines):
+      chara = gs.find_character_by_name(line.chara_name)
+      if chara is None:
+        unknown.add(line.chara_name)
+        continue
+      duration_sec = self.default_duration_sec if line.duration_sec is None else line.duration_sec
+      frame_end = frame + max(1, round(duration_sec * fps))
+      seq = sequences.new_effect(
+        # unique without blender renaming, which scans all sequences per strip
+        name=f'Script:{chara.chara_name}:{stamp}:{idx:05d}',
+        type='ADJUSTMENT',
+        channel=chara.script_channel(gs),
+        frame_start=frame,
+        frame_end=frame_end,
+      )
+      _script_setting(seq).text = line.text
+      created += 1
+      frame = frame_end + round(self.gap_sec * fps)
+
+    if len(unknown) > 0:
+      self.report({'WARNING'}, f'Skipped lines of unknown characters: {", ".join(sorted(unknown))}')
+    self.report({'INFO'}, f'Imported {created} script(s)')
+    return {'FINISHED'}
+
+
 class KIRITANIFY_OT_NewTachieSequences(bpy.types.Operator):
   bl_idname = 'kiritanify.new_tachie_sequences'
   bl_label = 'NewTachieSeqs'
@@ -149,6 +517,15 @@ class KIRITANIFY_OT_NewTachieSequences(bpy.types.Operator):
     return {'FINISHED'}
 
 
+class KIRITANIFY_OT_RefreshTachieFiles(bpy.types.Operator):
+  bl_idname = 'kiritanify.refresh_tachie_files'
+  bl_label = 'RefreshTachieFiles'
+
+  def execute(self, context: Context):
+    clear_tachie_cache()
+    return {'FINISHED'}
+
+
 class KIRITANIFY_OT_AddCharacter(bpy.types.Operator):
   bl_idname = 'kiritanify.add_character'
   bl_label = 'AddCharacter'
@@ -250,40 +627,81 @@ class KIRITANIFY_OT_RemoveCacheFiles(bpy.types.Operator):
   bl_idname = 'kiritanify.remove_cache_files'
   bl_label = 'Clear caches'
 
+  @classmethod
+  def poll(cls, context):
+    # files of a background run are not referenced by strips until applied
+    return not RUN_PROGRESS.is_running
+
   def execute(self, context):
-    referred_files: Set[Path] = set(sum(map(
-      self.get_paths_from,
-      _sequences(context)
-    ), []))
-
-    path = _global_setting(context).cache_setting.root_dir()
-    png_paths = set(p.resolve() for p in path.glob('caption/*/*.png'))
-    ogg_paths = set(p.resolve() for p in path.glob('voice/*/*.ogg'))
-    existing_paths = png_paths.union(ogg_paths)
-    logger.debug(f'referred_files: {referred_files}')
-    logger.debug(f'existing_files: {existing_paths}')
-
-    deletable_paths = existing_paths - referred_files
-    for path in deletable_paths:  # type: Path
-      path.unlink()
+    manifest = _global_setting(context).cache_setting.manifest()
+    manifest.set_references(_referenced_cache_files(context))
+    deleted = manifest.remove_unreferenced()
+    self.report({'INFO'}, f'Removed {len(deleted)} file(s), {_mb(sum(a.size for a in deleted)):.1f} MB')
+    return {'FINISHED'}
+
 
+class KIRITANIFY_OT_TrimCacheFiles(bpy.types.Operator):
+  bl_idname = 'kiritanify.trim_cache_files'
+  bl_label = 'Trim caches'
+  bl_description = 'Delete least recently used unreferenced files until the cache fits in the max size'
+
+  @classmethod
+  def poll(cls, context):
+    return _global_setting(context).cache_setting.max_cache_size_mb > 0
+
+  def execute(self, context):
+    deleted = _maybe_trim_cache(context)
+    self.report({'INFO'}, f'Removed {len(deleted)} file(s), {_mb(sum(a.size for a in deleted)):.1f} MB')
     return {'FINISHED'}
 
-  def get_paths_from(self, seq: Sequence) -> List[Path]:
-    if isinstance(seq, ImageSequence):
-      return [
-        Path(bpy.path.abspath(f'{seq.directory}/{elem.filename}'))
-        for elem in seq.elements  # type: SequenceElement
-      ]
-    elif isinstance(seq, SoundSequence):
-      return [
-        Path(bpy.path.abspath(seq.sound.filepath))
-      ]
-    elif isinstance(seq, AdjustmentSequence):
-      return []
-    else:
-      logger.debug(f'RemoveCacheFiles: unexpected seq{seq}')
-      return []
+
+def _maybe_trim_cache(context: Context) -> List[Artifact]:
+  """
+  Applies the max cache size, if any. Files referenced by strips are kept.
+  """
+  cache_setting = _global_setting(context).cache_setting
+  if cache_setting.max_cache_size_mb <= 0:
+    return []
+  manifest = cache_setting.manifest()
+  manifest.set_references(_referenced_cache_files(context))
+  deleted = manifest.evict(cache_setting.max_cache_size_mb * 1024 * 1024)
+  logger.debug(f'trimmed cache: {len(deleted)} file(s)')
+  return deleted
+
+
+def _referenced_cache_files(context: Context) -> Dict[Path, List[str]]:
+  """
+  Files used by strips of any scene (scenes of a blend file share the cache dir), with names of the strips.
+  """
+  strips_for_path: Dict[Path, List[str]] = {}
+  for scene in bpy.data.scenes:
+    if scene.sequence_editor is None:
+      continue
+    for seq in scene.sequence_editor.sequences_all:
+      for path in _file_paths_of(seq):
+        strips_for_path.setdefault(path, []).append(seq.name)
+  # not on a strip yet, but Run takes them
+  for path in PREFETCHER.paths():
+    strips_for_path.setdefault(path, []).append('(prefetch)')
+  return strips_for_path
+
+
+def _file_paths_of(seq: Sequence) -> List[Path]:
+  if isinstance(seq, ImageSequence):
+    return [
+      Path(bpy.path.abspath(f'{seq.directory}/{elem.filename}'))
+      for elem in seq.elements  # type: SequenceElement
+    ]
+  elif isinstance(seq, SoundSequence):
+    return [
+      Path(bpy.path.abspath(seq.sound.filepath))
+    ]
+  else:
+    return []
+
+
+def _mb(size: int) -> float:
+  return size / (1024 * 1024)
 
 
 class KIRITANIFY_OT_AlignToStart(bpy.types.Operator):
@@ -328,89 +746,172 @@ def _baisoku_target_sequences(context: Context) -> Iterator[Sequence]:
 class KIRITANIFY_OT_BaisokuInit(bpy.types.Operator):
   bl_idname = "kiritanify.baisoku_init"
   bl_label = "BaisokuInit"
+  bl_options = {'REGISTER', 'UNDO'}
 
   def execute(self, context: Context):
-    sequence_editor = context.scene.sequence_editor
-    sequencer = bpy.ops.sequencer
-
     seq = find_selected_movie_sequence(context)
     if seq is None:
-      return
-    sequencer.select_all(action="DESELECT")
-    seq.select = True
-
-    bpy.ops.sequencer.effect_strip_add(type='SPEED')
-    speed_effect = sequence_editor.active_strip
-    speed_effect.use_default_fade = False
-    speed_effect.speed_factor = 1
-    speed_effect.channel = seq.channel - 1
-
-    speed_effect.select = False
-    seq.select = True
-
+      return {'CANCELLED'}
+    new_speed_sequence(_sequences(context), seq)
     return {'FINISHED'}
 
 
 class KIRITANIFY_OT_BaisokuCut(bpy.types.Operator):
   bl_idname = "kiritanify.baisoku_cut"
   bl_label = "BaisokuCut"
+  bl_options = {'REGISTER', 'UNDO'}
 
   def execute(self, context):
     frame_current = _current_frame(context)
-    target_movie_seqs = list(_baisoku_target_sequences(context))
-    bpy.ops.sequencer.select_all(action='DESELECT')
-    for seq in target_movie_seqs:
-      seq.select = True
-      speed_seq = find_speed_seq_from_movie_seq(context, seq)
-      speed_factor = _speed_factor(speed_seq)
-      if speed_seq is not None:
-        speed_seq.select = True
-      _end = seq.frame_final_end
-      bpy.ops.sequencer.cut(frame=frame_current, type='SOFT', side='RIGHT')
-      for new_seq in context.selected_sequences:  # type: Sequence
-        if not isinstance(new_seq, MovieSequence):
-          continue
-        new_seq.frame_offset_start = seq.frame_offset_start + seq.frame_final_duration * speed_factor
-        new_seq.frame_start = seq.frame_final_end - new_seq.frame_offset_start
-        new_seq.channel = seq.channel
-        new_seq.frame_final_end = _end
+    target_movie_seqs = [
+      seq for seq in _baisoku_target_sequences(context)
+      if isinstance(seq, MovieSequence)
+    ]
+    _, skipped = _baisoku_cut(context, target_movie_seqs, [(frame_current, None)])
+    _report_skipped(self, skipped)
+    return {'FINISHED'}
+
+
+class KIRITANIFY_OT_BaisokuBatchCut(bpy.types.Operator):
+  """Cut selected movies at timeline markers named with speed factors (`2`, `x1.5`, ...) and speed up each part"""
+  bl_idname = "kiritanify.baisoku_batch_cut"
+  bl_label = "BaisokuBatchCut"
+  bl_options = {'REGISTER', 'UNDO'}
+
+  cuts: bpy.props.StringProperty(
+    name='Cuts',
+    description='`frame:speed_factor` separated by commas; timeline markers are used when empty',
+  )
+  selected_markers_only: bpy.props.BoolProperty(name='Selected markers only', default=False)
+
+  def execute(self, context):
+    try:
+      cuts = self._cuts(context)
+    except ValueError as e:
+      self.report({'ERROR'}, str(e))
+      return {'CANCELLED'}
+    if len(cuts) == 0:
+      self.report({'WARNING'}, 'No cuts; name timeline markers with speed factors, e.g. `2` or `x1.5`')
+      return {'CANCELLED'}
+
+    movie_seqs = [seq for seq in context.selected_sequences if isinstance(seq, MovieSequence)]
+    num_parts, skipped = _baisoku_cut(context, movie_seqs, cuts)
+    self.report({'INFO'}, f'{len(movie_seqs) - len(skipped)} movie(s) cut into {num_parts} part(s)')
+    _report_skipped(self, skipped)
     return {'FINISHED'}
 
+  def _cuts(self, context: Context) -> List[Tuple[int, Optional[float]]]:
+    if self.cuts.strip() != '':
+      cuts = []
+      for item in self.cuts.split(','):
+        frame, _, speed = item.partition(':')
+        try:
+          cuts.append((int(frame), float(speed)))
+        except ValueError:
+          raise ValueError(f'Cut is not `frame:speed_factor`: {item.strip()!r}') from None
+      return cuts
+
+    cuts = []
+    for marker in context.scene.timeline_markers:
+      if self.selected_markers_only and not marker.select:
+        continue
+      speed_factor = parse_speed_marker(marker.name)
+      if speed_factor is not None:
+        cuts.append((marker.frame, speed_factor))
+    return cuts
+
+
+def _baisoku_cut(
+    context: Context,
+    movie_seqs: List[kiritanify.types.MovieSequence],
+    cuts: List[Tuple[int, Optional[float]]],
+) -> Tuple[int, List[str]]:
+  """
+  Cuts each movie at `cuts` (frame, speed factor or None to keep it). Returns the number of resulting parts and
+  reasons of movies left as they are, whose parts would overlap following sequences.
+  """
+  sequences = _sequences(context)
+  index = SequenceIndex.build(context)
+  num_parts = 0
+  skipped = []
+  for seq in movie_seqs:
+    speed_seq = find_speed_seq_from_movie_seq(context, seq, index)
+    segments = segments_for_cuts(seq, speed_factor_of(speed_seq), cuts)
+    try:
+      num_parts += len(apply_segments(sequences, seq, speed_seq, segments, index))
+    except ValueError as e:
+      skipped.append(str(e))
+  return num_parts, skipped
+
+
+def _report_skipped(op: bpy.types.Operator, skipped: List[str]):
+  if len(skipped) > 0:
+    logger.warning('\n'.join(skipped))
+    op.report({'WARNING'}, f'Skipped {len(skipped)} movie(s) running into the next strip: {skipped[0]}')
+
 
 class KIRITANIFY_OT_BaisokuAlign(bpy.types.Operator):
   bl_idname = "kiritanify.baisoku_align"
   bl_label = "BaisokuAlign"
+  bl_options = {'REGISTER', 'UNDO'}
 
   def execute(self, context):
+    index = SequenceIndex.build(context)
     for seq in context.selected_sequences:
       if not isinstance(seq, MovieSequence):
         continue
       seq: kiritanify.types.MovieSequence
-      speed_seq = find_speed_seq_from_movie_seq(context, seq)
+      speed_seq = find_speed_seq_from_movie_seq(context, seq, index)
       if speed_seq is None:
         continue
-      speed_factor = _speed_factor(speed_seq)
+      speed_factor = speed_factor_of(speed_seq)
       if speed_factor == 1:
         continue
-      duration_before_speedup = seq.frame_duration - seq.frame_offset_start
-      duration_after_speedup = int(duration_before_speedup / speed_factor)
-      seq.frame_final_end = seq.frame_final_start + duration_after_speedup
+      align_to_speed(seq, speed_factor)
+    return {'FINISHED'}
+
+
+class KIRITANIFY_OT_ExportTrace(bpy.types.Operator, ExportHelper):
+  """Save timings of the last run as a chrome trace (chrome://tracing, ui.perfetto.dev)"""
+  bl_idname = "kiritanify.export_trace"
+  bl_label = "Export trace"
+
+  filename_ext = '.json'
+  filter_glob: bpy.props.StringProperty(default='*.json', options={'HIDDEN'})
+
+  @classmethod
+  def poll(cls, context: Context) -> bool:
+    return TRACER.has_records()
+
+  def execute(self, context: Context):
+    try:
+      TRACER.write_chrome_trace(Path(self.filepath))
+    except OSError as e:
+      self.report({'ERROR'}, f'Failed to save trace: {e}')
+      return {'CANCELLED'}
+    self.report({'INFO'}, f'Trace saved: {self.filepath}')
     return {'FINISHED'}
 
 
 OP_CLASSES = [
   KIRITANIFY_OT_RunKiritanifyForScripts,
   KIRITANIFY_OT_RunKiritanifyForAllScripts,
+  KIRITANIFY_OT_RunKiritanifyInBackground,
   KIRITANIFY_OT_NewScriptSequence,
+  KIRITANIFY_OT_ImportScripts,
   KIRITANIFY_OT_NewTachieSequences,
+  KIRITANIFY_OT_RefreshTachieFiles,
   KIRITANIFY_OT_AddCharacter,
   KIRITANIFY_OT_RemoveCharacter,
   KIRITANIFY_OT_SetDefaultCharacters,
   KIRITANIFY_OT_ResetVoiceStyle,
   KIRITANIFY_OT_ToggleRamCaching,
   KIRITANIFY_OT_RemoveCacheFiles,
+  KIRITANIFY_OT_TrimCacheFiles,
+  KIRITANIFY_OT_ExportTrace,
   KIRITANIFY_OT_BaisokuInit,
   KIRITANIFY_OT_BaisokuCut,
+  KIRITANIFY_OT_BaisokuBatchCut,
   KIRITANIFY_OT_BaisokuAlign,
   KIRITANIFY_OT_AlignToStart,
   KIRITANIFY_OT_AlignToEnd,
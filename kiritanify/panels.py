@@ -5,10 +5,13 @@ import bpy
 from bpy.types import Context, UILayout
 
 from kiritanify.ops import (
-  KIRITANIFY_OT_AddCharacter, KIRITANIFY_OT_BaisokuAlign, KIRITANIFY_OT_BaisokuCut, KIRITANIFY_OT_BaisokuInit,
-  KIRITANIFY_OT_NewScriptSequence, KIRITANIFY_OT_NewTachieSequences, KIRITANIFY_OT_RemoveCacheFiles,
-  KIRITANIFY_OT_RemoveCharacter, KIRITANIFY_OT_ResetVoiceStyle, KIRITANIFY_OT_RunKiritanifyForAllScripts,
-  KIRITANIFY_OT_RunKiritanifyForScripts, KIRITANIFY_OT_SetDefaultCharacters, KIRITANIFY_OT_ToggleRamCaching
+  KIRITANIFY_OT_AddCharacter, KIRITANIFY_OT_BaisokuAlign, KIRITANIFY_OT_BaisokuBatchCut, KIRITANIFY_OT_BaisokuCut,
+  KIRITANIFY_OT_BaisokuInit, KIRITANIFY_OT_ExportTrace, KIRITANIFY_OT_ImportScripts, KIRITANIFY_OT_NewScriptSequence,
+  KIRITANIFY_OT_NewTachieSequences, KIRITANIFY_OT_RefreshTachieFiles, KIRITANIFY_OT_RemoveCacheFiles,
+  KIRITANIFY_OT_RemoveCharacter, KIRITANIFY_OT_ResetVoiceStyle,
+  KIRITANIFY_OT_RunKiritanifyForAllScripts, KIRITANIFY_OT_RunKiritanifyForScripts,
+  KIRITANIFY_OT_RunKiritanifyInBackground, KIRITANIFY_OT_SetDefaultCharacters, KIRITANIFY_OT_ToggleRamCaching,
+  KIRITANIFY_OT_TrimCacheFiles, RUN_PROGRESS,
 )
 from kiritanify.propgroups import (
   KiritanifyCharacterSetting,
@@ -17,6 +20,7 @@ from kiritanify.propgroups import (
   _script_setting,
   get_selected_script_sequence,
 )
+from kiritanify.tracing import TRACER
 from kiritanify.types import KiritanifyScriptSequence
 from kiritanify.utils import find_selected_movie_sequence, find_speed_seq_from_movie_seq, split_per_num
 
@@ -42,11 +46,21 @@ class KIRITANIFY_PT_ScriptPanel(bpy.types.Panel):
     _row = layout.row()
     _row.operator(KIRITANIFY_OT_RunKiritanifyForScripts.bl_idname, text="Selected Scripts")
     _row.operator(KIRITANIFY_OT_RunKiritanifyForAllScripts.bl_idname, text="All Scripts")
+    op = _row.operator(KIRITANIFY_OT_RunKiritanifyForAllScripts.bl_idname, text="Force All")
+    op.force_all = True
+    _row = layout.row()
+    op = _row.operator(KIRITANIFY_OT_RunKiritanifyInBackground.bl_idname, text="Selected (bg)")
+    op.all_scripts = False
+    op = _row.operator(KIRITANIFY_OT_RunKiritanifyInBackground.bl_idname, text="All (bg)")
+    op.all_scripts = True
+    self._maybe_draw_ui_for_progress(layout)
+    self._draw_ui_for_timings(context, layout)
 
     layout.separator()
     _row = layout.row()
     _row.operator(KIRITANIFY_OT_ToggleRamCaching.bl_idname, text="ToggleRamCache")
     _row.operator(KIRITANIFY_OT_RemoveCacheFiles.bl_idname, text="RemoveCacheFiles")
+    _row.operator(KIRITANIFY_OT_TrimCacheFiles.bl_idname, text="Trim")
 
     layout.separator()
     self._draw_ui_for_new_seq(context, layout)
@@ -57,6 +71,37 @@ class KIRITANIFY_PT_ScriptPanel(bpy.types.Panel):
     layout.separator()
     self._maybe_draw_ui_for_voice_style(context, layout)
 
+  @staticmethod
+  def _maybe_draw_ui_for_progress(layout: UILayout):
+    if RUN_PROGRESS.total == 0:
+      return
+    _box = layout.box()
+    if RUN_PROGRESS.is_running:
+      eta = RUN_PROGRESS.eta_sec()
+      _box.label(text=f'Running: {RUN_PROGRESS.done}/{RUN_PROGRESS.total} (Esc to cancel)')
+      _box.label(text=f'{RUN_PROGRESS.throughput():.2f} scripts/s, ETA: {"-" if eta is None else f"{eta:.0f}s"}')
+    else:
+      status = 'Cancelled' if RUN_PROGRESS.cancelled else 'Done'
+      _box.label(text=f'{status}: {RUN_PROGRESS.done}/{RUN_PROGRESS.total} in {RUN_PROGRESS.elapsed_sec():.1f}s')
+    if RUN_PROGRESS.failed > 0:
+      _box.label(text=f'Failed: {RUN_PROGRESS.failed}', icon='ERROR')
+
+  @staticmethod
+  def _draw_ui_for_timings(context: Context, layout: UILayout, max_rows: int = 12):
+    _row = layout.row()
+    _row.prop(_global_setting(context), 'collect_timings')
+    _row.operator(KIRITANIFY_OT_ExportTrace.bl_idname, text='Export trace')
+    if not TRACER.has_records():
+      return
+    # stages of the last run, slowest first
+    _box = layout.box()
+    for stage in TRACER.summary()[:max_rows]:
+      _row = _box.row()
+      _row.label(text=stage.name)
+      _row.label(text=f'{stage.count}x')
+      _row.label(text=f'{stage.total_sec * 1000:.0f} ms')
+      _row.label(text=f'max {stage.max_sec * 1000:.1f} ms')
+
   @staticmethod
   def _draw_ui_for_new_seq(context: Context, layout: UILayout):
     gs = _global_setting(context)
@@ -71,6 +116,7 @@ class KIRITANIFY_PT_ScriptPanel(bpy.types.Panel):
           text=f'{chara.chara_name}',
         )
         op.chara_name = chara.chara_name
+      _box.operator(KIRITANIFY_OT_ImportScripts.bl_idname, text='Import scripts', icon='IMPORT')
 
   @staticmethod
   def _draw_ui_for_seq_settings(context: Context, layout: UILayout):
@@ -114,6 +160,7 @@ class KIRITANIFY_PT_TachiePanel(bpy.types.Panel):
 
   def draw(self, context: Context):
     layout: UILayout = self.layout
+    layout.operator(KIRITANIFY_OT_RefreshTachieFiles.bl_idname, text='Refresh', icon='FILE_REFRESH')
     self._draw_ui_for_new_seq(context, layout)
 
   @staticmethod
@@ -153,6 +200,29 @@ class KIRITANIFY_PT_GlobalSettingPanel(bpy.types.Panel):
     row.prop(gs, 'start_channel_for_script', slider=False, text='Script')
     row.prop(gs, 'start_channel_for_caption', slider=False, text='Caption')
 
+    row = layout.row()
+    row.label(text="Caption:")
+    row.prop(gs.cache_setting, 'crop_caption', text='Crop')
+    row.prop(gs.cache_setting, 'caption_format', text='')
+    if gs.cache_setting.caption_format == 'PNG':
+      row.prop(gs.cache_setting, 'caption_png_compress_level', text='Level', slider=False)
+
+    row = layout.row()
+    row.label(text="Voice:")
+    row.prop(gs.cache_setting, 'voice_format', text='')
+    row.prop(gs.cache_setting, 'normalize_voice_loudness', text='Normalize')
+
+    row = layout.row()
+    row.label(text="Cache:")
+    row.prop(gs.cache_setting, 'max_cache_size_mb', text='Max MB')
+
+    row = layout.row()
+    row.label(text="Prefetch:")
+    row.prop(gs.cache_setting, 'prefetch_while_editing', text='Enable')
+    _sub = row.row()
+    _sub.enabled = gs.cache_setting.prefetch_while_editing
+    _sub.prop(gs.cache_setting, 'prefetch_delay_sec', text='Delay', slider=False)
+
     row = layout.row()
     row.label(text="Character:")
     row.operator(KIRITANIFY_OT_AddCharacter.bl_idname, text='AddChara')
@@ -194,6 +264,9 @@ class KIRITANIFY_PT_GlobalSettingPanel(bpy.types.Panel):
       _row.prop(chara.voice_style, 'speed', slider=False)
       _row.prop(chara.voice_style, 'pitch', slider=False)
       _row.prop(chara.voice_style, 'intonation', slider=False)
+      if gs.cache_setting.normalize_voice_loudness:
+        _row = col.row()
+        _row.prop(chara, 'loudness_target_db', text='Loudness', slider=False)
 
 
 class KIRITANIFY_PT_BaisokuCutPanel(bpy.types.Panel):
@@ -216,6 +289,8 @@ class KIRITANIFY_PT_BaisokuCutPanel(bpy.types.Panel):
     else:
       _row.operator(KIRITANIFY_OT_BaisokuCut.bl_idname, text='Cut')
       _row.operator(KIRITANIFY_OT_BaisokuAlign.bl_idname, text='Align')
+    layout.operator(KIRITANIFY_OT_BaisokuBatchCut.bl_idname, text='Cut at markers', icon='MARKER')
+    if speed_seq is not None:
       layout.label(text=movie_seq.name)
       layout.prop(speed_seq, 'speed_factor', slider=False)
 
@@ -234,6 +309,11 @@ class KIRITANIFY_PT_SeikaCenterSettingPanel(bpy.types.Panel):
     layout.prop(gs.seika_center, 'addr')
     layout.prop(gs.seika_center, 'user')
     layout.prop(gs.seika_center, 'password')
+    layout.prop(gs.seika_center, 'max_workers', slider=False)
+    _row = layout.row()
+    _row.prop(gs.seika_center, 'connect_timeout_sec', slider=False, text='Connect')
+    _row.prop(gs.seika_center, 'read_timeout_sec', slider=False, text='Read')
+    layout.prop(gs.seika_center, 'max_attempts', slider=False)
 
 
 PANEL_CLASSES = [
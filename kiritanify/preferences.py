@@ -0,0 +1,47 @@
+import os
+from typing import Optional
+
+import bpy
+from bpy.types import Context
+
+ADDON_NAME = __name__.partition('.')[0]
+
+
+class KiritanifyPreferences(bpy.types.AddonPreferences):
+  bl_idname = ADDON_NAME
+
+  use_shared_cache: bpy.props.BoolProperty(
+    name='Use shared cache',
+    description='Share generated voices and captions between projects; projects get hardlinks of shared files',
+    default=False,
+  )
+  shared_cache_dir: bpy.props.StringProperty(
+    name='Shared cache dir',
+    subtype='DIR_PATH',
+    default=os.path.join(os.path.expanduser('~'), '.cache', 'kiritanify'),
+  )
+
+  def draw(self, context: Context):
+    layout = self.layout
+    layout.prop(self, 'use_shared_cache')
+    row = layout.row()
+    row.enabled = self.use_shared_cache
+    row.prop(self, 'shared_cache_dir')
+
+
+def _preferences(context: Context) -> Optional[KiritanifyPreferences]:
+  addon = context.preferences.addons.get(ADDON_NAME)
+  # None when registered from a script instead of as an add-on
+  return None if addon is None else addon.preferences
+
+
+def shared_cache_dir(context: Context) -> Optional[str]:
+  preferences = _preferences(context)
+  if preferences is None or not preferences.use_shared_cache or preferences.shared_cache_dir == '':
+    return None
+  return bpy.path.abspath(preferences.shared_cache_dir)
+
+
+PREFERENCE_CLASSES = [
+  KiritanifyPreferences,
+]
@@ -0,0 +1,240 @@
+import logging
+import queue
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import bpy
+from bpy.types import AdjustmentSequence
+
+from kiritanify.jobs import Job, VoiceJob
+from kiritanify.manifest import Manifest
+from kiritanify.models import CharacterScript
+from kiritanify.propgroups import KiritanifyScriptSequenceSetting, _global_setting
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# prefetching is for the strips being edited by hand; bulk changes (e.g. imports) are left to Run
+MAX_PENDING_SCRIPTS = 8
+# finished jobs nobody claimed (e.g. texts typed over) are forgotten beyond this; their files stay in the cache,
+# recorded in the manifest for garbage collection
+MAX_FINISHED_JOBS = 256
+PREFETCH_WORKERS = 2
+# while jobs are running, finished ones are recorded in the manifest at this interval
+RECORD_INTERVAL_SEC = 1.
+
+
+class Prefetcher:
+  """
+  Runs voice and caption jobs of edited scripts in background threads, before Run is pressed.
+  Jobs are keyed by output path (content addressed), so the same output is never generated twice, and Run
+  claims finished (or running) jobs instead of starting its own.
+  Use it from the main thread; only the jobs run in worker threads.
+  """
+
+  def __init__(self):
+    self._executor: Optional[ThreadPoolExecutor] = None
+    self._jobs: 'OrderedDict[Path, Tuple[Job, Future]]' = OrderedDict()
+    # last output paths per script, to drop jobs for texts typed over before they start
+    self._script_paths: Dict[str, List[Path]] = {}
+    # jobs finished in worker threads, to be recorded in the manifest by the main thread
+    self._finished: 'queue.SimpleQueue[Job]' = queue.SimpleQueue()
+    # futures of jobs taken over from elsewhere (e.g. a cancelled run), recorded once done
+    self._tracked: List[Future] = []
+
+  def submit(self, script_key: str, jobs: List[Job]):
+    # outputs of the previous revision of the script are not wanted anymore, unless it is typed back
+    new_paths = {job.path for job in jobs}
+    for path in self._script_paths.pop(script_key, []):
+      entry = self._jobs.get(path)
+      if path not in new_paths and entry is not None and (entry[1].done() or entry[1].cancel()):
+        del self._jobs[path]
+
+    paths = []
+    for job in jobs:
+      paths.append(job.path)
+      if job.path in self._jobs or job.path.exists():
+        continue
+      if self._executor is None:
+        self._executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix='kiritanify-prefetch')
+      logger.debug(f'prefetching: {job.path}')
+      future = self._executor.submit(job.run)
+      future.add_done_callback(lambda f, job=job: self._on_done(job, f))
+      self._jobs[job.path] = (job, future)
+    self._script_paths[script_key] = paths
+    self._forget_finished()
+
+  def claim(self, path: Path) -> Optional[Tuple[Job, Future]]:
+    """
+    Takes the prefetch job for `path`, finished or running. Failed or cancelled jobs are dropped and not
+    returned, so that the caller runs the job again.
+    """
+    entry = self._jobs.pop(path, None)
+    if entry is None:
+      return None
+    _, future = entry
+    if future.cancelled() or (future.done() and future.exception() is not None):
+      return None
+    return entry
+
+  def paths(self) -> List[Path]:
+    """
+    Outputs of jobs not claimed yet, finished or running; garbage collection keeps them.
+    """
+    return list(self._jobs)
+
+  def track(self, jobs: List[Tuple[Job, Future]]):
+    """
+    Takes over jobs running in another executor (e.g. of a cancelled run), so that their outputs get recorded.
+    """
+    for job, future in jobs:
+      self._tracked.append(future)
+      future.add_done_callback(lambda f, job=job: self._on_done(job, f))
+
+  def is_running(self) -> bool:
+    self._tracked = [future for future in self._tracked if not future.done()]
+    return len(self._tracked) > 0 or any(not future.done() for _, future in self._jobs.values())
+
+  def take_finished(self) -> List[Job]:
+    """
+    Jobs finished since the last call, failed ones included (they may leave intermediate files).
+    """
+    jobs = []
+    while True:
+      try:
+        jobs.append(self._finished.get_nowait())
+      except queue.Empty:
+        return jobs
+
+  def _on_done(self, job: Job, future: Future):
+    # called in the worker thread; only hands the job over to the main thread
+    if not future.cancelled():
+      self._finished.put(job)
+
+  def shutdown(self):
+    for _, future in self._jobs.values():
+      future.cancel()
+    self._jobs.clear()
+    self._script_paths.clear()
+    self._tracked.clear()
+    if self._executor is not None:
+      # running jobs finish in background; their files stay in the cache
+      self._executor.shutdown(wait=False)
+      self._executor = None
+
+  def _forget_finished(self):
+    finished = [path for path, (_, future) in self._jobs.items() if future.done()]
+    for path in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+      del self._jobs[path]
+
+
+PREFETCHER = Prefetcher()
+
+# (scene name, script sequence name) waiting for the debounce timer, oldest first
+_pending: 'OrderedDict[Tuple[str, str], None]' = OrderedDict()
+
+
+def schedule(setting: KiritanifyScriptSequenceSetting):
+  """
+  Called from update callbacks of a script; prefetches it once edits pause for `prefetch_delay_sec`.
+  """
+  scene = setting.id_data
+  cache_setting = scene.kiritanify.cache_setting
+  if not cache_setting.prefetch_while_editing:
+    return
+  # e.g. `sequence_editor.sequences_all["Script:..."].kiritanify_script`
+  seq = scene.path_resolve(setting.path_from_id().rpartition('.')[0])
+  key = (scene.name, seq.name)
+  _pending.pop(key, None)
+  _pending[key] = None
+  while len(_pending) > MAX_PENDING_SCRIPTS:
+    _pending.popitem(last=False)
+
+  # restart the timer on every edit, so that only the text typed last is synthesized
+  if bpy.app.timers.is_registered(_flush):
+    bpy.app.timers.unregister(_flush)
+  bpy.app.timers.register(_flush, first_interval=cache_setting.prefetch_delay_sec)
+
+
+def _flush() -> Optional[float]:
+  """
+  Timer callback: submits jobs of pending scripts and records finished jobs in the manifest. Runs again while
+  jobs are running, so that every output gets recorded.
+  """
+  context = bpy.context
+  scene = context.scene
+  pending = list(_pending)
+  _pending.clear()
+  if scene is None:
+    return None
+  _record_finished(context)
+  if scene.sequence_editor is None:
+    return RECORD_INTERVAL_SEC if PREFETCHER.is_running() else None
+
+  gs = _global_setting(context)
+  chara_for_chan = {chara.script_channel(gs): chara for chara in gs.characters}
+  for scene_name, seq_name in pending:
+    seq = scene.sequence_editor.sequences_all.get(seq_name)
+    chara = None if seq is None else chara_for_chan.get(seq.channel)
+    if scene.name != scene_name or chara is None or not isinstance(seq, AdjustmentSequence):
+      continue
+    try:
+      cs = CharacterScript.create_from(chara, seq, context)
+      jobs = []
+      if cs.wants_voice():
+        jobs.append(cs.voice_job())
+      if cs.wants_caption():
+        jobs.append(cs.caption_job())
+      PREFETCHER.submit(f'{scene_name}/{seq_name}', [job for job in jobs if job is not None])
+    except Exception:
+      # never let a failure here break editing; Run reports errors
+      logger.exception(f'failed to prefetch: {seq_name}')
+  return RECORD_INTERVAL_SEC if PREFETCHER.is_running() else None
+
+
+def record_when_done(jobs: List[Tuple[Job, Future]]):
+  """
+  Records outputs of jobs still running (e.g. of a cancelled run) in the manifest once they are done.
+  """
+  PREFETCHER.track(jobs)
+  if not bpy.app.timers.is_registered(_flush):
+    bpy.app.timers.register(_flush, first_interval=RECORD_INTERVAL_SEC)
+
+
+def _record_finished(context):
+  """
+  Records outputs of finished prefetch (and tracked) jobs in the manifest, so that unclaimed ones (texts typed
+  over) can be garbage collected. The manifest is used from the main thread only, hence not from the jobs
+  themselves.
+  """
+  jobs = PREFETCHER.take_finished()
+  if len(jobs) == 0:
+    return
+  try:
+    record_outputs(_global_setting(context).cache_setting.manifest(), jobs)
+  except Exception:
+    logger.exception('failed to record prefetched files')
+
+
+def record_outputs(manifest: Manifest, jobs: List[Job]):
+  """
+  Records files finished jobs left in the cache dir, whether they succeeded or not: outputs, and intermediate wav
+  of voices whose encoding failed.
+  """
+  for job in jobs:
+    if isinstance(job, VoiceJob):
+      if job.path.exists():
+        manifest.record(job.path, 'voice', job.digest(), job.measured_loudness)
+      if job.intermediate_path().exists():
+        manifest.record(job.intermediate_path(), 'voice', job.digest())
+    elif job.path.exists():
+      manifest.record(job.path, 'caption', job.digest())
+
+
+def unregister():
+  if bpy.app.timers.is_registered(_flush):
+    bpy.app.timers.unregister(_flush)
+  _pending.clear()
+  PREFETCHER.shutdown()
@@ -1,16 +1,25 @@
 import logging
+import os
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import bpy
-from bpy.types import AdjustmentSequence, AnyType, Context
+from bpy.types import AdjustmentSequence, AnyType, Context, Sequence
 
+from kiritanify.caption_renderer import caption_file_ext
+from kiritanify.manifest import Manifest, open_manifest
+from kiritanify.seika_center import SeikaCenterConfig, VoiceParams
 from kiritanify.types import ImageSequence, KiritanifyScriptSequence, SoundSequence
-from kiritanify.utils import _datetime_str, _sequences_all, hash_text, trim_bracketed_sentence
+from kiritanify.utils import SequenceIndex, _sequences_all, trim_bracketed_sentence
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+TACHIE_IMAGE_SUFFIXES = {'.png', '.jpg', '.jpeg', '.tga', '.tif', '.tiff', '.bmp', '.exr'}
+
+# directory -> (mtime_ns, files)
+_tachie_cache: Dict[str, Tuple[int, List[Path]]] = {}
+
 
 def _enum_chara_names(_: AnyType, context: Context):
   gs = _global_setting(context)
@@ -20,6 +29,42 @@ def _enum_chara_names(_: AnyType, context: Context):
   ]
 
 
+def _mark_dirty(self: 'KiritanifyScriptSequenceSetting', _context: Context):
+  self.is_dirty = True
+  _schedule_prefetch(self)
+
+
+def _schedule_prefetch(setting: 'KiritanifyScriptSequenceSetting'):
+  if not setting.id_data.kiritanify.cache_setting.prefetch_while_editing:
+    return
+  # imported here, prefetch depends on this module
+  from kiritanify import prefetch
+  prefetch.schedule(setting)
+
+
+def _on_style_update(self: Union['CaptionStyle', 'VoiceStyle'], _context: Context):
+  """
+  Marks scripts using the style dirty; the style is either custom style of a script or style of a character.
+  """
+  owner_path = self.path_from_id().rpartition('.')[0]
+  if owner_path == '':
+    return
+  owner = self.id_data.path_resolve(owner_path)
+  if isinstance(owner, KiritanifyScriptSequenceSetting):
+    owner.is_dirty = True
+    _schedule_prefetch(owner)
+  elif isinstance(owner, KiritanifyCharacterSetting):
+    mark_scripts_dirty(self.id_data, owner)
+
+
+def _on_character_update(self: 'KiritanifyCharacterSetting', _context: Context):
+  mark_scripts_dirty(self.id_data, self)
+
+
+def _on_cache_setting_update(self: 'KiritanifyCacheSetting', _context: Context):
+  mark_scripts_dirty(self.id_data)
+
+
 class CaptionStyle(bpy.types.PropertyGroup):
   name = 'kiritanify.caption_style'
 
@@ -27,20 +72,23 @@ class CaptionStyle(bpy.types.PropertyGroup):
     name='Fill', subtype='COLOR_GAMMA',
     size=4, default=(1., 1., 1., 1.),
     min=0., max=1.,
+    update=_on_style_update,
   )
   stroke_color: bpy.props.FloatVectorProperty(
     name='Stroke', subtype='COLOR_GAMMA',
     size=4, default=(0., 0., 0., 1.),
     min=0., max=1.,
+    update=_on_style_update,
   )
-  stroke_width: bpy.props.FloatProperty(name="Stroke width", default=8)
+  stroke_width: bpy.props.FloatProperty(name="Stroke width", default=8, update=_on_style_update)
 
   font_path: bpy.props.StringProperty(
     name='Font path',
     default='/usr/share/fonts/TTF/mplus-1p-regular.ttf',
+    update=_on_style_update,
   )
-  font_size: bpy.props.IntProperty(name='Font size', default=42)
-  max_height_px: bpy.props.IntProperty(name='Caption height px', default=256)
+  font_size: bpy.props.IntProperty(name='Font size', default=42, update=_on_style_update)
+  max_height_px: bpy.props.IntProperty(name='Caption height px', default=256, update=_on_style_update)
 
   def is_equal(self, style: 'CaptionStyle') -> bool:
     return (
@@ -77,10 +125,10 @@ class TachieStyle(bpy.types.PropertyGroup):
 class VoiceStyle(bpy.types.PropertyGroup):
   name = 'kiritanify.voice_style'
 
-  volume: bpy.props.FloatProperty(name="Volume", min=0, max=2.0, default=1)
-  speed: bpy.props.FloatProperty(name="Speed", min=0.5, max=4.0, default=1)
-  pitch: bpy.props.FloatProperty(name="Pitch", min=0.5, max=2.0, default=1)
-  intonation: bpy.props.FloatProperty(name="Intonation", min=0, max=2.0, default=1)
+  volume: bpy.props.FloatProperty(name="Volume", min=0, max=2.0, default=1, update=_on_style_update)
+  speed: bpy.props.FloatProperty(name="Speed", min=0.5, max=4.0, default=1, update=_on_style_update)
+  pitch: bpy.props.FloatProperty(name="Pitch", min=0.5, max=2.0, default=1, update=_on_style_update)
+  intonation: bpy.props.FloatProperty(name="Intonation", min=0, max=2.0, default=1, update=_on_style_update)
 
   def is_equal(self, style: 'VoiceStyle') -> bool:
     return (
@@ -96,124 +144,118 @@ class VoiceStyle(bpy.types.PropertyGroup):
     self.pitch = style.pitch
     self.intonation = style.intonation
 
+  def params(self) -> VoiceParams:
+    return VoiceParams(
+      volume=self.volume,
+      speed=self.speed,
+      pitch=self.pitch,
+      intonation=self.intonation,
+    )
+
 
 class ICacheState:
+  """
+  Remembers the digest of inputs the cached file was generated from; comparing digests tells if it is stale.
+  Subclasses define `invalid` and `digest` properties.
+  """
+
   def invalidate(self) -> None:
-    raise NotImplementedError
+    self.invalid = True
 
-  def update(
-      self,
-      context: Context,
-      chara: 'KiritanifyCharacterSetting',
-      seq: KiritanifyScriptSequence,
-  ) -> None:
-    raise NotImplementedError
+  def update(self, digest: str) -> None:
+    self.invalid = False
+    self.digest = digest
 
-  def is_changed(self, context, chara: 'KiritanifyCharacterSetting', seq: KiritanifyScriptSequence) -> bool:
-    raise NotImplementedError
+  def is_changed(self, digest: str) -> bool:
+    return self.invalid or self.digest != digest
 
 
 class CaptionCacheState(bpy.types.PropertyGroup, ICacheState):
   name = "kiritanify.caption_cache_state"
 
   invalid: bpy.props.BoolProperty(name='invalid', default=True)
-
-  text: bpy.props.StringProperty(name='text')
-  style: bpy.props.PointerProperty(type=CaptionStyle, name='style')
-
-  def invalidate(self) -> None:
-    self.ivnalid = True
-
-  def update(
-      self,
-      global_setting: 'KiritanifyGlobalSetting',
-      chara: 'KiritanifyCharacterSetting',
-      seq: KiritanifyScriptSequence,
-  ) -> None:
-    _setting = _script_setting(seq)
-    text = _setting.caption_text()
-    style = _setting.caption_style(global_setting, chara)
-    self.invalid = False
-    self.text = text
-    self.style.update(style)
-
-  def is_changed(
-      self,
-      global_setting: 'KiritanifyGlobalSetting',
-      chara: 'KiritanifyCharacterSetting',
-      seq: KiritanifyScriptSequence,
-  ) -> bool:
-    if self.invalid:
-      return True
-
-    _setting = _script_setting(seq)
-    text = _setting.caption_text()
-    style = _setting.caption_style(global_setting, chara)
-    return not (
-        self.style.is_equal(style)
-        and self.text == text
-    )
+  digest: bpy.props.StringProperty(name='digest')
 
 
 class VoiceCacheState(bpy.types.PropertyGroup, ICacheState):
   name = 'kiritanify.voice_cache_state'
 
   invalid: bpy.props.BoolProperty(name='invalid', default=True)
-
-  text: bpy.props.StringProperty(name='text')
-  style: bpy.props.PointerProperty(type=VoiceStyle, name='style')
-
-  def invalidate(self) -> None:
-    self.invalid = True
-
-  def update(
-      self,
-      global_setting: 'KiritanifyGlobalSetting',
-      chara: 'KiritanifyCharacterSetting',
-      seq: KiritanifyScriptSequence,
-  ) -> None:
-    _setting = _script_setting(seq)
-    text = _setting.voice_text()
-    style = _setting.voice_style(global_setting, chara)
-    self.invalid = False
-    self.text = text
-    self.style.update(style)
-
-  def is_changed(
-      self,
-      global_setting: 'KiritanifyGlobalSetting',
-      chara: 'KiritanifyCharacterSetting',
-      seq: KiritanifyScriptSequence,
-  ) -> bool:
-    if self.invalid:
-      return True
-
-    _setting = _script_setting(seq)
-    text = _setting.voice_text()
-    style = _setting.voice_style(global_setting, chara)
-
-    return not (
-        self.style.is_equal(style)
-        and self.text == text
-    )
+  digest: bpy.props.StringProperty(name='digest')
 
 
 class KiritanifyCacheSetting(bpy.types.PropertyGroup):
   name = 'kiritanify.cache_dir_setting'
 
-  def voice_path(self, chara: 'KiritanifyCharacterSetting', seq: KiritanifyScriptSequence) -> Path:
-    ss = _script_setting(seq)
-    dir_path = self._gen_dir('caption', chara)
-    return dir_path / f'{_datetime_str()}:{hash_text(ss.voice_text())}.png'
+  crop_caption: bpy.props.BoolProperty(
+    name='Crop caption', default=True,
+    description='Save only the text area of caption images instead of the full canvas',
+    update=_on_cache_setting_update,
+  )
+  caption_format: bpy.props.EnumProperty(
+    name='Caption format',
+    items=[
+      ('PNG', 'PNG', 'Compressed, small files'),
+      ('TGA', 'TGA', 'Uncompressed, cheapest to decode but large'),
+      ('TGA_RLE', 'TGA (RLE)', 'Run-length compressed, fast to write and decode'),
+    ],
+    default='PNG',
+    update=_on_cache_setting_update,
+  )
+  caption_png_compress_level: bpy.props.IntProperty(
+    name='PNG compression', min=0, max=9, default=1,
+    description='zlib level; 1 for fast writes while editing, 9 for small files',
+    update=_on_cache_setting_update,
+  )
+  voice_format: bpy.props.EnumProperty(
+    name='Voice format',
+    items=[
+      ('WAV', 'WAV', 'Written in process, fastest'),
+      ('FLAC', 'FLAC', 'Written in process with soundfile if installed, otherwise with ffmpeg'),
+      ('OGG', 'OGG', 'Encoded with ffmpeg in batch at the end of a run, smallest'),
+    ],
+    default='WAV',
+    update=_on_cache_setting_update,
+  )
+  normalize_voice_loudness: bpy.props.BoolProperty(
+    name='Normalize voice loudness', default=False,
+    description="Scale voices to each character's loudness target",
+    update=_on_cache_setting_update,
+  )
+  prefetch_while_editing: bpy.props.BoolProperty(
+    name='Prefetch while editing', default=False,
+    description='Generate voice and caption of a script in background once its text or style is edited, '
+                'so that Run only has to add the finished files',
+  )
+  prefetch_delay_sec: bpy.props.FloatProperty(
+    name='Prefetch delay (sec)', min=0.1, max=10., default=1.,
+    description='Prefetching starts after edits pause for this long',
+  )
+  max_cache_size_mb: bpy.props.IntProperty(
+    name='Max cache size (MB)', min=0, default=0,
+    description='Least recently used files not referenced by any strip are deleted above this size; 0 for no limit',
+  )
 
-  def caption_path(self, chara: 'KiritanifyCharacterSetting', seq: KiritanifyScriptSequence) -> Path:
-    ss = _script_setting(seq)
+  def voice_path(self, chara: 'KiritanifyCharacterSetting', digest: str, ext: str) -> Path:
+    """
+    Content addressed path; same digest always maps to the same file, so an existing file can be reused as is.
+    """
+    dir_path = self._gen_dir('voice', chara)
+    return dir_path / f'{digest}.{ext}'
+
+  def caption_path(self, chara: 'KiritanifyCharacterSetting', digest: str) -> Path:
+    """
+    Content addressed path, same as `voice_path`.
+    """
     dir_path = self._gen_dir('caption', chara)
-    return dir_path / f'{_datetime_str()}:{hash_text(ss.caption_text())}.png'
+    return dir_path / f'{digest}.{caption_file_ext(self.caption_format)}'
 
   def root_dir(self) -> Path:
     return Path(bpy.path.abspath('//kiritanify'))
 
+  def manifest(self) -> Manifest:
+    return open_manifest(self.root_dir())
+
   def _gen_dir(self, data_type: str, chara: 'KiritanifyCharacterSetting') -> Path:
     abspath = bpy.path.abspath(f'//kiritanify/{data_type}/{chara.chara_name}')
     path = Path(abspath)
@@ -224,19 +266,26 @@ class KiritanifyCacheSetting(bpy.types.PropertyGroup):
 class KiritanifyScriptSequenceSetting(bpy.types.PropertyGroup):
   name = 'kiritanify.script_sequence_setting'
 
-  text: bpy.props.StringProperty(name='text')
+  text: bpy.props.StringProperty(name='text', update=_mark_dirty)
 
-  gen_voice: bpy.props.BoolProperty(name='gen voice', default=True)
-  gen_caption: bpy.props.BoolProperty(name='gen caption', default=True)
+  gen_voice: bpy.props.BoolProperty(name='gen voice', default=True, update=_mark_dirty)
+  gen_caption: bpy.props.BoolProperty(name='gen caption', default=True, update=_mark_dirty)
 
   # custom
-  use_custom_voice_text: bpy.props.BoolProperty(name='use custom voice text', default=False)
-  custom_voice_text: bpy.props.StringProperty(name='custom voice text')
-  use_custom_voice_style: bpy.props.BoolProperty(name='use custom voice style', default=False)
+  use_custom_voice_text: bpy.props.BoolProperty(name='use custom voice text', default=False, update=_mark_dirty)
+  custom_voice_text: bpy.props.StringProperty(name='custom voice text', update=_mark_dirty)
+  use_custom_voice_style: bpy.props.BoolProperty(name='use custom voice style', default=False, update=_mark_dirty)
   custom_voice_style: bpy.props.PointerProperty(type=VoiceStyle, name='custom voice style')
-  use_custom_caption_style: bpy.props.BoolProperty(name='use custom property', default=False)
+  use_custom_caption_style: bpy.props.BoolProperty(name='use custom property', default=False, update=_mark_dirty)
   custom_caption_style: bpy.props.PointerProperty(type=CaptionStyle, name='caption style')
 
+  # set by update callbacks of inputs (text, styles, ...) and cleared by a successful run
+  is_dirty: bpy.props.BoolProperty(name='dirty', default=True)
+  # character (cid and script channel) of the last successful run; moving the script to the channel of another
+  # character changes no input of its own, so it is compared with these
+  clean_cid: bpy.props.IntProperty(name='clean cid', default=-1)
+  clean_channel: bpy.props.IntProperty(name='clean channel', default=-1)
+
   # seq reference
   voice_seq_name: bpy.props.StringProperty(name='Voice seq name')
   caption_seq_name: bpy.props.StringProperty(name='Caption seq name')
@@ -275,28 +324,37 @@ class KiritanifyScriptSequenceSetting(bpy.types.PropertyGroup):
       return self.custom_caption_style
     return chara.caption_style
 
-  def find_voice_seq(self, context: Context) -> Optional[SoundSequence]:
-    if self.voice_seq_name == '' or self.voice_seq_name not in _sequences_all(context):
-      return None
-    return _sequences_all(context)[self.voice_seq_name]
+  def find_voice_seq(self, context: Context, index: Optional[SequenceIndex] = None) -> Optional[SoundSequence]:
+    return self._find_seq(context, self.voice_seq_name, index)
+
+  def find_caption_seq(self, context: Context, index: Optional[SequenceIndex] = None) -> Optional[ImageSequence]:
+    return self._find_seq(context, self.caption_seq_name, index)
 
-  def find_caption_seq(self, context: Context) -> Optional[ImageSequence]:
-    if self.caption_seq_name == '' or self.caption_seq_name not in _sequences_all(context):
+  @staticmethod
+  def _find_seq(context: Context, name: str, index: Optional[SequenceIndex]) -> Optional[Sequence]:
+    if name == '':
       return None
-    return _sequences_all(context)[self.caption_seq_name]
+    if index is not None:
+      return index.get(name)
+    return _sequences_all(context).get(name)
 
 
 class KiritanifyCharacterSetting(bpy.types.PropertyGroup):
   name = 'kiritanify.character_setting'
 
   chara_name: bpy.props.StringProperty(name='Name')
-  cid: bpy.props.IntProperty(name='cid', min=0)
+  cid: bpy.props.IntProperty(name='cid', min=0, update=_on_character_update)
 
   caption_style: bpy.props.PointerProperty(name='Caption style', type=CaptionStyle)
   tachie_style: bpy.props.PointerProperty(name='Tachie style', type=TachieStyle)
   voice_style: bpy.props.PointerProperty(name='Voice style', type=VoiceStyle)
 
   tachie_directory: bpy.props.StringProperty(name='Tachie dir', subtype='DIR_PATH', default='')
+  loudness_target_db: bpy.props.FloatProperty(
+    name='Loudness target (dB)', min=-60., max=0., default=-20.,
+    description='Gated loudness voices are normalized to, when normalization is enabled',
+    update=_on_character_update,
+  )
 
   def __repr__(self):
     return f'<KiritanifyCharacterSetting chara_name={self.chara_name} cid={self.cid}>'
@@ -330,18 +388,31 @@ class KiritanifyCharacterSetting(bpy.types.PropertyGroup):
     return global_setting.start_channel_for_tachie + 2 * idx + 1
 
   def tachie_files(self) -> List[Path]:
+    """
+    Image files in tachie directory, sorted by name. Called on every panel redraw, so the listing is cached
+    until the directory's mtime changes (i.e. a file is added, removed or renamed) or `clear_tachie_cache`.
+    """
     if self.tachie_directory == '':
-      logger.debug(f'tachie directory: empty string')
       return []
-    dir_path = Path(bpy.path.abspath(self.tachie_directory)).resolve()
-    if not dir_path.exists():
-      logger.debug(f'tachie directory not found: {dir_path}')
+    dir_path = os.path.normpath(bpy.path.abspath(self.tachie_directory))
+    try:
+      mtime_ns = os.stat(dir_path).st_mtime_ns
+    except OSError:
       return []
-    return [
-      child
-      for child in dir_path.iterdir()
-      if child.is_file()
-    ]
+
+    cached = _tachie_cache.get(dir_path)
+    if cached is not None and cached[0] == mtime_ns:
+      return cached[1]
+
+    logger.debug(f'listing tachie directory: {dir_path}')
+    with os.scandir(dir_path) as entries:
+      files = sorted(
+        Path(entry.path)
+        for entry in entries
+        if os.path.splitext(entry.name)[1].lower() in TACHIE_IMAGE_SUFFIXES and entry.is_file()
+      )
+    _tachie_cache[dir_path] = (mtime_ns, files)
+    return files
 
 
 class SeikaCenterSetting(bpy.types.PropertyGroup):
@@ -350,6 +421,20 @@ class SeikaCenterSetting(bpy.types.PropertyGroup):
   addr: bpy.props.StringProperty(name='Addr', default='http://192.168.88.7:7180')
   user: bpy.props.StringProperty(name='User', default='SeikaServerUser')
   password: bpy.props.StringProperty(name='Password', default='SeikaServerPassword')
+  max_workers: bpy.props.IntProperty(name='Workers', min=1, max=32, default=4)
+  connect_timeout_sec: bpy.props.FloatProperty(name='Connect timeout', min=0.1, default=3.)
+  read_timeout_sec: bpy.props.FloatProperty(name='Read timeout', min=1., default=60.)
+  max_attempts: bpy.props.IntProperty(name='Attempts', min=1, max=10, default=4)
+
+  def config(self) -> SeikaCenterConfig:
+    return SeikaCenterConfig(
+      addr=self.addr,
+      user=self.user,
+      password=self.password,
+      connect_timeout_sec=self.connect_timeout_sec,
+      read_timeout_sec=self.read_timeout_sec,
+      max_attempts=self.max_attempts,
+    )
 
 
 def _get_character_enum_items(scene, context):
@@ -375,6 +460,11 @@ class KiritanifyGlobalSetting(bpy.types.PropertyGroup):
 
   new_script_chara_name: bpy.props.EnumProperty(items=_get_character_enum_items, name='new chara name')
 
+  collect_timings: bpy.props.BoolProperty(
+    name='Collect timings', default=False,
+    description='Time each stage of runs, for the summary in the script panel and trace export',
+  )
+
   def character_index(
       self,
       chara: KiritanifyCharacterSetting,
@@ -405,6 +495,24 @@ PROPGROUP_CLASSES = [
 ]
 
 
+def mark_scripts_dirty(scene: bpy.types.Scene, chara: Optional[KiritanifyCharacterSetting] = None):
+  """
+  Marks script sequences of the character (or of all characters) dirty.
+  """
+  if scene.sequence_editor is None:
+    return
+  gs: KiritanifyGlobalSetting = scene.kiritanify
+  charas = gs.characters if chara is None else [chara]
+  channels = set(c.script_channel(gs) for c in charas)
+  for seq in scene.sequence_editor.sequences:
+    if seq.channel in channels and isinstance(seq, AdjustmentSequence):
+      _script_setting(seq).is_dirty = True
+
+
+def clear_tachie_cache():
+  _tachie_cache.clear()
+
+
 def _global_setting(context: Context) -> KiritanifyGlobalSetting:
   return context.scene.kiritanify
 
@@ -0,0 +1,56 @@
+import csv
+import re
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional
+
+
+class ScriptLine(NamedTuple):
+  chara_name: str
+  text: str
+  duration_sec: Optional[float] = None
+
+
+# `chara: line`, with either ascii or full-width colon
+_CHARA_LINE = re.compile(r'^\s*([^:：]+?)\s*[:：]\s*(.*?)\s*$')
+
+
+def parse_script_file(path: Path) -> List[ScriptLine]:
+  """
+  Reads scripts from tsv/csv (`chara, text[, duration_sec]` per row) or, for other extensions, `chara: text`
+  per line. Empty lines and lines starting with `#` are skipped. Write `\\n` in text for line breaks in captions.
+  """
+  with open(path, encoding='utf-8-sig', newline='') as f:
+    if path.suffix.lower() == '.tsv':
+      return _parse_rows(csv.reader(f, delimiter='\t'))
+    elif path.suffix.lower() == '.csv':
+      return _parse_rows(csv.reader(f))
+    return parse_chara_lines(f)
+
+
+def parse_chara_lines(lines: Iterable[str]) -> List[ScriptLine]:
+  scripts = []
+  for lineno, line in enumerate(lines, start=1):
+    if line.strip() == '' or line.lstrip().startswith('#'):
+      continue
+    match = _CHARA_LINE.match(line)
+    if match is None:
+      raise ValueError(f'line {lineno}: expected `chara: text`: {line.strip()!r}')
+    scripts.append(ScriptLine(chara_name=match.group(1), text=match.group(2)))
+  return scripts
+
+
+def _parse_rows(rows: Iterable[List[str]]) -> List[ScriptLine]:
+  scripts = []
+  for lineno, row in enumerate(rows, start=1):
+    if len(row) == 0 or all(c.strip() == '' for c in row) or row[0].lstrip().startswith('#'):
+      continue
+    if len(row) < 2:
+      raise ValueError(f'row {lineno}: expected `chara, text[, duration_sec]`: {row!r}')
+    duration_sec = None
+    if len(row) >= 3 and row[2].strip() != '':
+      try:
+        duration_sec = float(row[2])
+      except ValueError:
+        raise ValueError(f'row {lineno}: duration is not a number: {row[2]!r}') from None
+    scripts.append(ScriptLine(chara_name=row[0].strip(), text=row[1].strip(), duration_sec=duration_sec))
+  return scripts
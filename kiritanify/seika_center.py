@@ -1,49 +1,188 @@
+import logging
+import random
+import threading
 import time
 from io import BytesIO
-from typing import Optional
+from typing import TYPE_CHECKING, Dict, NamedTuple, Optional, Tuple
 
-import pydub
-import requests
-from pydub import AudioSegment
+# numpy, pydub and requests are imported on first use; this module is imported when blender registers the add-on
+if TYPE_CHECKING:
+  import numpy as np
+  import requests
+  from pydub import AudioSegment
 
-from kiritanify.propgroups import KiritanifyCharacterSetting, SeikaCenterSetting, VoiceStyle
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+TRIM_CHUNK_SIZE_MS = 10
+TRIM_SILENCE_THRESHOLD_DB = -50.0
+
+POOL_MAXSIZE = 32
+BACKOFF_BASE_SEC = 0.5
+BACKOFF_MAX_SEC = 8.
+
+
+class SeikaCenterError(RuntimeError):
+  """
+  SeikaCenter did not return voice even after retries.
+  """
+
+
+class SeikaCenterClientError(SeikaCenterError):
+  """
+  SeikaCenter rejected the request (4xx, e.g. wrong user/password or cid). Retrying does not help.
+  """
+
+
+class SeikaCenterConfig(NamedTuple):
+  """
+  Plain copy of SeikaCenterSetting, safe to use outside of blender's main thread.
+  """
+  addr: str
+  user: str
+  password: str
+  connect_timeout_sec: float = 3.
+  read_timeout_sec: float = 60.
+  max_attempts: int = 4
+
+
+class RequestStats:
+  """
+  Counters of SeikaCenter requests since `reset`, shared by worker threads; for benchmarks and diagnosis.
+  """
+  attempts: int
+  retries: int
+  empty_responses: int
+  error_responses: int
+  connection_errors: int
+  failures: int
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.reset()
+
+  def reset(self):
+    with self._lock:
+      self.attempts = 0
+      self.retries = 0
+      self.empty_responses = 0
+      self.error_responses = 0
+      self.connection_errors = 0
+      self.failures = 0
+
+  def count(self, name: str):
+    with self._lock:
+      setattr(self, name, getattr(self, name) + 1)
+
+  def snapshot(self) -> Dict[str, int]:
+    with self._lock:
+      return {
+        name: getattr(self, name)
+        for name in ('attempts', 'retries', 'empty_responses', 'error_responses', 'connection_errors', 'failures')
+      }
+
+
+REQUEST_STATS = RequestStats()
+
+
+class VoiceParams(NamedTuple):
+  """
+  Plain copy of VoiceStyle, safe to use outside of blender's main thread.
+  """
+  volume: float
+  speed: float
+  pitch: float
+  intonation: float
 
 
 def synthesize_voice(
-    seika_setting: SeikaCenterSetting,
-    chara: KiritanifyCharacterSetting,
-    style: VoiceStyle,
+    seika_setting: SeikaCenterConfig,
+    cid: int,
+    style: VoiceParams,
     script: str,
-) -> AudioSegment:
-  wav_file = maybe_run_seika_center(
-    seika_setting=seika_setting, cid=chara.cid,
+) -> 'AudioSegment':
+  content = maybe_run_seika_center(
+    seika_setting=seika_setting, cid=cid,
     body=script, style=style,
   )
-  return AudioSegment.from_file(wav_file)
+  return decode_voice(content)
+
+
+def decode_voice(content: bytearray) -> 'AudioSegment':
+  """
+  Decodes with pydub (ffmpeg); slow, but handles any format SeikaCenter may return.
+  """
+  from pydub import AudioSegment
+  return AudioSegment.from_file(BytesIO(content))
 
 
 def maybe_run_seika_center(
-    seika_setting: SeikaCenterSetting,
+    seika_setting: SeikaCenterConfig,
     cid: int, body: str,
-    style: VoiceStyle,
-) -> BytesIO:
-  for idx in range(1, 4):
-    content = _maybe_run_seika_center(
-      seika_setting, cid, body,
-      style,
-    )
+    style: VoiceParams,
+) -> bytearray:
+  """
+  Runs `_maybe_run_seika_center` with exponential backoff.
+  Empty responses, 5xx and connection errors are retried; 4xx fails immediately.
+  """
+  import requests
+  max_attempts = max(1, seika_setting.max_attempts)
+  for attempt in range(1, max_attempts + 1):
+    REQUEST_STATS.count('attempts')
+    if attempt > 1:
+      REQUEST_STATS.count('retries')
+    try:
+      content = _maybe_run_seika_center(
+        seika_setting, cid, body,
+        style,
+      )
+    except (requests.ConnectionError, requests.Timeout) as e:
+      logger.warning(f'SeikaCenter request failed (attempt {attempt}/{max_attempts}): {e!r}')
+      REQUEST_STATS.count('connection_errors')
+      content = None
     if content is not None:
       return content
-    time.sleep(idx)
-  raise RuntimeError("VoiceroidRequestFailure")
+    if attempt < max_attempts:
+      time.sleep(_backoff_sec(attempt))
+  REQUEST_STATS.count('failures')
+  raise SeikaCenterError("VoiceroidRequestFailure")
+
+
+def _backoff_sec(attempt: int) -> float:
+  """
+  Exponential backoff with jitter, so parallel workers failing together do not retry in lockstep.
+  """
+  delay = min(BACKOFF_MAX_SEC, BACKOFF_BASE_SEC * 2 ** (attempt - 1))
+  return delay / 2 + random.uniform(0, delay / 2)
+
+
+_session: Optional['requests.Session'] = None
+_session_lock = threading.Lock()
+
+
+def _http_session() -> 'requests.Session':
+  """
+  Module wide session; keeps connections to SeikaCenter alive and shares them between worker threads.
+  """
+  global _session
+  import requests
+  from requests.adapters import HTTPAdapter
+  with _session_lock:
+    if _session is None:
+      session = requests.Session()
+      adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+      session.mount('http://', adapter)
+      session.mount('https://', adapter)
+      _session = session
+    return _session
 
 
 def _maybe_run_seika_center(
-    seika_setting: SeikaCenterSetting, cid: int, body: str,
-    style: VoiceStyle,
-) -> Optional[BytesIO]:
+    seika_setting: SeikaCenterConfig, cid: int, body: str,
+    style: VoiceParams,
+) -> Optional[bytearray]:
   """
-  Runs voiceroid and returns path for generated voice file. 
+  Runs voiceroid and returns generated wav data, or None if the request is worth retrying.
   """
   url = f"{seika_setting.addr}/SAVE2/{cid}"
   data = {
@@ -57,30 +196,193 @@ def _maybe_run_seika_center(
     "emotions": {
     }
   }
-  print(data)
-  response = requests.post(
+  logger.debug(f'SeikaCenter request: {data}')
+  response = _http_session().post(
     url=url,
     json=data,
-    timeout=1000,
+    timeout=(seika_setting.connect_timeout_sec, seika_setting.read_timeout_sec),
     auth=(seika_setting.user, seika_setting.password),
+    stream=True,
   )
 
-  if response.status_code == 200:
-    if len(response.content) == 0:
+  try:
+    if response.status_code == 200:
+      content = _read_body(response)
+      if len(content) == 0:
+        logger.warning('SeikaCenter returned empty body')
+        REQUEST_STATS.count('empty_responses')
+        return None
+      return content
+    elif 400 <= response.status_code < 500 and response.status_code != 429:
+      REQUEST_STATS.count('failures')
+      raise SeikaCenterClientError(f'SeikaCenter rejected request: {response.status_code} {response.reason}')
+    else:
+      logger.warning(f'response is not 200\nResponse: {response}')
+      REQUEST_STATS.count('error_responses')
       return None
-    return BytesIO(response.content)
-  else:
-    print(f"response is not 200\nResponse: {response}")
-    return None
+  finally:
+    response.close()
+
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def _read_body(response: 'requests.Response') -> bytearray:
+  """
+  Reads the body into one buffer; with Content-Length, straight into a buffer of that size without
+  intermediate copies.
+  """
+  import requests
+  length = response.headers.get('Content-Length')
+  if length is None or response.headers.get('Content-Encoding', 'identity') != 'identity':
+    content = bytearray()
+    for chunk in response.iter_content(chunk_size=READ_CHUNK_SIZE):
+      content += chunk
+    return content
+
+  from urllib3.exceptions import ProtocolError, ReadTimeoutError
+
+  content = bytearray(int(length))
+  view = memoryview(content)
+  pos = 0
+  # the raw stream raises urllib3 errors, which requests wraps only in its own readers; wrapped here so that
+  # they are retried like other connection errors
+  try:
+    while pos < len(content):
+      n = response.raw.readinto(view[pos:])
+      if not n:
+        raise requests.ConnectionError(f'SeikaCenter response ended at {pos} of {len(content)} bytes')
+      pos += n
+  except ReadTimeoutError as e:
+    raise requests.ReadTimeout(e) from e
+  except ProtocolError as e:
+    raise requests.ConnectionError(e) from e
+  return content
 
 
 def trim_silence(
-    segment: pydub.AudioSegment,
-    chunk_size_ms=10,
-    silence_threshold_db=-50.0,
-) -> pydub.AudioSegment:
-  while segment[0:chunk_size_ms].dBFS < silence_threshold_db:
-    segment = segment[chunk_size_ms:]
-  while segment[-chunk_size_ms:].dBFS < silence_threshold_db:
-    segment = segment[:-chunk_size_ms]
-  return segment
+    segment: 'AudioSegment',
+    chunk_size_ms=TRIM_CHUNK_SIZE_MS,
+    silence_threshold_db=TRIM_SILENCE_THRESHOLD_DB,
+    pre_padding_ms=0,
+    post_padding_ms=0,
+    precise=False,
+) -> 'AudioSegment':
+  """
+  Cuts leading and trailing chunks quieter than `silence_threshold_db` (dBFS of the chunk).
+  """
+  start, end = silence_bounds(
+    segment_samples(segment),
+    frame_rate=segment.frame_rate,
+    max_amplitude=segment.max_possible_amplitude,
+    chunk_size_ms=chunk_size_ms,
+    silence_threshold_db=silence_threshold_db,
+    pre_padding_ms=pre_padding_ms,
+    post_padding_ms=post_padding_ms,
+    precise=precise,
+  )
+  return segment.get_sample_slice(start, end)
+
+
+_SAMPLE_DTYPES = {
+  1: 'int8',
+  2: 'int16',
+  4: 'int32',
+}
+
+
+def segment_samples(segment: 'AudioSegment') -> 'np.ndarray':
+  """
+  Samples of `segment` (frames x channels), a view of its raw data.
+  """
+  import numpy as np
+  return np.frombuffer(segment.raw_data, dtype=_SAMPLE_DTYPES[segment.sample_width]) \
+    .reshape(-1, segment.channels)
+
+
+def silence_bounds(
+    samples: 'np.ndarray',
+    frame_rate: int,
+    max_amplitude: float,
+    chunk_size_ms=TRIM_CHUNK_SIZE_MS,
+    silence_threshold_db=TRIM_SILENCE_THRESHOLD_DB,
+    pre_padding_ms=0,
+    post_padding_ms=0,
+    precise=False,
+) -> Tuple[int, int]:
+  """
+  Returns [start, end) frame range of `samples` (frames x channels) without leading/trailing silence.
+
+  Head chunks are counted from the first frame and tail chunks from the last frame, with the loudness of
+  each chunk being its RMS in dBFS, which gives the same cut points as trimming chunk by chunk with pydub
+  (which counts tail chunks from the length rounded to milliseconds, so the cut may differ by less than 1 ms).
+  With `precise`, the cut is moved inside the boundary chunk to the first/last frame above the threshold.
+  Returns (0, 0) when everything is silent.
+
+  Only the silence is scanned, a block at a time, so the memory used stays small whatever the length.
+  """
+  import numpy as np
+  num_frames = samples.shape[0]
+  chunk = max(1, int(chunk_size_ms * frame_rate / 1000))
+  threshold = 10 ** (silence_threshold_db / 20)
+  # mean power of a chunk in squared sample units, instead of normalizing every sample
+  min_power = (threshold * max_amplitude) ** 2
+
+  head = _first_loud_chunk(samples, chunk, min_power)
+  if head is None:
+    return 0, 0
+  start = head
+
+  # tail chunks are head chunks of the reversed rest
+  tail = _first_loud_chunk(samples[start:][::-1], chunk, min_power)
+  if tail is None:
+    # the loud head chunk straddles tail chunks that are quiet on their own; keep the head chunk
+    end = min(start + chunk, num_frames)
+  else:
+    end = num_frames - tail
+
+  if precise:
+    tail_start = max(end - chunk, start)
+    min_peak = threshold * max_amplitude
+    head_above = np.flatnonzero(_peaks(samples[start:min(start + chunk, end)]) >= min_peak)
+    tail_above = np.flatnonzero(_peaks(samples[tail_start:end]) >= min_peak)
+    if len(head_above) > 0:
+      start = start + int(head_above[0])
+    if len(tail_above) > 0:
+      end = tail_start + int(tail_above[-1]) + 1
+
+  start = max(0, start - int(pre_padding_ms * frame_rate / 1000))
+  end = min(num_frames, end + int(post_padding_ms * frame_rate / 1000))
+  return start, end
+
+
+# frames converted to float at a time while looking for a loud chunk
+SCAN_BLOCK_FRAMES = 16384
+
+
+def _first_loud_chunk(samples: 'np.ndarray', chunk: int, min_power: float) -> Optional[int]:
+  """
+  First frame of the first chunk (counted from frame 0, the last one may be shorter) whose mean power is at least
+  `min_power`, or None.
+  """
+  import numpy as np
+  num_frames = samples.shape[0]
+  step = chunk * max(1, SCAN_BLOCK_FRAMES // chunk)
+  for begin in range(0, num_frames, step):
+    block = samples[begin:begin + step].astype(np.float64)
+    full = block.shape[0] // chunk * chunk
+    chunks = block[:full].reshape(full // chunk, -1)
+    powers = np.einsum('ij,ij->i', chunks, chunks) / max(1, chunks.shape[1])
+    if full < block.shape[0]:
+      rest = block[full:].ravel()
+      powers = np.append(powers, np.dot(rest, rest) / rest.size)
+    loud = np.flatnonzero(powers >= min_power)
+    if len(loud) > 0:
+      return begin + int(loud[0]) * chunk
+  return None
+
+
+def _peaks(samples: 'np.ndarray') -> 'np.ndarray':
+  import numpy as np
+  # in float, abs of the minimum integer overflows
+  return np.abs(samples.astype(np.float64)).max(axis=1)
@@ -0,0 +1,93 @@
+import errno
+import logging
+import os
+import shutil
+import sys
+import uuid
+from pathlib import Path
+from typing import Union
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# linux/ioctl.h: _IOW(0x94, 9, int)
+_FICLONE = 0x40049409
+
+
+class SharedStore:
+  """
+  Content addressed file store shared by projects (and blender instances): `objects/<digest[:2]>/<digest>.<ext>`.
+
+  Every write goes to a unique temporary file renamed into place, so concurrent writers of the same digest are
+  safe (they write the same content) and readers never see partial files.
+  Projects get hardlinks (or reflinks, or copies) of objects; files are only ever replaced, never modified in
+  place, so sharing inodes is safe.
+  """
+  root: Path
+
+  def __init__(self, root: Union[str, Path]):
+    self.root = Path(root)
+
+  def object_path(self, digest: str, ext: str) -> Path:
+    return self.root / 'objects' / digest[:2] / f'{digest}.{ext}'
+
+  def fetch(self, digest: str, dest: Path) -> bool:
+    """
+    Places the object for `digest` at `dest` (extension taken from `dest`). Returns False if there is none.
+    """
+    src = self.object_path(digest, dest.suffix.lstrip('.'))
+    if not src.exists():
+      return False
+    try:
+      link_or_copy(src, dest)
+    except FileNotFoundError:
+      # removed by someone else in the meantime
+      return False
+    logger.debug(f'shared cache hit: {src}')
+    return True
+
+  def put(self, digest: str, src: Path):
+    """
+    Stores `src` as the object for `digest`, unless it is already stored.
+    """
+    dest = self.object_path(digest, src.suffix.lstrip('.'))
+    if dest.exists():
+      return
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    link_or_copy(src, dest)
+
+
+def link_or_copy(src: Path, dest: Path):
+  """
+  Atomically places `src` at `dest` as a hardlink, falling back to a reflink (copy-on-write clone) and then
+  to a plain copy, for other file systems or volumes.
+  """
+  part_path = dest.with_name(f'{dest.name}.{uuid.uuid4().hex[:8]}.part')
+  try:
+    try:
+      os.link(src, part_path)
+    except OSError as e:
+      if e.errno == errno.ENOENT:
+        raise
+      try:
+        _reflink(src, part_path)
+      except OSError:
+        shutil.copyfile(src, part_path)
+    os.replace(part_path, dest)
+  finally:
+    if part_path.exists():
+      part_path.unlink()
+
+
+def _reflink(src: Path, dest: Path):
+  if not sys.platform.startswith('linux'):
+    raise OSError(errno.EOPNOTSUPP, 'reflink is only supported on linux')
+  import fcntl
+
+  with open(src, 'rb') as src_file, open(dest, 'wb') as dest_file:
+    try:
+      fcntl.ioctl(dest_file.fileno(), _FICLONE, src_file.fileno())
+    except OSError:
+      dest_file.close()
+      dest.unlink()
+      raise
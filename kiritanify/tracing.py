@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+
+class SpanRecord(NamedTuple):
+  name: str
+  start_ns: int
+  duration_ns: int
+  thread_id: int
+
+
+class StageSummary(NamedTuple):
+  name: str
+  count: int
+  total_sec: float
+  max_sec: float
+
+  @property
+  def mean_sec(self) -> float:
+    return self.total_sec / self.count
+
+
+class Tracer:
+  """
+  Collects timed spans of pipeline stages from any thread, for the summary in the panel and chrome trace export.
+  Disabled, `span` returns a shared no-op context manager and nothing is recorded.
+  Spans in worker processes (caption rendering of large runs) are not collected; their parent span covers them.
+  """
+  enabled: bool
+
+  def __init__(self):
+    self.reset(enabled=False)
+
+  def reset(self, enabled: bool):
+    """
+    Drops collected spans; called when a run starts, so that the summary is of the last run.
+    """
+    self.enabled = enabled
+    self._records: List[SpanRecord] = []
+    self._thread_names: Dict[int, str] = {}
+    self._origin_ns = time.perf_counter_ns()
+    # (number of records summarized, summary); the panel asks on every redraw
+    self._summary: Tuple[int, List[StageSummary]] = (0, [])
+
+  def span(self, name: str):
+    if not self.enabled:
+      return _NULL_SPAN
+    return _Span(self, name)
+
+  def add(self, name: str, start_ns: int, end_ns: int):
+    thread = threading.current_thread()
+    if thread.ident not in self._thread_names:
+      self._thread_names[thread.ident] = thread.name
+    # list.append is atomic, no lock needed between worker threads
+    self._records.append(SpanRecord(name, start_ns, end_ns - start_ns, thread.ident))
+
+  def has_records(self) -> bool:
+    return len(self._records) > 0
+
+  def summary(self) -> List[StageSummary]:
+    """
+    Spans aggregated by name, slowest total first. Nested spans are included in their parents' totals.
+    """
+    records = list(self._records)
+    if self._summary[0] == len(records):
+      return self._summary[1]
+    stats: Dict[str, List[int]] = {}
+    for record in records:
+      stat = stats.setdefault(record.name, [0, 0, 0])
+      stat[0] += 1
+      stat[1] += record.duration_ns
+      stat[2] = max(stat[2], record.duration_ns)
+    summary = [
+      StageSummary(name=name, count=count, total_sec=total_ns / 1e9, max_sec=max_ns / 1e9)
+      for name, (count, total_ns, max_ns) in stats.items()
+    ]
+    summary.sort(key=lambda s: s.total_sec, reverse=True)
+    self._summary = (len(records), summary)
+    return summary
+
+  def chrome_trace(self) -> Dict[str, Any]:
+    """
+    Trace Event Format, for chrome://tracing or https://ui.perfetto.dev.
+    """
+    pid = os.getpid()
+    events: List[Dict[str, Any]] = [
+      {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread_id, 'args': {'name': thread_name}}
+      for thread_id, thread_name in list(self._thread_names.items())
+    ]
+    for record in list(self._records):
+      events.append({
+        'name': record.name,
+        'cat': record.name.partition('.')[0],
+        'ph': 'X',
+        'ts': (record.start_ns - self._origin_ns) / 1000,
+        'dur': record.duration_ns / 1000,
+        'pid': pid,
+        'tid': record.thread_id,
+      })
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+  def write_chrome_trace(self, path: Path):
+    with open(path, 'w', encoding='utf-8') as f:
+      json.dump(self.chrome_trace(), f)
+
+
+class _Span:
+  __slots__ = ('_tracer', '_name', '_start_ns')
+
+  def __init__(self, tracer: Tracer, name: str):
+    self._tracer = tracer
+    self._name = name
+
+  def __enter__(self):
+    self._start_ns = time.perf_counter_ns()
+    return self
+
+  def __exit__(self, *_):
+    self._tracer.add(self._name, self._start_ns, time.perf_counter_ns())
+    return False
+
+
+class _NullSpan:
+  __slots__ = ()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *_):
+    return False
+
+
+_NULL_SPAN = _NullSpan()
+
+TRACER = Tracer()
+
+
+def span(name: str):
+  """
+  `with span('voice.http'): ...` times the block when tracing is enabled. Names are `<stage>.<step>`.
+  """
+  return TRACER.span(name)
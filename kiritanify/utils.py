@@ -1,8 +1,6 @@
-import base64
 import datetime
-import hashlib
 import re
-from typing import Dict, Iterator, List, Optional, Tuple, TypeVar, Union
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar, Union
 
 from bpy.types import Context, MovieSequence, Sequence, Sequences, SpeedControlSequence
 
@@ -31,22 +29,17 @@ def _datetime_str():
   return datetime.datetime.now().strftime('%Y%m%d%-H%M%S%f')
 
 
-def hash_text(text: str) -> str:
-  digest = hashlib.blake2s(text.encode('UTF-8')).digest()
-  base64encoded = base64.b64encode(digest, altchars=b'-_')
-  return base64encoded[:16].decode('UTF-8')
-
-
 def _current_frame(context: Context) -> int:
   return context.scene.frame_current
 
 
-def get_sequences_by_channel(context: Context, channel: int) -> List[Sequence]:
-  return [
-    seq
-    for seq in _sequences(context)
-    if seq.channel == channel
-  ]
+def get_sequences_by_channel(
+    context: Context, channel: int,
+    index: Optional['SequenceIndex'] = None,
+) -> List[Sequence]:
+  if index is None:
+    index = SequenceIndex.build(context)
+  return index.by_channel(channel)
 
 
 def trim_bracketed_sentence(text: str) -> str:
@@ -54,33 +47,17 @@ def trim_bracketed_sentence(text: str) -> str:
   return expr.sub('', text)
 
 
-def find_neighbor_sequence(context: Context, channel: int, target_frame: int) -> Tuple[
+def find_neighbor_sequence(
+    context: Context, channel: int, target_frame: int,
+    index: Optional['SequenceIndex'] = None,
+) -> Tuple[
   Optional[Sequence],
   Optional[Sequence],
   Optional[Sequence],
 ]:
-  seq_prev = None
-  seq_target = None
-  seq_next = None
-  frame_prev = -float('inf')
-  frame_next = float('inf')
-
-  for seq in get_sequences_by_channel(context, channel):  # type: Sequence
-    _start = seq.frame_final_start
-    _end = seq.frame_final_end
-    if frame_prev < _start and _end < target_frame:
-      seq_prev = seq
-      frame_prev = _start
-    if _start <= target_frame <= _end:
-      seq_target = seq
-    if target_frame < _start and _end < frame_next:
-      seq_next = seq
-      frame_next = _end
-  return (
-    seq_prev,
-    seq_target,
-    seq_next,
-  )
+  if index is None:
+    index = SequenceIndex.build(context)
+  return index.neighbors(channel, target_frame)
 
 
 def split_per_num(elements: List[T], num: int) -> Iterator[Iterator[T]]:
@@ -95,10 +72,124 @@ def find_selected_movie_sequence(context: Context) -> Optional[kiritanify.types.
       return seq
 
 
-def find_speed_seq_from_movie_seq(context: Context, movie_seq: kiritanify.types.MovieSequence) \
-    -> Optional[kiritanify.types.SpeedControlSequence]:
-  for speed_seq in _sequences_all(context):
-    if not isinstance(speed_seq, SpeedControlSequence):
-      continue
-    if speed_seq.input_1.name == movie_seq.name:
-      return speed_seq
+def find_speed_seq_from_movie_seq(
+    context: Context, movie_seq: kiritanify.types.MovieSequence,
+    index: Optional['SequenceIndex'] = None,
+) -> Optional[kiritanify.types.SpeedControlSequence]:
+  if index is None:
+    index = SequenceIndex.build(context)
+  return index.speed_seq_of(movie_seq)
+
+
+class SequenceIndex:
+  """
+  Lookup tables over sequences, built with one pass over sequences so that queries inside loops do not scan
+  all sequences again: channel -> sequences sorted by start frame, name -> sequence and
+  movie sequence -> speed control sequence.
+
+  Frames are read when the index is built; build one per operator invocation and do not keep it around.
+  Sequences created or removed while the index is alive should be registered with `add` / `remove`.
+  """
+  _by_name: Dict[str, Sequence]
+  _by_channel: Dict[int, List[Tuple[int, int, Sequence]]]
+  # name -> (channel, start) of channel entries, for `remove` to bisect
+  _entry_keys: Dict[str, Tuple[int, int]]
+  _speed_by_input: Dict[str, kiritanify.types.SpeedControlSequence]
+
+  def __init__(self, sequences: Iterable[Sequence], sequences_all: Iterable[Sequence]):
+    self._by_name = {}
+    self._by_channel = {}
+    self._entry_keys = {}
+    self._speed_by_input = {}
+    for seq in sequences:
+      start = seq.frame_final_start
+      self._by_channel.setdefault(seq.channel, []).append((start, seq.frame_final_end, seq))
+      self._entry_keys[seq.name] = (seq.channel, start)
+    # sorted once; inserting one by one is quadratic on large timelines
+    for entries in self._by_channel.values():
+      entries.sort(key=lambda entry: entry[0])
+    for seq in sequences_all:
+      self._add_to_names(seq)
+
+  @classmethod
+  def build(cls, context: Context) -> 'SequenceIndex':
+    return cls(_sequences(context), _sequences_all(context))
+
+  def get(self, name: str) -> Optional[Sequence]:
+    return self._by_name.get(name)
+
+  def by_channel(self, channel: int) -> List[Sequence]:
+    return [seq for (_, _, seq) in self._by_channel.get(channel, [])]
+
+  def speed_seq_of(self, movie_seq: kiritanify.types.MovieSequence) \
+      -> Optional[kiritanify.types.SpeedControlSequence]:
+    return self._speed_by_input.get(movie_seq.name)
+
+  def neighbors(self, channel: int, target_frame: int) -> Tuple[
+    Optional[Sequence],
+    Optional[Sequence],
+    Optional[Sequence],
+  ]:
+    """
+    (sequence ending before target_frame, sequence on target_frame, sequence starting after target_frame)
+    in the channel. Sequences in one channel never overlap, so each of them is next to the bisect point.
+    """
+    entries = self._by_channel.get(channel, [])
+    idx = self._bisect_start(entries, target_frame)
+
+    seq_prev = None
+    seq_target = None
+    seq_next = entries[idx][2] if idx < len(entries) else None
+    # walk back over sequences starting at or before target_frame; at most two of them contain target_frame
+    for _idx in range(idx - 1, -1, -1):
+      _, end, seq = entries[_idx]
+      if end < target_frame:
+        seq_prev = seq
+        break
+      if seq_target is None:
+        seq_target = seq
+    return seq_prev, seq_target, seq_next
+
+  def add(self, seq: Sequence):
+    self._add_to_channel(seq)
+    self._add_to_names(seq)
+
+  def remove(self, seq: Sequence):
+    name = seq.name
+    self._by_name.pop(name, None)
+    key = self._entry_keys.pop(name, None)
+    if key is None:
+      return
+    channel, start = key
+    entries = self._by_channel[channel]
+    # first entry starting at `start`; frames are integers
+    for idx in range(self._bisect_start(entries, start - 1), len(entries)):
+      _start, _, _seq = entries[idx]
+      if _start != start:
+        return
+      if _seq.name == name:
+        del entries[idx]
+        return
+
+  @staticmethod
+  def _bisect_start(entries: List[Tuple[int, int, Sequence]], frame: int) -> int:
+    """index of the first entry starting after frame"""
+    lo, hi = 0, len(entries)
+    while lo < hi:
+      mid = (lo + hi) // 2
+      if frame < entries[mid][0]:
+        hi = mid
+      else:
+        lo = mid + 1
+    return lo
+
+  def _add_to_channel(self, seq: Sequence):
+    entries = self._by_channel.setdefault(seq.channel, [])
+    start = seq.frame_final_start
+    entries.insert(self._bisect_start(entries, start), (start, seq.frame_final_end, seq))
+    self._entry_keys[seq.name] = (seq.channel, start)
+
+  def _add_to_names(self, seq: Sequence):
+    self._by_name[seq.name] = seq
+    if isinstance(seq, SpeedControlSequence) and seq.input_1 is not None:
+      self._speed_by_input[seq.input_1.name] = seq
@@ -0,0 +1,194 @@
+import functools
+import logging
+import os
+import shutil
+import struct
+import subprocess
+import uuid
+import wave
+from pathlib import Path
+from typing import TYPE_CHECKING, List, NamedTuple, Tuple, Union
+
+from kiritanify.seika_center import TRIM_CHUNK_SIZE_MS, TRIM_SILENCE_THRESHOLD_DB, silence_bounds
+
+if TYPE_CHECKING:
+  import numpy as np
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# output files per ffmpeg process when encoding ogg in batch
+OGG_ENCODE_BATCH_SIZE = 32
+
+_WAVE_FORMAT_PCM = 0x0001
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+_PCM_DTYPES = {
+  2: '<i2',
+  4: '<i4',
+}
+
+
+class PcmAudio(NamedTuple):
+  """
+  Integer PCM samples (frames x channels), decoded without pydub/ffmpeg. `samples` may be a view of
+  the received buffer; slice it instead of copying.
+  """
+  samples: 'np.ndarray'
+  frame_rate: int
+  sample_width: int
+
+  @property
+  def max_amplitude(self) -> float:
+    return float(2 ** (8 * self.sample_width - 1))
+
+
+def parse_wav(content: Union[bytes, bytearray, memoryview]) -> PcmAudio:
+  """
+  Parses 16/32 bit PCM wav in place; samples are a view of `content`, nothing is copied.
+  Raises `wave.Error` for anything else, for callers to fall back to pydub.
+  """
+  import numpy as np
+  if len(content) < 12 or content[0:4] != b'RIFF' or content[8:12] != b'WAVE':
+    raise wave.Error('not a RIFF/WAVE file')
+
+  fmt = None
+  pos = 12
+  while pos + 8 <= len(content):
+    chunk_id = bytes(content[pos:pos + 4])
+    chunk_size, = struct.unpack_from('<I', content, pos + 4)
+    body = pos + 8
+    if chunk_id == b'fmt ':
+      fmt = _parse_fmt(content, body, chunk_size)
+    elif chunk_id == b'data':
+      if fmt is None:
+        raise wave.Error('data chunk before fmt chunk')
+      channels, frame_rate, sample_width = fmt
+      # streaming writers may leave the size unset (0 or 0xFFFFFFFF); take what was received
+      available = len(content) - body
+      if chunk_size == 0 or chunk_size > available:
+        chunk_size = available
+      frame_size = channels * sample_width
+      samples = np.frombuffer(
+        content, dtype=_PCM_DTYPES[sample_width], count=(chunk_size // frame_size) * channels, offset=body,
+      ).reshape(-1, channels)
+      return PcmAudio(samples=samples, frame_rate=frame_rate, sample_width=sample_width)
+    # chunks are padded to even size
+    pos = body + chunk_size + (chunk_size & 1)
+  raise wave.Error('no data chunk')
+
+
+def _parse_fmt(content, offset: int, size: int) -> Tuple[int, int, int]:
+  if size < 16:
+    raise wave.Error('fmt chunk too small')
+  format_tag, channels, frame_rate, _, _, bits = struct.unpack_from('<HHIIHH', content, offset)
+  if format_tag == _WAVE_FORMAT_EXTENSIBLE and size >= 40:
+    format_tag, = struct.unpack_from('<H', content, offset + 24)
+  if format_tag != _WAVE_FORMAT_PCM:
+    raise wave.Error(f'unsupported format tag: {format_tag:#x}')
+  sample_width = bits // 8
+  if sample_width not in _PCM_DTYPES or channels == 0:
+    raise wave.Error(f'unsupported sample width or channels: {bits} bits, {channels} channels')
+  return channels, frame_rate, sample_width
+
+
+def trim_silence(
+    audio: PcmAudio,
+    chunk_size_ms=TRIM_CHUNK_SIZE_MS,
+    silence_threshold_db=TRIM_SILENCE_THRESHOLD_DB,
+) -> PcmAudio:
+  """
+  Same cut as `seika_center.trim_silence`, for `PcmAudio`.
+  """
+  start, end = silence_bounds(
+    audio.samples,
+    frame_rate=audio.frame_rate,
+    max_amplitude=audio.max_amplitude,
+    chunk_size_ms=chunk_size_ms,
+    silence_threshold_db=silence_threshold_db,
+  )
+  return audio._replace(samples=audio.samples[start:end])
+
+
+def can_write(fmt: str) -> bool:
+  """
+  Whether `write` supports `fmt` in this environment.
+  """
+  return fmt == 'wav' or (fmt == 'flac' and _soundfile() is not None)
+
+
+@functools.lru_cache(maxsize=1)
+def _soundfile():
+  # optional; imported on first use, it loads numpy and libsndfile
+  try:
+    import soundfile
+  except ImportError:
+    return None
+  return soundfile
+
+
+def write(path: Path, audio: PcmAudio, fmt: str):
+  soundfile = _soundfile() if fmt == 'flac' else None
+  if fmt == 'wav':
+    _write_wav(path, audio)
+  elif soundfile is not None:
+    soundfile.write(str(path), audio.samples, audio.frame_rate, format='FLAC', subtype=_flac_subtype(audio))
+  else:
+    raise ValueError(f'unsupported format: {fmt}')
+
+
+def _write_wav(path: Path, audio: PcmAudio):
+  import numpy as np
+  with wave.open(str(path), 'wb') as writer:
+    writer.setnchannels(audio.samples.shape[1])
+    writer.setsampwidth(audio.sample_width)
+    writer.setframerate(audio.frame_rate)
+    # the trimmed range of the received buffer is written as is; no copy unless it is not contiguous
+    writer.writeframes(memoryview(np.ascontiguousarray(audio.samples)).cast('B'))
+
+
+def _flac_subtype(audio: PcmAudio) -> str:
+  # flac has no 32 bit integer samples
+  return 'PCM_16' if audio.sample_width == 2 else 'PCM_24'
+
+
+def encode_ogg(pairs: List[Tuple[Path, Path]]):
+  """
+  Encodes (wav, ogg) pairs with ffmpeg, many files per process, and removes the wav files.
+  Each ogg file appears atomically.
+  """
+  for i in range(0, len(pairs), OGG_ENCODE_BATCH_SIZE):
+    _encode_ogg_batch(pairs[i:i + OGG_ENCODE_BATCH_SIZE])
+
+
+def _encode_ogg_batch(pairs: List[Tuple[Path, Path]]):
+  args = [_ffmpeg(), '-hide_banner', '-loglevel', 'error', '-y']
+  for wav_path, _ in pairs:
+    args += ['-i', str(wav_path)]
+  part_paths = []
+  for i, (_, ogg_path) in enumerate(pairs):
+    part_path = ogg_path.with_name(f'{ogg_path.name}.{uuid.uuid4().hex[:8]}.part')
+    part_paths.append(part_path)
+    args += ['-map', f'{i}:a', '-c:a', 'libvorbis', '-f', 'ogg', str(part_path)]
+
+  logger.debug(f'encoding {len(pairs)} ogg file(s)')
+  try:
+    result = subprocess.run(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+      raise RuntimeError(f'ffmpeg failed ({result.returncode}): {result.stderr.decode(errors="replace")}')
+    for part_path, (wav_path, ogg_path) in zip(part_paths, pairs):
+      os.replace(part_path, ogg_path)
+      wav_path.unlink()
+  finally:
+    for part_path in part_paths:
+      if part_path.exists():
+        part_path.unlink()
+
+
+def _ffmpeg() -> str:
+  ffmpeg = shutil.which('ffmpeg')
+  if ffmpeg is None:
+    # pydub may have been configured with an explicit path
+    from pydub import AudioSegment
+    ffmpeg = AudioSegment.converter
+  return ffmpeg
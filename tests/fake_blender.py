@@ -0,0 +1,18 @@
+"""
+The fake `bpy` of the benchmarks, for tests of modules importing bpy. Installed once, before any of them is imported,
+as every module binds the bpy types it was imported with.
+"""
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'benchmarks'))
+
+import fake_bpy
+
+if 'bpy' not in sys.modules:
+  fake_bpy.install(tempfile.gettempdir())
+
+import bpy
+
+__all__ = ['bpy', 'fake_bpy']
@@ -0,0 +1,159 @@
+import unittest
+from types import SimpleNamespace
+
+from fake_blender import fake_bpy
+from kiritanify.baisoku import SpeedSegment, align_to_speed, apply_segments, layout_segments, new_speed_sequence, \
+  parse_speed_marker, segments_for_cuts, unique_name
+from kiritanify.utils import SequenceIndex
+
+
+def _movie(frame_final_start=100, frame_final_end=200, frame_offset_start=10):
+  return SimpleNamespace(
+    frame_final_start=frame_final_start,
+    frame_final_end=frame_final_end,
+    frame_offset_start=frame_offset_start,
+  )
+
+
+class ParseSpeedMarkerTest(unittest.TestCase):
+
+  def test_speed_markers(self):
+    for name, expected in [('2', 2.), ('x2', 2.), ('2x', 2.), ('×1.5', 1.5), ('1.5倍', 1.5), (' 3倍速 ', 3.)]:
+      with self.subTest(name=name):
+        self.assertEqual(parse_speed_marker(name), expected)
+
+  def test_other_markers(self):
+    for name in ['', 'intro', 'x', '0', '2xx', '-1']:
+      with self.subTest(name=name):
+        self.assertIsNone(parse_speed_marker(name))
+
+
+class SegmentsForCutsTest(unittest.TestCase):
+
+  def test_no_cuts(self):
+    self.assertEqual(segments_for_cuts(_movie(), 1., []), [SpeedSegment(10, 110, 1.)])
+
+  def test_cuts_in_content_frames(self):
+    # at 2x, timeline frame 150 shows content frame 10 + 50 * 2
+    segments = segments_for_cuts(_movie(), 2., [(150, 4.), (120, None)])
+    self.assertEqual(segments, [
+      SpeedSegment(10, 50, 2.),
+      SpeedSegment(50, 110, 2.),
+      SpeedSegment(110, 210, 4.),
+    ])
+
+  def test_cut_on_first_frame_sets_first_speed(self):
+    self.assertEqual(segments_for_cuts(_movie(), 1., [(100, 2.)]), [SpeedSegment(10, 110, 2.)])
+    self.assertEqual(segments_for_cuts(_movie(), 1., [(100, 2.), (150, None)]), [
+      SpeedSegment(10, 60, 2.),
+      SpeedSegment(60, 110, 2.),
+    ])
+
+  def test_cuts_outside_are_ignored(self):
+    self.assertEqual(segments_for_cuts(_movie(), 1., [(50, 2.), (200, 2.), (300, 2.)]), [SpeedSegment(10, 110, 1.)])
+
+
+class LayoutSegmentsTest(unittest.TestCase):
+
+  def test_segments_follow_each_other(self):
+    segments = [SpeedSegment(0, 100, 1.), SpeedSegment(100, 300, 2.), SpeedSegment(300, 330, 3.)]
+    self.assertEqual(layout_segments(1, segments), [(1, 101), (101, 201), (201, 211)])
+
+  def test_rounding_does_not_add_up(self):
+    segments = [SpeedSegment(i * 10, (i + 1) * 10, 3.) for i in range(30)]
+    ranges = layout_segments(0, segments)
+    self.assertEqual(ranges[-1][1], 100)
+    self.assertTrue(all(start < end for start, end in ranges))
+    self.assertTrue(all(a[1] == b[0] for a, b in zip(ranges, ranges[1:])))
+
+
+class UniqueNameTest(unittest.TestCase):
+
+  def test_free_name_is_kept(self):
+    self.assertEqual(unique_name('movie', set().__contains__), 'movie')
+
+  def test_numbered_as_blender(self):
+    self.assertEqual(unique_name('movie', {'movie', 'movie.001'}.__contains__), 'movie.002')
+
+  def test_number_is_not_stacked(self):
+    self.assertEqual(unique_name('movie.001', {'movie', 'movie.001'}.__contains__), 'movie.002')
+
+
+class _TimelineTest(unittest.TestCase):
+
+  def setUp(self):
+    scene = fake_bpy.Scene()
+    self.sequences = scene.sequence_editor_create().sequences
+    # frames 100-200 of a movie (600 frames in the fake) on channel 2
+    self.movie = self.sequences.new_movie(name='clip', filepath='/tmp/clip.mp4', channel=2, frame_start=90)
+    self.movie.frame_final_start = 100
+    self.movie.frame_final_end = 200
+
+  def index(self) -> SequenceIndex:
+    return SequenceIndex(self.sequences, self.sequences)
+
+
+class NewSpeedSequenceTest(_TimelineTest):
+
+  def test_below_the_movie(self):
+    index = self.index()
+    speed_seq = new_speed_sequence(self.sequences, self.movie, 2., index=index)
+    self.assertEqual((speed_seq.name, speed_seq.channel, speed_seq.speed_factor), ('Speed:clip', 1, 2.))
+    self.assertIs(speed_seq.input_1, self.movie)
+    self.assertFalse(speed_seq.use_default_fade)
+    self.assertIs(index.speed_seq_of(self.movie), speed_seq)
+
+  def test_unique_name(self):
+    index = self.index()
+    new_speed_sequence(self.sequences, self.movie, index=index)
+    self.assertEqual(new_speed_sequence(self.sequences, self.movie, index=index).name, 'Speed:clip.001')
+
+
+class AlignToSpeedTest(_TimelineTest):
+
+  def test_plays_content_to_the_end(self):
+    align_to_speed(self.movie, 2.)
+    # 590 content frames from the offset at 2x
+    self.assertEqual((self.movie.frame_final_start, self.movie.frame_final_end), (100, 395))
+
+
+class ApplySegmentsTest(_TimelineTest):
+
+  def test_parts(self):
+    index = self.index()
+    segments = [SpeedSegment(10, 60, 1.), SpeedSegment(60, 110, 2.)]
+    parts = apply_segments(self.sequences, self.movie, None, segments, index)
+    self.assertEqual([(m.name, m.channel, m.frame_final_start, m.frame_final_end) for m, _ in parts], [
+      ('clip', 2, 100, 150),
+      ('clip.001', 2, 150, 175),
+    ])
+    self.assertEqual([m.frame_offset_start for m, _ in parts], [10, 60])
+    self.assertEqual([(s.name, s.channel, s.input_1, s.speed_factor) for _, s in parts], [
+      ('Speed:clip', 1, parts[0][0], 1.),
+      ('Speed:clip.001', 1, parts[1][0], 2.),
+    ])
+    self.assertIs(index.get('clip.001'), parts[1][0])
+
+  def test_slowed_down_parts_running_into_the_next_strip(self):
+    self.sequences.new_movie(name='next', filepath='/tmp/next.mp4', channel=2, frame_start=220)
+    segments = [SpeedSegment(10, 60, 1.), SpeedSegment(60, 110, .5)]
+    with self.assertRaisesRegex(ValueError, 'overlapping next'):
+      apply_segments(self.sequences, self.movie, None, segments, self.index())
+    # nothing is changed
+    self.assertEqual((self.movie.frame_final_start, self.movie.frame_final_end), (100, 200))
+    self.assertEqual(sorted(seq.name for seq in self.sequences), ['clip', 'next'])
+
+  def test_next_strip_on_the_speed_channel(self):
+    self.sequences.new_effect(name='other speed', type='SPEED', channel=1, frame_start=210, frame_end=300)
+    with self.assertRaisesRegex(ValueError, 'overlapping other speed'):
+      apply_segments(self.sequences, self.movie, None, [SpeedSegment(10, 110, .5)], self.index())
+
+  def test_sped_up_parts_before_the_next_strip(self):
+    self.sequences.new_movie(name='next', filepath='/tmp/next.mp4', channel=2, frame_start=200)
+    parts = apply_segments(self.sequences, self.movie, None, [SpeedSegment(10, 60, 1.), SpeedSegment(60, 110, 2.)],
+                           self.index())
+    self.assertEqual(parts[-1][0].frame_final_end, 175)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+
+from fake_blender import bpy, fake_bpy
+import kiritanify
+from kiritanify.ops import KIRITANIFY_OT_SetDefaultCharacters, _all_character_scripts, _dirty_scripts
+from kiritanify.propgroups import _global_setting, _script_setting
+
+
+class DirtyScriptsTest(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    kiritanify.register()
+
+  @classmethod
+  def tearDownClass(cls):
+    kiritanify.unregister()
+
+  def setUp(self):
+    self.context = bpy.context
+    scene = fake_bpy.Scene()
+    scene.sequence_editor_create()
+    self.context.scene = scene
+    bpy.data.scenes = [scene]
+    KIRITANIFY_OT_SetDefaultCharacters().execute(self.context)
+    self.gs = _global_setting(self.context)
+    self.charas = self.gs.characters[:2]
+    for i, chara in enumerate(self.charas):
+      seq = scene.sequence_editor.sequences.new_effect(
+        name=f'Script:{i}',
+        type='ADJUSTMENT',
+        channel=chara.script_channel(self.gs),
+        frame_start=1 + 100 * i,
+        frame_end=50 + 100 * i,
+      )
+      setting = _script_setting(seq)
+      setting.text = f'line {i}'
+      # nothing to generate, so that no sequence is missing
+      setting.gen_voice = False
+      setting.gen_caption = False
+
+  def dirty_names(self):
+    return [cs.seq.name for cs in _dirty_scripts(_all_character_scripts(self.context))]
+
+  def mark_all_clean(self):
+    for cs in _all_character_scripts(self.context):
+      cs.mark_clean()
+
+  def test_new_scripts_are_dirty(self):
+    self.assertEqual(self.dirty_names(), ['Script:0', 'Script:1'])
+
+  def test_clean_scripts(self):
+    self.mark_all_clean()
+    self.assertEqual(self.dirty_names(), [])
+
+  def test_edited_script(self):
+    self.mark_all_clean()
+    _script_setting(self.context.scene.sequence_editor.sequences['Script:1']).text = 'edited'
+    self.assertEqual(self.dirty_names(), ['Script:1'])
+
+  def test_script_moved_to_another_character(self):
+    self.mark_all_clean()
+    self.context.scene.sequence_editor.sequences['Script:0'].channel = self.charas[1].script_channel(self.gs)
+    self.assertEqual(self.dirty_names(), ['Script:0'])
+    self.mark_all_clean()
+    self.assertEqual(self.dirty_names(), [])
+
+  def test_cid_changed(self):
+    self.mark_all_clean()
+    self.charas[0].cid += 1
+    self.assertEqual(self.dirty_names(), ['Script:0'])
+
+
+if __name__ == '__main__':
+  unittest.main()
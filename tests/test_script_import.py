@@ -0,0 +1,51 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from kiritanify.script_import import ScriptLine, parse_chara_lines, parse_script_file
+
+
+class ParseCharaLinesTest(unittest.TestCase):
+
+  def test_lines(self):
+    lines = ['kiritan: おふとん\n', '\n', '# comment\n', 'ずんだもん：もぐもぐ  \n', 'akane : a: b\n']
+    self.assertEqual(parse_chara_lines(lines), [
+      ScriptLine('kiritan', 'おふとん'),
+      ScriptLine('ずんだもん', 'もぐもぐ'),
+      ScriptLine('akane', 'a: b'),
+    ])
+
+  def test_line_without_chara(self):
+    with self.assertRaisesRegex(ValueError, 'line 2'):
+      parse_chara_lines(['kiritan: a', 'no chara here'])
+
+
+class ParseScriptFileTest(unittest.TestCase):
+
+  def _parse(self, suffix: str, content: str):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      path = Path(tmp_dir) / f'scripts{suffix}'
+      path.write_text(content, encoding='utf-8-sig')
+      return parse_script_file(path)
+
+  def test_tsv(self):
+    self.assertEqual(self._parse('.tsv', 'kiritan\tおふとん\t1.5\n#x\ty\n\nzunko\tもぐもぐ\n'), [
+      ScriptLine('kiritan', 'おふとん', 1.5),
+      ScriptLine('zunko', 'もぐもぐ'),
+    ])
+
+  def test_csv_quoted(self):
+    self.assertEqual(self._parse('.csv', 'kiritan,"a, b",\n'), [ScriptLine('kiritan', 'a, b')])
+
+  def test_text(self):
+    self.assertEqual(self._parse('.txt', 'kiritan: おふとん\n'), [ScriptLine('kiritan', 'おふとん')])
+
+  def test_bad_rows(self):
+    with self.assertRaisesRegex(ValueError, 'row 1'):
+      self._parse('.tsv', 'kiritan\n')
+    with self.assertRaisesRegex(ValueError, 'duration is not a number'):
+      self._parse('.csv', 'kiritan,text,long\n')
+
+
+if __name__ == '__main__':
+  unittest.main()